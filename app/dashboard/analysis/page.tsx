@@ -240,7 +240,6 @@ export default function AnalysisPage() {
 
         const transformedChartData = data.chart_data
         const monthNames = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-        const currentYear = new Date().getFullYear()
 
         // Transform each product's data to include formatted month labels
         Object.keys(transformedChartData).forEach((sku) => {
@@ -248,7 +247,7 @@ export default function AnalysisPage() {
             ...point,
             monthLabel:
               point.month >= 1 && point.month <= 12
-                ? `${monthNames[point.month - 1]} ${currentYear}`
+                ? `${monthNames[point.month - 1]} ${point.year}`
                 : `Month ${point.month}`,
           }))
         })
@@ -932,42 +931,22 @@ export default function AnalysisPage() {
                       <ResponsiveContainer width="100%" height={400}>
                         <LineChart
                           data={(() => {
-                            // Combine all products' data into a single array with all months
-                            const allMonths = new Set<number>()
+                            // Combine all products' data into a single array with all months (YYYY-MM periods)
+                            const allMonths = new Map<string, any>()
                             Object.values(performanceData.chart_data).forEach((productData: any) => {
-                              productData.forEach((point: any) => allMonths.add(point.month))
+                              productData.forEach((point: any) => allMonths.set(point.period, point))
                             })
 
                             // Create a data point for each month
-                            return Array.from(allMonths)
-                              .sort((a, b) => a - b)
-                              .map((month) => {
-                                const monthNames = [
-                                  "Jan",
-                                  "Feb",
-                                  "Mar",
-                                  "Apr",
-                                  "May",
-                                  "Jun",
-                                  "Jul",
-                                  "Aug",
-                                  "Sep",
-                                  "Oct",
-                                  "Nov",
-                                  "Dec",
-                                ]
-                                const currentYear = new Date().getFullYear()
-                                const dataPoint: any = {
-                                  month,
-                                  monthLabel:
-                                    month >= 1 && month <= 12
-                                      ? `${monthNames[month - 1]} ${currentYear}`
-                                      : `Month ${month}`,
-                                }
+                            return Array.from(allMonths.keys())
+                              .sort()
+                              .map((period) => {
+                                const { month, monthLabel } = allMonths.get(period)
+                                const dataPoint: any = { period, month, monthLabel }
 
                                 // Add each product's value for this month
                                 Object.entries(performanceData.chart_data).forEach(([sku, data]: [string, any]) => {
-                                  const point = data.find((p: any) => p.month === month)
+                                  const point = data.find((p: any) => p.period === period)
                                   dataPoint[sku] = point ? point.value : null
                                 })
 
@@ -123,11 +123,16 @@ export async function getBestSellers(year: number, month: number, topN = 10) {
   }>(`/best_sellers?year=${year}&month=${month}&top_n=${topN}`)
 }
 
-export async function getNotifications() {
+export async function getNotifications(filters?: { since?: number; status?: string[] }) {
   console.log("[v0] ===== getNotifications() CALLED =====")
   console.log("[v0] API_BASE_URL:", API_BASE_URL)
 
   try {
+    const params = new URLSearchParams()
+    if (filters?.since !== undefined) params.append("since", String(filters.since))
+    if (filters?.status?.length) params.append("status", filters.status.join(","))
+    const url = `/notifications${params.toString() ? `?${params}` : ""}`
+
     const result =
       await apiFetch<
         Array<{
@@ -141,8 +146,9 @@ export async function getNotifications() {
           Reorder_Qty: number
           Status: string
           Description: string
+          change_type?: "new" | "escalated" | "de-escalated" | "unchanged"
         }>
-      >("/notifications")
+      >(url)
 
     console.log("[v0] getNotifications() result:", result)
     return result
@@ -264,7 +270,7 @@ export async function getAnalysisPerformance(skuList: string[]) {
         Product_name: string
         Quantity: number
       }>
-      chart_data: Record<string, Array<{ month: number; value: number }>>
+      chart_data: Record<string, Array<{ year: number; month: number; period: string; value: number }>>
     }>("/analysis/performance", {
       method: "POST",
       body: JSON.stringify({ sku_list: skuList }),
@@ -275,22 +281,53 @@ export async function getAnalysisPerformance(skuList: string[]) {
   }
 }
 
+type BestSeller = {
+  rank: number
+  base_sku: string
+  name: string
+  size: string | null
+  quantity: number
+  month: string
+}
+
+type BestSellersResponse = {
+  success: boolean
+  message: string
+  data: BestSeller[]
+  months: Array<{ month: string; data: BestSeller[] }>
+}
+
 export async function getAnalysisBestSellers(year: number, month: number, topN = 10) {
+  try {
+    return await apiFetch<BestSellersResponse>(`/analysis/best_sellers?year=${year}&month=${month}&top_n=${topN}`)
+  } catch (error) {
+    console.error("[v0] Failed to fetch best sellers:", error)
+    return { success: false, message: "Failed to fetch data", data: [], months: [] }
+  }
+}
+
+export async function getAnalysisBestSellersRange(start: string, end: string, topN = 10) {
+  try {
+    return await apiFetch<BestSellersResponse>(`/analysis/best_sellers?start=${start}&end=${end}&top_n=${topN}`)
+  } catch (error) {
+    console.error("[v0] Failed to fetch best sellers:", error)
+    return { success: false, message: "Failed to fetch data", data: [], months: [] }
+  }
+}
+
+export async function getAnalysisSizeMix(sku: string) {
   try {
     return await apiFetch<{
       success: boolean
       message: string
-      data: Array<{
-        rank: number
-        base_sku: string
-        name: string
-        size: string
-        quantity: number
-      }>
-    }>(`/analysis/best_sellers?year=${year}&month=${month}&top_n=${topN}`)
+      base_sku?: string
+      sizes: string[]
+      chart_data: Array<{ month: string } & Record<string, number | string>>
+      table_data: Array<{ size: string; total_quantity: number }>
+    }>(`/analysis/size_mix?sku=${encodeURIComponent(sku)}`)
   } catch (error) {
-    console.error("[v0] Failed to fetch best sellers:", error)
-    return { success: false, message: "Failed to fetch data", data: [] }
+    console.error("[v0] Failed to fetch size mix:", error)
+    return { success: false, message: "Failed to fetch data", sizes: [], chart_data: [], table_data: [] }
   }
 }
 
@@ -407,6 +444,27 @@ export async function checkBaseStock() {
   }
 }
 
+export async function updateManualValuesBatch(
+  updates: Array<{ product_sku: string; minstock?: number | null; buffer?: number | null }>,
+) {
+  return apiFetch<{
+    success: boolean
+    message: string
+    updated: number
+    not_found: string[]
+    results: Array<{
+      product_sku: string
+      minstock: number
+      buffer: number
+      reorder_qty: number
+      status: string
+    }>
+  }>("/notifications/update_manual_values/batch", {
+    method: "POST",
+    body: JSON.stringify({ updates }),
+  })
+}
+
 export async function getSearchSuggestions(search: string) {
   try {
     return await apiFetch<{
@@ -422,3 +480,20 @@ export async function getSearchSuggestions(search: string) {
     return { success: false, suggestions: [] }
   }
 }
+
+export type ServerEvent =
+  | { type: "notifications"; batch_id: number; red: number; yellow: number }
+  | { type: "base_stock"; rows: number }
+  | { type: "job"; kind: "train" | "predict"; job_id: string; status: string; forecast_rows?: number }
+
+// Push updates from /events (server-sent events); refetch on an event instead of polling.
+// EventSource reconnects by itself. Returns a function that closes the stream.
+export function subscribeEvents(onEvent: (event: ServerEvent) => void, types?: ServerEvent["type"][]) {
+  const query = types?.length ? `?types=${types.join(",")}` : ""
+  const source = new EventSource(`${API_BASE_URL}/events${query}`)
+  const handler = (message: MessageEvent) => onEvent(JSON.parse(message.data) as ServerEvent)
+  for (const type of ["notifications", "base_stock", "job"]) {
+    source.addEventListener(type, handler)
+  }
+  return () => source.close()
+}
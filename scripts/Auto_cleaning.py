@@ -1,8 +1,11 @@
 import os
 import io
 import pandas as pd
-from math import ceil
 from sqlalchemy import text, Integer, inspect
+from base_data_cache import load_base_data, bump_db_version, record_ingest
+from dtype_policy import apply_dtype_policy
+from artifacts import write_csv
+from DB_server import copy_dataframe
 
 
 def load_excel_with_fallback_bytes(content_bytes, possible_headers=[0,1,2,3]):
@@ -71,18 +74,18 @@ def check_db_status(engine):
     except Exception as e:
         print(f"❌ check_db_status failed: {e}")
 
-def auto_cleaning(sales_path, product_path, engine):
+def auto_cleaning(sales_path, product_path, engine, output_dir=None):
     """
     PostgreSQL-safe auto-cleaning: loads sales/product files, aggregates, fills missing,
-    deletes overlapping rows, and appends to PostgreSQL table base_data.
+    merges with the existing history and rewrites the rows of PostgreSQL table base_data.
+    clean_sales_data.csv is written to output_dir (a job directory, see artifacts.py).
     """
 
     # --- Load base_data from DB (if exists) ---
     df_base = None
     try:
-        df_base = pd.read_sql("SELECT * FROM base_data", engine)
-        df_base["sales_date"] = pd.to_datetime(df_base["sales_date"], errors="coerce")
-        df_base = df_base.copy()
+        # Plain dtypes here: the frame is merged with the new upload and written back to SQL
+        df_base = load_base_data(engine, compact=False)
     except Exception:
         pass  # first run
 
@@ -233,10 +236,6 @@ def auto_cleaning(sales_path, product_path, engine):
                    .copy()
         )
 
-    # --- Save cleaned CSV ---
-    #clean_csv_path = r"D:\test\clean_sales_data.csv"
-    df_base.to_csv("clean_sales_data.csv", index=False, encoding="utf-8-sig")
-
     # --- Final schema enforcement ---
     df_base = df_base[[
         "product_sku","product_name","sales_date","sales_year","sales_month","total_quantity"
@@ -255,41 +254,31 @@ def auto_cleaning(sales_path, product_path, engine):
         "sales_month": Integer
     }
 
-    # --- Delete overlapping rows ---
-    if df_base.shape[0] > 0:
-        min_date = df_base["sales_date"].min().strftime("%Y-%m-%d")
-        max_date = df_base["sales_date"].max().strftime("%Y-%m-%d")
-        skus_list = df_base["product_sku"].unique().tolist()
-        batch_size = 1000
-        n_batches = ceil(len(skus_list) / batch_size)
-
-        with engine.begin() as conn:
-            for i in range(n_batches):
-                batch_skus = skus_list[i*batch_size : (i+1)*batch_size]
-                skus_str = "','".join(batch_skus)
-                delete_sql = text(f"""
-                    DELETE FROM base_data
-                    WHERE product_sku IN ('{skus_str}')
-                      AND sales_date BETWEEN '{min_date}' AND '{max_date}'
-                """)
-                conn.execute(delete_sql)
-
     print(df_base.dtypes)  # ✅ check column types
     print(df_base.columns.to_list())
     # --- Remove garbage rows like 'Exported by' and 'Date Time'
     bad_values = ["Exported by", "Date Time"]
     #df_products = df_products[~df_products["Product_SKU"].isin(bad_values)].copy()
     df_base = df_base[~df_base["product_sku"].isin(bad_values)].copy()
+    # One row per (product_sku, sales_date): the primary key of base_data
+    df_base = df_base.drop_duplicates(subset=["product_sku", "sales_date"], keep="first")
     # --- Save cleaned CSV ---
-    clean_csv_path = r"clean_sales_data.csv"
-    df_base.to_csv(clean_csv_path, index=False, encoding="utf-8-sig")
-    # ✅ Insert cleaned data into base_data
-    df_base.to_sql("base_data", engine, if_exists="append", index=False)
+    clean_csv_path = os.path.join(output_dir or ".", "clean_sales_data.csv")
+    write_csv(df_base, clean_csv_path, index=False, encoding="utf-8-sig")
+    # ✅ df_base is the full merged history: replace base_data's rows in one transaction.
+    # Rewriting rows (not the table) keeps the key and indexes from create_base_data_table.sql
+    # The version bump shares the transaction, so no reader sees the new rows under the old version
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM base_data"))
+        copy_dataframe(conn, df_base, "base_data")
+        version = bump_db_version(conn)
 
     # --- Replace all_products table ---
-    df_base.to_sql("base_data", engine, if_exists="replace", index=False)
-
     df_products.to_sql("all_products", engine, if_exists="replace", index=False)
 
+    # --- Refresh the local columnar snapshot from the frame we just saved ---
+    record_ingest(df_base, version)
+
     check_db_status(engine)
-    return df_base
+    # Hand the training pipeline the compact dtypes (categorical SKU, small ints)
+    return apply_dtype_policy(df_base)
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
@@ -8,35 +9,64 @@ import pandas as pd
 import io
 import uvicorn
 from sqlalchemy import text
-import sys
 import time
-import joblib
+import logging
 
 # Import local modules
 from Auto_cleaning import auto_cleaning, load_excel_with_fallback_bytes
-from DB_server import engine
-from Predict import update_model_and_train, forcast_loop, Evaluate
-from Notification import generate_stock_report, update_manual_values
+from DB_server import engine, copy_dataframe, advisory_xact_lock, NOTIFICATION_LOCK_KEY
+from migrations import migrate
+from Predict import update_model_and_train, forcast_loop, load_model, Evaluate, MODEL_FILE
+from artifacts import new_job, finish_job
+from events import events, sse_stream, EVENT_TYPES
+from Notification import generate_stock_report, compute_stock_flags, append_notification_batch, previous_batch_status, classify_changes, HISTORY_COLUMNS, CHANGE_TYPES, update_manual_values, recalculate_stock_rows, SAFETY_FACTOR, WEEKS_TO_COVER, MAX_BUFFER
+from schema_cache import notification_columns, refresh_notification_schema
+from manual_overrides import overrides
+from base_data_cache import load_base_data
+from analysis_store import analysis_store, month_start, RANKING_DEPTH
+from query_builder import SelectBuilder
+from comparison import compare as compare_performance
+from metrics import get_logger, log_event, should_sample, begin_request, timed, record_rows, observe_request, render_prometheus, StageProfile, profile_stage
+
+log = get_logger("backend")
 
 # Initialize FastAPI app
 app = FastAPI(title="Lon TukTak Stock Management API")
 
+def _route_label(request):
+    """Route template (e.g. /analysis/historical) so metric labels stay low-cardinality"""
+    route = request.scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = request.scope.get("endpoint")
+    if endpoint is not None:
+        for r in app.router.routes:
+            if getattr(r, "endpoint", None) is endpoint:
+                return r.path
+    return "unmatched"
+
 @app.middleware("http")
 async def log_requests(request, call_next):
-    start_time = time.time()
-    print(f"\n{'='*80}", flush=True)
-    print(f"🌐 REQUEST: {request.method} {request.url.path}", flush=True)
-    print(f"{'='*80}", flush=True)
-    sys.stdout.flush()
-    
-    response = await call_next(request)
-    
-    process_time = time.time() - start_time
-    print(f"✅ RESPONSE: {response.status_code} (took {process_time:.2f}s)", flush=True)
-    print(f"{'='*80}\n", flush=True)
-    sys.stdout.flush()
-    
-    return response
+    start_time = time.perf_counter()
+    ctx = begin_request()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        process_time = time.perf_counter() - start_time
+        route = _route_label(request)
+        observe_request(request.method, route, status, process_time, ctx)
+        if status >= 500 or should_sample():
+            log_event(
+                log, logging.ERROR if status >= 500 else logging.INFO, "request",
+                method=request.method, route=route, status=status,
+                ms=process_time * 1000,
+                db_ms=ctx["stages"].get("db", 0.0) * 1000,
+                serialize_ms=ctx["stages"].get("serialize", 0.0) * 1000,
+                rows=ctx["rows"] if ctx["rows"] is not None else "-",
+            )
 
 # Configure CORS
 app.add_middleware(
@@ -52,42 +82,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Notification-Batch"],
 )
 
 @app.on_event("startup")
 async def startup_event():
-    print("\n" + "="*80, flush=True)
-    print("🚀 LON TUKTAK BACKEND STARTED", flush=True)
-    print("="*80, flush=True)
-    print(f"✅ Backend loaded from: {__file__}", flush=True)
-    print(f"✅ Database engine available: {engine is not None}", flush=True)
-    print("="*80 + "\n", flush=True)
-    sys.stdout.flush()
-
-    # Run quick migration/normalization for stock_notifications table so column casing
-    # mismatches don't break endpoints. This is idempotent and safe to run multiple times.
+    log.info("🚀 LON TUKTAK BACKEND STARTED")
+    log.info(f"✅ Backend loaded from: {__file__}")
+    log.info(f"✅ Database engine available: {engine is not None}")
+
+    # Versioned schema migrations (see migrations.py): a single-row check once the schema is
+    # current; otherwise one worker applies the pending SQL files under an advisory lock.
+    # A failed migration aborts startup: serving on a half-built schema fails later and less clearly
     try:
-        with engine.connect() as conn:
-            cols = conn.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'stock_notifications'") ).fetchall()
-            existing = {c[0] for c in cols}
-            print(f"[Startup] stock_notifications existing columns: {sorted(existing)}", flush=True)
-
-            # If lowercase product_sku exists but quoted Product_SKU doesn't, add Product_SKU and copy values
-            if 'product_sku' in existing and 'Product_SKU' not in existing:
-                print("[Startup] Adding quoted column \"Product_SKU\" and copying from product_sku", flush=True)
-                conn.execute(text('ALTER TABLE stock_notifications ADD COLUMN "Product_SKU" VARCHAR(255)'))
-                conn.execute(text('UPDATE stock_notifications SET "Product_SKU" = product_sku'))
-
-            # If Product exists but product (lower) doesn't, create lower-case copies for safer queries
-            if 'Product' in existing and 'product' not in existing:
-                try:
-                    print("[Startup] Creating lowercase 'product' column from \"Product\"", flush=True)
-                    conn.execute(text("ALTER TABLE stock_notifications ADD COLUMN product VARCHAR(255)"))
-                    conn.execute(text('UPDATE stock_notifications SET product = "Product"'))
-                except Exception as e:
-                    print(f"[Startup] Warning while creating product lowercase column: {e}", flush=True)
-    except Exception as e:
-        print(f"[Startup] Migration check failed: {e}", flush=True)
+        migrate(engine)
+    except Exception:
+        log.exception("[Startup] Schema migration failed")
+        raise
+
+    # Resolve the stock_notifications column mapping once the schema is in place
+    refresh_notification_schema(engine)
+
+    # Load persisted manual MinStock/Buffer overrides into this worker's mirror
+    overrides.reload()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop this worker's LISTEN thread for /events
+    events.close()
 
 # ============================================================================
 # HEALTH CHECK
@@ -101,22 +123,34 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Per-route latency, stage timing and row-count histograms in Prometheus text format"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/events")
+async def event_stream(types: Optional[str] = Query(None, description="Comma-separated event types (default: all)")):
+    """Server-sent events for new notifications, base_stock changes and finished jobs (see events.py)"""
+    wanted = {t.strip() for t in types.split(",") if t.strip()} if types else None
+    if wanted and not wanted <= set(EVENT_TYPES):
+        raise HTTPException(status_code=400, detail=f"Unknown event types: {', '.join(sorted(wanted - set(EVENT_TYPES)))}")
+    return StreamingResponse(
+        sse_stream(events, wanted),
+        media_type="text/event-stream",
+        # No caching, and no response buffering by nginx-style proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/api/test")
 async def test_endpoint():
     """Simple test endpoint"""
-    print("\n" + "="*80, flush=True)
-    print("🧪 TEST ENDPOINT CALLED", flush=True)
-    print("="*80 + "\n", flush=True)
-    sys.stdout.flush()
+    log.debug("🧪 TEST ENDPOINT CALLED")
     return {"message": "Backend is working!", "timestamp": datetime.now().isoformat()}
 
 @app.get("/api/db-test")
 async def test_database():
     """Test database connection and query stock_notifications table"""
-    print("\n" + "="*80, flush=True)
-    print("DATABASE TEST ENDPOINT CALLED", flush=True)
-    print("="*80, flush=True)
-    sys.stdout.flush()
+    log.debug("DATABASE TEST ENDPOINT CALLED")
     
     result = {
         "engine_available": engine is not None,
@@ -131,22 +165,18 @@ async def test_database():
     try:
         if not engine:
             result["error"] = "Database engine is None"
-            print("ERROR: Database engine is None", flush=True)
-            sys.stdout.flush()
+            log.error("ERROR: Database engine is None")
             return result
         
         # Test 1: Simple connection test
-        print("Test 1: Testing database connection...", flush=True)
-        sys.stdout.flush()
+        log.debug("Test 1: Testing database connection...")
         test_query = "SELECT 1 as test"
         test_df = pd.read_sql(test_query, engine)
         result["connection_test"] = True
-        print("✅ Database connection successful", flush=True)
-        sys.stdout.flush()
+        log.debug("✅ Database connection successful")
         
         # Test 2: Check if table exists
-        print("Test 2: Checking if stock_notifications table exists...", flush=True)
-        sys.stdout.flush()
+        log.debug("Test 2: Checking if stock_notifications table exists...")
         table_check_query = """
             SELECT EXISTS (
                 SELECT FROM information_schema.tables 
@@ -155,25 +185,21 @@ async def test_database():
         """
         table_check_df = pd.read_sql(table_check_query, engine)
         result["table_exists"] = bool(table_check_df.iloc[0]['table_exists'])
-        print(f"Table exists: {result['table_exists']}", flush=True)
-        sys.stdout.flush()
+        log.debug("Table exists: %s", result['table_exists'])
         
         if not result["table_exists"]:
             result["error"] = "stock_notifications table does not exist"
             return result
         
         # Test 3: Count rows
-        print("Test 3: Counting rows in stock_notifications...", flush=True)
-        sys.stdout.flush()
+        log.debug("Test 3: Counting rows in stock_notifications...")
         count_query = "SELECT COUNT(*) as count FROM stock_notifications"
         count_df = pd.read_sql(count_query, engine)
         result["row_count"] = int(count_df.iloc[0]['count'])
-        print(f"✅ Row count: {result['row_count']}", flush=True)
-        sys.stdout.flush()
+        log.debug("✅ Row count: %s", result['row_count'])
         
         # Test 4: Get column names
-        print("Test 4: Getting column names...", flush=True)
-        sys.stdout.flush()
+        log.debug("Test 4: Getting column names...")
         columns_query = """
             SELECT column_name 
             FROM information_schema.columns 
@@ -182,13 +208,11 @@ async def test_database():
         """
         columns_df = pd.read_sql(columns_query, engine)
         result["columns"] = columns_df['column_name'].tolist()
-        print(f"✅ Columns: {result['columns']}", flush=True)
-        sys.stdout.flush()
+        log.debug("✅ Columns: %s", result['columns'])
         
         # Test 5: Get sample data
         if result["row_count"] > 0:
-            print("Test 5: Fetching sample data...", flush=True)
-            sys.stdout.flush()
+            log.debug("Test 5: Fetching sample data...")
             sample_query = "SELECT * FROM stock_notifications LIMIT 3"
             sample_df = pd.read_sql(sample_query, engine)
             
@@ -200,90 +224,119 @@ async def test_database():
                         record[key] = str(value)
             
             result["sample_data"] = sample_records
-            print(f"✅ Sample data retrieved: {len(sample_records)} rows", flush=True)
-            sys.stdout.flush()
+            log.debug("✅ Sample data retrieved: %s rows", len(sample_records))
         
-        print("="*80 + "\n", flush=True)
-        sys.stdout.flush()
         return result
         
     except Exception as e:
         result["error"] = str(e)
-        print(f"ERROR in database test: {str(e)}", flush=True)
-        import traceback
-        traceback.print_exc()
-        sys.stdout.flush()
+        log.exception(f"ERROR in database test: {str(e)}")
         return result
 
 # ============================================================================
 # NOTIFICATIONS ENDPOINTS
 # ============================================================================
 
+# Latest changed row per SKU over the batches after :since. The created_at bound prunes
+# month partitions; the rest is served by idx_notification_history_changed.
+CHANGED_SINCE = """(
+    SELECT DISTINCT ON ("Product_SKU") *
+    FROM stock_notification_history
+    WHERE batch_id > :since
+      AND created_at >= COALESCE((SELECT created_at FROM notification_batches WHERE batch_id = :since), '-infinity')
+      AND change_type <> 'unchanged'
+    ORDER BY "Product_SKU", batch_id DESC
+) changed"""
+
 @app.get("/notifications")
-async def get_notifications():
-    """Get inventory notifications from stock_notifications table"""
-    print("\n" + "="*80, flush=True)
-    print("NOTIFICATIONS ENDPOINT CALLED", flush=True)
-    print("="*80, flush=True)
-    sys.stdout.flush()
+async def get_notifications(
+    response: Response,
+    since: Optional[int] = Query(None, description="Only rows that changed after this batch_id"),
+    status: Optional[str] = Query(None, description="Comma-separated Status values, e.g. Red,Yellow")
+):
+    """
+    Get inventory notifications from stock_notifications table (the latest batch).
+    since / status narrow it to the delta a client hasn't seen; the X-Notification-Batch
+    header carries the latest batch_id to pass as the next since.
+    """
+    log.debug("NOTIFICATIONS ENDPOINT CALLED")
     
     try:
         if not engine:
-            print("ERROR: Database engine not available", flush=True)
-            sys.stdout.flush()
+            log.error("ERROR: Database engine not available")
             return []
         
-        print("Database engine available, executing query...", flush=True)
-        sys.stdout.flush()
-        
-        query = "SELECT * FROM stock_notifications ORDER BY created_at DESC"
-        print(f"Query: {query}", flush=True)
-        sys.stdout.flush()
-        
-        df = pd.read_sql(query, engine)
-        
-        print(f"Query executed. Rows returned: {len(df)}", flush=True)
-        sys.stdout.flush()
+        if since is None and status is None:
+            cols = notification_columns(engine)
+            query = f'SELECT * FROM stock_notifications ORDER BY "{cols["created_at"]}" DESC'
+            params = None
+        else:
+            builder = SelectBuilder(CHANGED_SINCE if since is not None else "stock_notifications")
+            if status:
+                statuses = [s.strip().capitalize() for s in status.split(",") if s.strip()]
+                builder.where('"Status" = ANY(:statuses)', statuses=statuses)
+            query, params = builder.build("*", order_by="created_at DESC")
+            if since is not None:
+                params["since"] = since
+        with timed("db"):
+            with engine.connect() as conn:
+                df = pd.read_sql(query, conn, params=params)
+                latest = conn.execute(text("SELECT batch_id FROM latest_notification_batch")).scalar()
+        if latest is not None:
+            response.headers["X-Notification-Batch"] = str(latest)
+        record_rows(len(df))
         
         if df.empty:
-            print("DataFrame is empty, returning empty array", flush=True)
-            sys.stdout.flush()
             return []
         
-        print(f"DataFrame columns: {df.columns.tolist()}", flush=True)
-        print(f"First row sample: {df.iloc[0].to_dict()}", flush=True)
-        sys.stdout.flush()
-        
-        # Convert to list of dicts
-        notifications = df.to_dict('records')
-        
-        print(f"Converted to {len(notifications)} notification records", flush=True)
-        sys.stdout.flush()
-        
-        # Convert datetime to string
-        for notification in notifications:
-            for key, value in notification.items():
-                if pd.notna(value) and isinstance(value, (pd.Timestamp, datetime)):
-                    notification[key] = str(value)
+        with timed("serialize"):
+            # Convert to list of dicts
+            notifications = df.to_dict('records')
+            
+            # Convert datetime to string
+            for notification in notifications:
+                for key, value in notification.items():
+                    if pd.notna(value) and isinstance(value, (pd.Timestamp, datetime)):
+                        notification[key] = str(value)
         
-        print(f"Returning {len(notifications)} notifications", flush=True)
-        print("="*80 + "\n", flush=True)
-        sys.stdout.flush()
+        log.debug("Returning %s notifications", len(notifications))
         
         return notifications
         
     except Exception as e:
-        print(f"ERROR in get_notifications: {str(e)}", flush=True)
-        import traceback
-        traceback.print_exc()
-        sys.stdout.flush()
+        log.exception(f"ERROR in get_notifications: {str(e)}")
+        return []
+
+@app.get("/notifications/history")
+async def get_notification_history(product_sku: str, limit: int = 52):
+    """Stock and Status of one product across the most recent notification batches"""
+    try:
+        if not engine:
+            return []
+
+        query = text('''
+            SELECT batch_id, created_at, "Stock", "Last_Stock", "Status", "Reorder_Qty"
+            FROM stock_notification_history
+            WHERE "Product_SKU" = :sku
+            ORDER BY created_at DESC
+            LIMIT :limit
+        ''')
+        with timed("db"):
+            with engine.connect() as conn:
+                rows = conn.execute(query, {"sku": product_sku, "limit": max(1, min(limit, 1000))}).mappings().all()
+        record_rows(len(rows))
+
+        return [{**row, "created_at": str(row["created_at"])} for row in rows]
+
+    except Exception as e:
+        log.exception(f"ERROR in get_notification_history: {str(e)}")
         return []
 
 @app.get("/notifications/check_base_stock")
 async def check_base_stock():
     """Check if base_stock table exists and has data"""
     try:
-        print("[Backend] Checking base_stock table...")
+        log.debug("Checking base_stock table...")
         
         if not engine:
             return {"exists": False, "count": 0}
@@ -293,11 +346,11 @@ async def check_base_stock():
         result = pd.read_sql(query, engine)
         count = int(result.iloc[0]['count'])
         
-        print(f"[Backend] base_stock exists with {count} rows")
+        log.debug("base_stock exists with %s rows", count)
         return {"exists": count > 0, "count": count}
         
     except Exception as e:
-        print(f"[Backend] base_stock table doesn't exist or error: {str(e)}")
+        log.error(f"base_stock table doesn't exist or error: {str(e)}")
         return {"exists": False, "count": 0}
 
 @app.post("/notifications/upload")
@@ -307,15 +360,15 @@ async def upload_stock_files(
 ):
     """Upload stock files and generate notifications"""
     try:
-        print("[Backend] Processing stock upload...")
+        log.info("Processing stock upload...")
         
         # Read current stock file using fallback header detection (handles CSV/XLSX with odd headers)
         current_content = await current_stock.read()
         try:
             df_curr, curr_header = load_excel_with_fallback_bytes(current_content)
-            print(f"[Backend] Current stock loaded (detected header={curr_header}): {len(df_curr)} rows")
+            log.info(f"Current stock loaded (detected header={curr_header}): {len(df_curr)} rows")
         except Exception as e:
-            print(f"[Backend] Failed to parse current stock file: {e}")
+            log.error(f"Failed to parse current stock file: {e}")
             raise HTTPException(status_code=400, detail="Unable to parse current stock file")
 
         # Check if base_stock exists and attempt to load previous stock from DB
@@ -326,9 +379,9 @@ async def upload_stock_files(
             df_prev = pd.read_sql(query, engine)
             if not df_prev.empty:
                 base_stock_exists = True
-                print(f"[Backend] Loaded previous stock from database: {len(df_prev)} rows")
+                log.info(f"Loaded previous stock from database: {len(df_prev)} rows")
         except Exception as e:
-            print(f"[Backend] base_stock table doesn't exist or error during read: {str(e)}")
+            log.error(f"base_stock table doesn't exist or error during read: {str(e)}")
 
         # If base_stock doesn't exist, require previous stock file and parse with fallback
         if not base_stock_exists:
@@ -340,9 +393,9 @@ async def upload_stock_files(
             prev_content = await previous_stock.read()
             try:
                 df_prev, prev_header = load_excel_with_fallback_bytes(prev_content)
-                print(f"[Backend] Previous stock loaded from file (detected header={prev_header}): {len(df_prev)} rows")
+                log.info(f"Previous stock loaded from file (detected header={prev_header}): {len(df_prev)} rows")
             except Exception as e:
-                print(f"[Backend] Failed to parse previous stock file: {e}")
+                log.error(f"Failed to parse previous stock file: {e}")
                 raise HTTPException(status_code=400, detail="Unable to parse previous stock file")
         
         df_curr = df_curr.rename(columns={
@@ -366,51 +419,16 @@ async def upload_stock_files(
         df_curr["stock_level"] = pd.to_numeric(df_curr["stock_level"], errors='coerce').fillna(0).astype(int)
         df_prev["stock_level"] = pd.to_numeric(df_prev["stock_level"], errors='coerce').fillna(0).astype(int)
         
-        # Generate stock report
-        print("[Backend] Generating stock report...")
+        # Generate stock report (change_type is set in the write transaction below)
+        log.info("Generating stock report...")
         report_df = generate_stock_report(df_prev, df_curr)
-        print(f"[Backend] Report generated: {len(report_df)} items")
-        
-        report_df['unchanged_counter'] = 0
-        report_df['flag'] = 'stage'
+        log.info(f"Report generated: {len(report_df)} items")
         
         # Calculate flags based on stock changes
-        print("[Backend] Calculating stock flags...")
-        for idx, row in report_df.iterrows():
-            product_sku = row.get('Product_SKU', '')
-            current_stock_level = row.get('Stock', 0)
-            last_stock_level = row.get('Last_Stock', 0)
-            
-            # Get previous counter and flag from base_stock if exists
-            prev_counter = 0
-            prev_flag = 'stage'
-            
-            if base_stock_exists and not df_prev.empty:
-                prev_row = df_prev[df_prev['product_sku'] == product_sku]
-                if not prev_row.empty:
-                    prev_counter = prev_row.iloc[0].get('unchanged_counter', 0)
-                    prev_flag = prev_row.iloc[0].get('flag', 'stage')
-            
-            # Apply flag logic
-            if current_stock_level == last_stock_level:
-                new_counter = prev_counter + 1
-                new_flag = 'inactive' if new_counter >= 4 else prev_flag
-            elif current_stock_level < last_stock_level:
-                new_counter = 0
-                new_flag = 'active'
-            else:  # current_stock_level > last_stock_level
-                new_counter = 0
-                new_flag = 'just added stock'
-            
-            report_df.at[idx, 'unchanged_counter'] = new_counter
-            report_df.at[idx, 'flag'] = new_flag
-        
-        # Save report to stock_notifications table
-        print("[Backend] Saving to stock_notifications table...")
-        report_df['created_at'] = datetime.now()
-        report_df.to_sql('stock_notifications', engine, if_exists='replace', index=False)
+        log.info("Calculating stock flags...")
+        compute_stock_flags(report_df, df_prev, base_stock_exists)
         
-        print("[Backend] Updating base_stock table...")
+        log.info("Updating base_stock table...")
         
         flag_map = dict(zip(report_df['Product_SKU'], report_df['flag']))
         counter_map = dict(zip(report_df['Product_SKU'], report_df['unchanged_counter']))
@@ -429,44 +447,66 @@ async def upload_stock_files(
                 'updated_at': datetime.now()
             })
         
-        base_stock_df = pd.DataFrame(base_stock_data)
+        base_stock_df = pd.DataFrame(base_stock_data, columns=['product_name', 'product_sku', 'stock_level', 'หมวดหมู่',
+                                                               'unchanged_counter', 'flag', 'updated_at'])
+        # INTEGER column in base_stock; previous counters read back from the DB may be float / NULL
+        base_stock_df['unchanged_counter'] = pd.to_numeric(base_stock_df['unchanged_counter'], errors='coerce').fillna(0).astype(int)
         
-        # Clear and insert new data
+        # Append the report as a new notification batch (stock_notifications shows the latest
+        # one) and replace the base_stock rows, in one transaction
+        log.info("Saving notification batch and base_stock table...")
         with engine.begin() as conn:
+            # One upload at a time: classify against the batch this one actually follows,
+            # read under the lock and in the same transaction as the append
+            advisory_xact_lock(conn, NOTIFICATION_LOCK_KEY)
+            report_df['change_type'] = classify_changes(report_df, previous_batch_status(conn))
+            changes = report_df['change_type'].value_counts().reindex(CHANGE_TYPES, fill_value=0)
+            log.info(f"Changes against the previous batch: {dict(changes)}")
+            batch_id, _ = append_notification_batch(conn, report_df)
             conn.execute(text("DELETE FROM base_stock"))
-        base_stock_df.to_sql('base_stock', engine, if_exists='append', index=False)
-        
-        print("[Backend] ✅ Upload completed successfully")
+            copy_dataframe(conn, base_stock_df, 'base_stock')
+            # Delivered to /events clients when this transaction commits
+            events.publish(conn, "base_stock", rows=len(base_stock_df))
+            alerts = report_df[report_df['Status'].isin(['Red', 'Yellow'])
+                               & report_df['change_type'].isin(['new', 'escalated'])]
+            if not alerts.empty:
+                events.publish(conn, "notifications", batch_id=batch_id,
+                               red=int((alerts['Status'] == 'Red').sum()),
+                               yellow=int((alerts['Status'] == 'Yellow').sum()))
+        
+        log.info("✅ Upload completed successfully")
         return {
             "success": True,
             "message": "Stock files processed successfully",
-            "notifications_count": len(report_df)
+            "notifications_count": len(report_df),
+            "batch_id": batch_id,
+            "changes": {change: int(n) for change, n in changes.items()}
         }
         
     except Exception as e:
-        print(f"[Backend] ❌ Error in upload: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error in upload: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/notifications/clear_base_stock")
 async def clear_base_stock():
-    """Clear both base_stock and stock_notifications tables"""
+    """Clear base_stock and the current notifications (history batches are kept)"""
     try:
-        print("[Backend] Clearing base_stock and stock_notifications tables...")
+        log.info("Clearing base_stock and stock_notifications tables...")
         
         if not engine:
             raise HTTPException(status_code=500, detail="Database not available")
         
         with engine.begin() as conn:
             conn.execute(text("DELETE FROM base_stock"))
-            conn.execute(text("DELETE FROM stock_notifications"))
+            # An empty batch becomes the latest one, so stock_notifications reads as empty
+            append_notification_batch(conn, pd.DataFrame(columns=HISTORY_COLUMNS))
+            events.publish(conn, "base_stock", rows=0)
         
-        print("[Backend] ✅ base_stock and stock_notifications cleared")
+        log.info("✅ base_stock and stock_notifications cleared")
         return {"success": True, "message": "Stock data cleared successfully"}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error clearing stock data: {str(e)}")
+        log.error(f"❌ Error clearing stock data: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/notifications/update_manual_values")
@@ -477,169 +517,201 @@ async def update_manual_values_endpoint(
 ):
     """Update manual MinStock and Buffer values and recalculate that product"""
     try:
-        print(f"[Backend] Updating manual values for {product_sku}: MinStock={minstock}, Buffer={buffer}")
+        log.info(f"Updating manual values for {product_sku}: MinStock={minstock}, Buffer={buffer}")
         
         if not engine:
             raise HTTPException(status_code=500, detail="Database not available")
         
-        # Detect which column holds the SKU in stock_notifications, then SELECT using that column
-        try:
-            cols_res = engine.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'stock_notifications'")).fetchall()
-            existing_cols = [c[0] for c in cols_res]
-            print(f"[Backend] detected stock_notifications columns: {existing_cols}")
-        except Exception as e:
-            print(f"[Backend] Failed to fetch information_schema columns: {e}")
-            existing_cols = []
-
-        # Prefer SKU-like columns in this order
-        preferred = ['Product_SKU', 'product_sku', 'Product', 'product']
-        sku_col = None
-        for p in preferred:
-            if p in existing_cols:
-                sku_col = p
-                break
-
-        # fallback: any column name containing 'sku'
-        if sku_col is None:
-            for c in existing_cols:
-                if 'sku' in c.lower():
-                    sku_col = c
-                    break
-
-        if sku_col is None:
-            raise HTTPException(status_code=404, detail=f"No SKU column found in stock_notifications table")
-
-        # Build safe SELECT using the exact column name (quote it)
-        select_sql = text(f'SELECT * FROM stock_notifications WHERE "{sku_col}" = :sku')
-        try:
-            df_notification = pd.read_sql(select_sql, engine, params={"sku": product_sku})
-        except Exception as e:
-            print(f"[Backend] SELECT by SKU failed using column {sku_col}: {e}")
-            raise HTTPException(status_code=500, detail=str(e))
-
-        print(f"[Backend] stock_notifications columns after select: {df_notification.columns.tolist()}")
-
-        if df_notification.empty:
-            raise HTTPException(status_code=404, detail=f"Product {product_sku} not found in notifications")
-
-        row = df_notification.iloc[0]
-
-        # Normalize column name lookup (case-insensitive) for stock/last_stock
-        def find_col(cols, name_lower):
-            for c in cols:
-                if c.lower() == name_lower:
-                    return c
-            return None
-
-        cols = df_notification.columns.tolist()
-        stock_col = find_col(cols, 'stock') or find_col(cols, 'quantity') or 'Stock'
-        last_stock_col = find_col(cols, 'last_stock') or 'Last_Stock'
-
-        # Get values from the row safely
-        try:
-            stock = int(row.get(stock_col, row.get('Stock', 0) or 0))
-        except Exception:
-            stock = int(row.get('Stock', 0) or 0)
-        try:
-            last_stock = int(row.get(last_stock_col, row.get('Last_Stock', stock) or stock))
-        except Exception:
-            last_stock = int(row.get('Last_Stock', stock) or stock)
-        weekly_sale = max((last_stock - stock), 1)
-        decrease_rate = ((last_stock - stock) / last_stock * 100) if last_stock > 0 else 0
-        weeks_to_empty = stock / weekly_sale if weekly_sale > 0 else 0
-        
-        # Apply manual values or use defaults
-        if minstock is not None:
-            new_minstock = minstock
-        else:
-            new_minstock = int(weekly_sale * 2 * 1.5)  # WEEKS_TO_COVER = 2, SAFETY_FACTOR = 1.5
+        cols = notification_columns(engine)
+        
+        # Recalculate and persist in one statement; the CTE reads the row through the
+        # SKU index and applies the same formulas as Notification.generate_stock_report
+        update_sql = text(f'''
+            WITH cur AS (
+                SELECT "{cols['sku']}" AS sku,
+                       "{cols['stock']}" AS stock,
+                       COALESCE("{cols['last_stock']}", "{cols['stock']}") AS last_stock
+                FROM stock_notifications
+                WHERE "{cols['sku']}" = :sku
+            ), rates AS (
+                SELECT sku, stock,
+                       GREATEST(last_stock - stock, 1) AS weekly_sale,
+                       CASE WHEN last_stock > 0
+                            THEN (last_stock - stock)::numeric / last_stock * 100
+                            ELSE 0 END AS decrease_rate
+                FROM cur
+            ), vals AS (
+                SELECT sku, stock, weekly_sale, decrease_rate,
+                       COALESCE(CAST(:minstock AS INTEGER),
+                                FLOOR(weekly_sale * :weeks_to_cover * :safety_factor)::int) AS minstock,
+                       COALESCE(CAST(:buffer AS INTEGER),
+                                LEAST(CASE WHEN decrease_rate > 50 THEN 20
+                                           WHEN decrease_rate > 20 THEN 10
+                                           ELSE 5 END, :max_buffer)) AS buffer
+                FROM rates
+            ), calc AS (
+                SELECT sku, minstock, buffer,
+                       GREATEST(minstock + buffer - stock, FLOOR(weekly_sale * :safety_factor)::int) AS reorder_qty,
+                       CASE WHEN stock < minstock OR decrease_rate > 50 THEN 'Red'
+                            WHEN decrease_rate > 20 THEN 'Yellow'
+                            ELSE 'Green' END AS status
+                FROM vals
+            )
+            UPDATE stock_notifications AS n
+            SET "{cols['minstock']}" = calc.minstock,
+                "{cols['buffer']}" = calc.buffer,
+                "{cols['reorder_qty']}" = calc.reorder_qty,
+                "{cols['status']}" = calc.status,
+                "{cols['description']}" = CASE calc.status
+                    WHEN 'Red' THEN 'Decreasing rapidly and nearly out of stock! Recommend restocking ' || calc.reorder_qty || ' units'
+                    WHEN 'Yellow' THEN 'Decreasing rapidly, should prepare to restock. Recommend restocking ' || calc.reorder_qty || ' units'
+                    ELSE 'Stock is sufficient' END
+            FROM calc
+            WHERE n."{cols['sku']}" = calc.sku
+            RETURNING calc.minstock, calc.buffer, calc.reorder_qty, calc.status
+        ''')
         
-        if buffer is not None:
-            new_buffer = buffer
-        else:
-            if decrease_rate > 50:
-                new_buffer = 20
-            elif decrease_rate > 20:
-                new_buffer = 10
-            else:
-                new_buffer = 5
-            new_buffer = min(new_buffer, 50)  # MAX_BUFFER = 50
-        
-        # Calculate new reorder quantity
-        default_reorder = int(weekly_sale * 1.5)
-        new_reorder_qty = max(new_minstock + new_buffer - stock, default_reorder)
-        
-        # Determine status
-        is_red = (stock < new_minstock) or (decrease_rate > 50)
-        is_yellow = (not is_red) and (decrease_rate > 20)
-        
-        if is_red:
-            new_status = 'Red'
-            new_description = f'Decreasing rapidly and nearly out of stock! Recommend restocking {new_reorder_qty} units'
-        elif is_yellow:
-            new_status = 'Yellow'
-            new_description = f'Decreasing rapidly, should prepare to restock. Recommend restocking {new_reorder_qty} units'
-        else:
-            new_status = 'Green'
-            new_description = 'Stock is sufficient'
-        
-        # Determine actual column names in DB (case-insensitive match)
-        def pick_col(cols, *candidates_lower):
-            for cand in candidates_lower:
-                for c in cols:
-                    if c.lower() == cand.lower():
-                        return c
-            return None
-
-        cols = df_notification.columns.tolist()
-        col_minstock = pick_col(cols, 'minstock', 'MinStock') or 'MinStock'
-        col_buffer = pick_col(cols, 'buffer', 'Buffer') or 'Buffer'
-        col_reorder = pick_col(cols, 'reorder_qty', 'Reorder_Qty') or 'Reorder_Qty'
-        col_status = pick_col(cols, 'status', 'Status') or 'Status'
-        col_description = pick_col(cols, 'description', 'Description') or 'Description'
-        col_sku = pick_col(cols, 'product_sku', 'Product_SKU') or 'Product_SKU'
-
-        print(f"[Backend] Updating columns: {col_minstock}, {col_buffer}, {col_reorder}, {col_status}, {col_description} WHERE {col_sku}={product_sku}")
-
-        update_sql = f'''
-            UPDATE stock_notifications
-            SET "{col_minstock}" = :minstock,
-                "{col_buffer}" = :buffer,
-                "{col_reorder}" = :reorder_qty,
-                "{col_status}" = :status,
-                "{col_description}" = :description
-            WHERE "{col_sku}" = :sku
-        '''
-
-        update_query = text(update_sql)
-
         with engine.begin() as conn:
-            conn.execute(update_query, {
-                "minstock": new_minstock,
-                "buffer": new_buffer,
-                "reorder_qty": new_reorder_qty,
-                "status": new_status,
-                "description": new_description,
-                "sku": product_sku
-            })
+            # Persist the override first; values not given fall back to earlier overrides
+            effective, version = overrides.write(conn, [{"product_sku": product_sku, "minstock": minstock, "buffer": buffer}])
+            updated = conn.execute(update_sql, {
+                "sku": product_sku,
+                "minstock": effective[0]["minstock"],
+                "buffer": effective[0]["buffer"],
+                "weeks_to_cover": WEEKS_TO_COVER,
+                "safety_factor": SAFETY_FACTOR,
+                "max_buffer": MAX_BUFFER,
+            }).fetchone()
+            
+            if updated is None:
+                # Rolls back the override as well
+                raise HTTPException(status_code=404, detail=f"Product {product_sku} not found in notifications")
+        
+        overrides.apply_local(effective, version)
         
-        print(f"[Backend] ✅ Updated manual values for {product_sku}")
+        new_minstock, new_buffer, new_reorder_qty, new_status = updated
+        
+        log.info(f"✅ Updated manual values for {product_sku}")
         return {
             "success": True,
             "message": "Manual values updated successfully",
             "product_sku": product_sku,
-            "minstock": new_minstock,
-            "buffer": new_buffer,
-            "reorder_qty": new_reorder_qty,
+            "minstock": int(new_minstock),
+            "buffer": int(new_buffer),
+            "reorder_qty": int(new_reorder_qty),
             "status": new_status
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[Backend] ❌ Error updating manual values: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error updating manual values: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ManualValueUpdate(BaseModel):
+    product_sku: str
+    minstock: Optional[int] = None
+    buffer: Optional[int] = None
+
+class ManualValuesBatch(BaseModel):
+    updates: List[ManualValueUpdate]
+
+@app.post("/notifications/update_manual_values/batch")
+async def update_manual_values_batch(payload: ManualValuesBatch):
+    """Update manual MinStock/Buffer for many products and recalculate them in one transaction"""
+    try:
+        if not engine:
+            raise HTTPException(status_code=500, detail="Database not available")
+        
+        if not payload.updates:
+            return {"success": True, "message": "No updates provided", "updated": 0, "not_found": [], "results": []}
+        
+        # Last entry wins when a SKU is repeated
+        requested = pd.DataFrame([u.dict() for u in payload.updates]).drop_duplicates(subset='product_sku', keep='last')
+        requested = requested.astype(object).where(requested.notna(), None)
+        skus = requested['product_sku'].tolist()
+        log.info(f"Batch updating manual values for {len(skus)} products")
+        
+        cols = notification_columns(engine)
+        select_sql = text(f'''
+            SELECT "{cols['sku']}" AS "Product_SKU",
+                   "{cols['stock']}" AS "Stock",
+                   "{cols['last_stock']}" AS "Last_Stock"
+            FROM stock_notifications
+            WHERE "{cols['sku']}" = ANY(:skus)
+            FOR UPDATE
+        ''')
+        
+        with engine.begin() as conn:
+            with timed("db"):
+                rows = pd.DataFrame(conn.execute(select_sql, {"skus": skus}).fetchall(),
+                                    columns=['Product_SKU', 'Stock', 'Last_Stock'])
+            rows = rows.drop_duplicates(subset='Product_SKU', keep='last')
+            
+            if rows.empty:
+                return {"success": True, "message": "No matching products found", "updated": 0, "not_found": skus, "results": []}
+            
+            # Persist overrides for the rows that exist; the stored values (including
+            # earlier overrides for fields left empty) drive the recalculation
+            known = set(rows['Product_SKU'])
+            effective, version = overrides.write(
+                conn, [r for r in requested.to_dict('records') if r['product_sku'] in known]
+            )
+            effective_df = pd.DataFrame(effective, columns=['product_sku', 'minstock', 'buffer'])
+            recalculated = recalculate_stock_rows(rows, effective_df.rename(columns={'product_sku': 'Product_SKU'}))
+            
+            # One UPDATE ... FROM (VALUES ...) for every affected row
+            params = {}
+            values_sql = []
+            for i, r in enumerate(recalculated.itertuples(index=False)):
+                values_sql.append(
+                    f"(CAST(:sku{i} AS TEXT), CAST(:min{i} AS INTEGER), CAST(:buf{i} AS INTEGER), "
+                    f"CAST(:reo{i} AS INTEGER), CAST(:st{i} AS TEXT), CAST(:desc{i} AS TEXT))"
+                )
+                params[f"sku{i}"] = str(r.Product_SKU)
+                params[f"min{i}"] = int(r.MinStock)
+                params[f"buf{i}"] = int(r.Buffer)
+                params[f"reo{i}"] = int(r.Reorder_Qty)
+                params[f"st{i}"] = str(r.Status)
+                params[f"desc{i}"] = str(r.Description)
+            
+            update_sql = text(f'''
+                UPDATE stock_notifications AS n
+                SET "{cols['minstock']}" = v.minstock,
+                    "{cols['buffer']}" = v.buffer,
+                    "{cols['reorder_qty']}" = v.reorder_qty,
+                    "{cols['status']}" = v.status,
+                    "{cols['description']}" = v.description
+                FROM (VALUES {", ".join(values_sql)})
+                    AS v(sku, minstock, buffer, reorder_qty, status, description)
+                WHERE n."{cols['sku']}" = v.sku
+            ''')
+            with timed("db"):
+                conn.execute(update_sql, params)
+        
+        overrides.apply_local(effective, version)
+        
+        found = set(recalculated['Product_SKU'])
+        not_found = [sku for sku in skus if sku not in found]
+        results = (recalculated[['Product_SKU', 'MinStock', 'Buffer', 'Reorder_Qty', 'Status']]
+                   .rename(columns={'Product_SKU': 'product_sku', 'MinStock': 'minstock', 'Buffer': 'buffer',
+                                    'Reorder_Qty': 'reorder_qty', 'Status': 'status'})
+                   .to_dict('records'))
+        record_rows(len(results))
+        
+        log.info(f"✅ Batch updated {len(results)} products ({len(not_found)} not found)")
+        return {
+            "success": True,
+            "message": "Manual values updated successfully",
+            "updated": len(results),
+            "not_found": not_found,
+            "results": results
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception(f"❌ Error batch updating manual values: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============================================================================
@@ -654,7 +726,7 @@ async def get_stock_levels(
 ):
     """Get stock levels from base_stock table"""
     try:
-        print("[Backend] Fetching stock levels from base_stock...")
+        log.debug("Fetching stock levels from base_stock...")
         
         if not engine:
             return {"success": False, "data": []}
@@ -695,30 +767,31 @@ async def get_stock_levels(
         else:
             query = text(str(query) + " ORDER BY product_name ASC")
         
-        df = pd.read_sql(query, engine, params=params if params else None)
+        with timed("db"):
+            df = pd.read_sql(query, engine, params=params if params else None)
+        record_rows(len(df))
         
         if not df.empty:
-            print(f"[Backend] ✅ Retrieved {len(df)} stock items")
-            # Convert datetime to string
-            for idx, row in df.iterrows():
-                if 'updated_at' in df.columns and pd.notna(row['updated_at']):
-                    df.at[idx, 'updated_at'] = str(row['updated_at'])
-            return {"success": True, "data": df.to_dict('records')}
+            log.debug("✅ Retrieved %s stock items", len(df))
+            with timed("serialize"):
+                # Convert datetime to string
+                if 'updated_at' in df.columns:
+                    df['updated_at'] = df['updated_at'].astype(str).where(df['updated_at'].notna(), None)
+                records = df.to_dict('records')
+            return {"success": True, "data": records}
         else:
-            print("[Backend] No stock data found")
+            log.debug("No stock data found")
             return {"success": True, "data": []}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching stock levels: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching stock levels: {str(e)}")
         return {"success": False, "data": [], "error": str(e)}
 
 @app.get("/stock/categories")
 async def get_stock_categories():
     """Get unique stock categories from base_stock"""
     try:
-        print("[Backend] Fetching stock categories...")
+        log.debug("Fetching stock categories...")
         
         if not engine:
             return {"success": False, "data": []}
@@ -729,16 +802,16 @@ async def get_stock_categories():
             
             if not df.empty:
                 categories = df['category'].tolist()
-                print(f"[Backend] ✅ Found {len(categories)} categories")
+                log.debug("✅ Found %s categories", len(categories))
                 return {"success": True, "data": categories}
             else:
                 return {"success": True, "data": []}
         except Exception as db_error:
-            print(f"[Backend] Error fetching categories: {str(db_error)}")
+            log.error(f"Error fetching categories: {str(db_error)}")
             return {"success": True, "data": []}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error in get_stock_categories: {str(e)}")
+        log.error(f"❌ Error in get_stock_categories: {str(e)}")
         return {"success": False, "data": []}
 
 # ============================================================================
@@ -749,7 +822,7 @@ async def get_stock_categories():
 async def get_dashboard_analytics():
     """Get dashboard analytics data"""
     try:
-        print("[Backend] Fetching dashboard analytics...")
+        log.debug("Fetching dashboard analytics...")
         
         if not engine:
             return {
@@ -806,9 +879,7 @@ async def get_dashboard_analytics():
         }
         
     except Exception as e:
-        print(f"[Backend] ❌ Error in dashboard analytics: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error in dashboard analytics: {str(e)}")
         return {
             "success": False,
             "data": {
@@ -824,7 +895,7 @@ async def get_dashboard_analytics():
 async def get_analysis_base_skus(search: str = Query("", description="Search term for base SKUs or categories")):
     """Get unique base SKUs from base_stock for analysis, searchable by SKU or category"""
     try:
-        print(f"[Backend] Fetching base SKUs with search: '{search}'")
+        log.debug("Fetching base SKUs with search: '%s'", search)
         
         if not engine:
             return {"success": False, "base_skus": [], "results": [], "total": 0}
@@ -847,29 +918,25 @@ async def get_analysis_base_skus(search: str = Query("", description="Search ter
             if not df.empty:
                 # Return both SKU and category for display
                 results = df.to_dict('records')
-                print(f"[Backend] ✅ Found {len(results)} items matching search")
+                log.debug("✅ Found %s items matching search", len(results))
                 return {"success": True, "base_skus": [item['product_sku'] for item in results], "results": results, "total": len(results)}
             else:
-                print("[Backend] No items found")
+                log.debug("No items found")
                 return {"success": True, "base_skus": [], "results": [], "total": 0}
                 
         except Exception as db_error:
-            print(f"[Backend] Database query failed: {str(db_error)}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Database query failed: {str(db_error)}")
             return {"success": False, "base_skus": [], "results": [], "total": 0}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching base SKUs: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching base SKUs: {str(e)}")
         return {"success": False, "base_skus": [], "results": [], "total": 0}
 
 @app.get("/analysis/historical")
 async def get_analysis_historical_sales(sku: str = Query(..., description="Product SKU or category to analyze")):
     """Get historical stock data from base_stock table"""
     try:
-        print(f"[Backend] Fetching historical stock data for: {sku}")
+        log.debug("Fetching historical stock data for: %s", sku)
         
         if not engine:
             return {"success": False, "message": "Database not available", "chart_data": [], "table_data": [], "search_type": "unknown"}
@@ -887,7 +954,7 @@ async def get_analysis_historical_sales(sku: str = Query(..., description="Produ
                 is_sku = sku_result.fetchone()[0] > 0
             
             if is_sku:
-                print(f"[Backend] Detected SKU search for: {sku}")
+                log.debug("Detected SKU search for: %s", sku)
                 
                 sales_query = text("""
                     SELECT 
@@ -939,7 +1006,7 @@ async def get_analysis_historical_sales(sku: str = Query(..., description="Produ
                 }
             
             else:
-                print(f"[Backend] Detected category search for: {sku}")
+                log.debug("Detected category search for: %s", sku)
                 
                 category_query = text("""
                     SELECT 
@@ -986,9 +1053,7 @@ async def get_analysis_historical_sales(sku: str = Query(..., description="Produ
                 }
             
         except Exception as db_error:
-            print(f"[Backend] Database query failed: {str(db_error)}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Database query failed: {str(db_error)}")
             return {
                 "success": False,
                 "message": f"Database error: {str(db_error)}",
@@ -998,9 +1063,7 @@ async def get_analysis_historical_sales(sku: str = Query(..., description="Produ
             }
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching historical stock: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching historical stock: {str(e)}")
         return {
             "success": False,
             "message": f"Error: {str(e)}",
@@ -1009,12 +1072,51 @@ async def get_analysis_historical_sales(sku: str = Query(..., description="Produ
             "search_type": "unknown"
         }
 
+@app.get("/analysis/size_mix")
+async def get_analysis_size_mix(sku: str = Query(..., description="Product SKU or base SKU")):
+    """Monthly quantity per size for a base SKU (grouped bar chart), from the precomputed size-mix cube"""
+    try:
+        if not engine:
+            return {"success": False, "message": "Database not available", "sizes": [], "chart_data": [], "table_data": []}
+
+        with timed("db"):
+            pivot = analysis_store.size_mix(sku)
+        record_rows(pivot.size)
+
+        if pivot.empty:
+            return {"success": True, "message": "No sales data found for this SKU", "sizes": [], "chart_data": [], "table_data": []}
+
+        with timed("serialize"):
+            sizes = [str(c) for c in pivot.columns]
+            values = pivot.to_numpy()
+            chart_data = [
+                {"month": f"{stamp:%Y-%m}", **{size: int(v) for size, v in zip(sizes, row)}}
+                for stamp, row in zip(pivot.index, values)
+            ]
+            table_data = [
+                {"size": size, "total_quantity": int(total)}
+                for size, total in zip(sizes, values.sum(axis=0))
+            ]
+
+        return {
+            "success": True,
+            "message": "Size mix retrieved successfully",
+            "base_sku": str(sku).split("-")[0].strip(),
+            "sizes": sizes,
+            "chart_data": chart_data,
+            "table_data": table_data,
+        }
+
+    except Exception as e:
+        log.exception(f"❌ Error fetching size mix: {str(e)}")
+        return {"success": False, "message": f"Error: {str(e)}", "sizes": [], "chart_data": [], "table_data": []}
+
 @app.post("/analysis/performance")
 async def get_analysis_performance(request: dict):
-    """Get performance comparison data from base_data table"""
+    """Compare monthly sales of SKUs and/or base SKU families from base_data"""
     try:
         sku_list = request.get('sku_list', [])
-        print(f"[Backend] Fetching performance comparison for SKUs: {sku_list}")
+        log.info(f"Fetching performance comparison for SKUs: {sku_list}")
         
         if not engine:
             return {"success": False, "message": "Database not available", "chart_data": {}, "table_data": []}
@@ -1023,26 +1125,12 @@ async def get_analysis_performance(request: dict):
             return {"success": False, "message": "No SKUs provided", "chart_data": {}, "table_data": []}
         
         try:
-            placeholders = ', '.join([f':sku{i}' for i in range(len(sku_list))])
-            query = text(f"""
-                SELECT 
-                    product_sku as "Item",
-                    product_name as "Product_name",
-                    EXTRACT(MONTH FROM sales_date) as month,
-                    SUM(total_quantity) as "Quantity"
-                FROM base_data
-                WHERE product_sku IN ({placeholders})
-                GROUP BY product_sku, product_name, EXTRACT(MONTH FROM sales_date)
-                ORDER BY product_sku, month
-            """)
-            
-            # Create params dict
-            params = {f'sku{i}': sku for i, sku in enumerate(sku_list)}
-            
-            df = pd.read_sql(query, engine, params=params)
+            with timed("db"):
+                chart_data, table_data = compare_performance(engine, sku_list)
+            record_rows(len(table_data))
             
-            if df.empty:
-                print(f"[Backend] No performance data found for SKUs: {sku_list}")
+            if not table_data:
+                log.info(f"No performance data found for SKUs: {sku_list}")
                 return {
                     "success": True,
                     "message": "No data found for selected SKUs",
@@ -1050,34 +1138,16 @@ async def get_analysis_performance(request: dict):
                     "table_data": []
                 }
             
-            print(f"[Backend] ✅ Retrieved {len(df)} performance records")
-            
-            # Prepare chart data (scatter plot format)
-            chart_data = {}
-            for sku in sku_list:
-                sku_data = df[df['Item'] == sku]
-                if not sku_data.empty:
-                    chart_data[sku] = [
-                        {"month": int(row['month']), "value": int(row['Quantity'])}
-                        for _, row in sku_data.iterrows()
-                    ]
-            
-            # Prepare table data (aggregated totals)
-            table_data = df.groupby(['Item', 'Product_name']).agg({
-                'Quantity': 'sum'
-            }).reset_index()
-            
+            log.info(f"✅ Retrieved performance data for {len(table_data)} items")
             return {
                 "success": True,
                 "message": "Performance data retrieved successfully",
                 "chart_data": chart_data,
-                "table_data": table_data.to_dict('records')
+                "table_data": table_data
             }
             
         except Exception as db_error:
-            print(f"[Backend] Database query failed: {str(db_error)}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Database query failed: {str(db_error)}")
             return {
                 "success": False,
                 "message": f"Database error: {str(db_error)}",
@@ -1086,9 +1156,7 @@ async def get_analysis_performance(request: dict):
             }
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching performance comparison: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching performance comparison: {str(e)}")
         return {
             "success": False,
             "message": f"Error: {str(e)}",
@@ -1098,63 +1166,77 @@ async def get_analysis_performance(request: dict):
 
 @app.get("/analysis/best_sellers")
 async def get_analysis_best_sellers(
-    year: int = Query(..., description="Year"),
-    month: int = Query(..., description="Month"),
-    limit: int = Query(10, description="Number of top sellers")
+    year: Optional[int] = Query(None, description="Year (single month)"),
+    month: Optional[int] = Query(None, description="Month (single month)"),
+    start: Optional[str] = Query(None, description="First month of a range, YYYY-MM"),
+    end: Optional[str] = Query(None, description="Last month of a range, YYYY-MM (defaults to start)"),
+    limit: int = Query(10, description="Number of top sellers per month"),
+    top_n: Optional[int] = Query(None, description="Alias of limit")
 ):
-    """Get best selling products from base_data table"""
+    """Top-selling base SKUs per month (with best size) from the precomputed monthly rankings"""
     try:
-        print(f"[Backend] Fetching best sellers for {year}-{month:02d} (limit {limit})...")
-        
         if not engine:
-            return {"success": False, "message": "Database not available", "data": []}
-        
+            return {"success": False, "message": "Database not available", "data": [], "months": []}
+
+        limit = top_n or limit
+        if limit < 1 or limit > RANKING_DEPTH:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {RANKING_DEPTH}")
         try:
-            query = text("""
-                SELECT 
-                    product_sku,
-                    product_name,
-                    SUM(total_quantity) as total_quantity_sold
-                FROM base_data
-                WHERE sales_year = :year
-                AND sales_month = :month
-                GROUP BY product_sku, product_name
-                ORDER BY total_quantity_sold DESC
-                LIMIT :limit
-            """)
-            
-            df = pd.read_sql(query, engine, params={"year": year, "month": month, "limit": limit})
-            
-            if not df.empty:
-                result = []
-                for idx, row in df.iterrows():
-                    result.append({
-                        "rank": idx + 1,
-                        "name": row['product_name'],
-                        "base_sku": row['product_sku'],
-                        "size": 'N/A',  # base_data doesn't have size column
-                        "quantity": int(row['total_quantity_sold'])
-                    })
-                
-                print(f"[Backend] ✅ Retrieved {len(result)} best sellers")
-                return {"success": True, "message": "Best sellers retrieved successfully", "data": result}
+            if start:
+                range_start = month_start(start)
+                range_end = month_start(end) if end else range_start
+            elif year is not None and month is not None:
+                range_start = range_end = month_start(f"{year}-{month:02d}")
             else:
-                print(f"[Backend] No best sellers found for {year}-{month:02d}")
-                return {"success": True, "message": "No best sellers found for the specified period", "data": []}
-                
-        except Exception as db_error:
-            print(f"[Backend] Database query failed: {str(db_error)}")
-            return {"success": False, "message": f"Database error: {str(db_error)}", "data": []}
-            
+                raise HTTPException(status_code=400, detail="Provide year and month, or start (and end) as YYYY-MM")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if range_end < range_start:
+            raise HTTPException(status_code=400, detail="end must not be before start")
+
+        log.debug("Fetching best sellers %s..%s (limit %s)...", range_start.date(), range_end.date(), limit)
+        with timed("db"):
+            df = analysis_store.best_sellers(range_start, range_end, limit)
+        record_rows(len(df))
+
+        with timed("serialize"):
+            months = []
+            for stamp, group in df.groupby("YearMonth", sort=True):
+                label = f"{stamp:%Y-%m}"
+                months.append({
+                    "month": label,
+                    "data": [
+                        {
+                            "rank": int(rank),
+                            "name": name,
+                            "base_sku": str(base_sku),
+                            "size": None if pd.isna(size) else str(size),
+                            "quantity": int(qty),
+                            "month": label,
+                        }
+                        for rank, name, base_sku, size, qty in zip(
+                            group["Rank"], group["Product_name"], group["Base_SKU"],
+                            group["Best_Size"], group["Quantity"]
+                        )
+                    ],
+                })
+            data = [item for m in months for item in m["data"]]
+
+        if not data:
+            return {"success": True, "message": "No best sellers found for the specified period", "data": [], "months": []}
+        return {"success": True, "message": "Best sellers retrieved successfully", "data": data, "months": months}
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"[Backend] Error in best_sellers endpoint: {str(e)}")
-        return {"success": False, "message": f"Server error: {str(e)}", "data": []}
+        log.exception(f"Error in best_sellers endpoint: {str(e)}")
+        return {"success": False, "message": f"Server error: {str(e)}", "data": [], "months": []}
 
 @app.get("/analysis/performance-products")
 async def get_performance_products(search: str = Query("", description="Search term for products")):
     """Get products grouped by category from base_stock table"""
     try:
-        print(f"[Backend] Fetching performance products from base_stock with search: '{search}'")
+        log.debug("Fetching performance products from base_stock with search: '%s'", search)
         
         if not engine:
             return {"success": False, "categories": {}, "all_products": []}
@@ -1174,7 +1256,7 @@ async def get_performance_products(search: str = Query("", description="Search t
             df = pd.read_sql(query, engine)
             
             if df.empty:
-                print("[Backend] No products found in base_stock table")
+                log.debug("No products found in base_stock table")
                 return {"success": True, "categories": {}, "all_products": []}
             
             # Apply search filter if provided (only on SKU for search box)
@@ -1192,7 +1274,7 @@ async def get_performance_products(search: str = Query("", description="Search t
             # Also return flat list of all products
             all_products = df[['product_sku', 'product_name', 'category']].to_dict('records')
             
-            print(f"[Backend] ✅ Found {len(categories)} categories with {len(all_products)} total products from base_stock")
+            log.debug("✅ Found %s categories with %s total products from base_stock", len(categories), len(all_products))
             return {
                 "success": True,
                 "categories": categories,
@@ -1200,17 +1282,32 @@ async def get_performance_products(search: str = Query("", description="Search t
             }
             
         except Exception as db_error:
-            print(f"[Backend] Database query failed: {str(db_error)}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Database query failed: {str(db_error)}")
             return {"success": False, "categories": {}, "all_products": []}
             
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching performance products: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching performance products: {str(e)}")
         return {"success": False, "categories": {}, "all_products": []}
 
+def _total_income_query(product_sku="", category=""):
+    """Monthly totals and per-product totals over the same filtered rows, in one GROUPING SETS pass"""
+    q = SelectBuilder("base_data bd").where("bd.total_quantity IS NOT NULL")
+    if product_sku:
+        q.where("bd.product_sku = :product_sku", product_sku=product_sku)
+    if category:
+        # Join with base_stock to filter by category
+        q.join("INNER JOIN base_stock bs ON bd.product_sku = bs.product_sku")
+        q.where('bs."หมวดหมู่" = :category', category=category)
+    return q.build(
+        columns="""GROUPING(bd.sales_year, bd.sales_month) AS by_product,
+               bd.sales_year, bd.sales_month, bd.product_name, bd.product_sku,
+               AVG(bd.total_quantity) AS avg_monthly_quantity,
+               SUM(bd.total_quantity) AS total_quantity""",
+        group_by="GROUPING SETS ((bd.sales_year, bd.sales_month), (bd.product_name, bd.product_sku))",
+        having="GROUPING(bd.product_name) = 1 OR bd.product_name IS NOT NULL",
+        order_by="by_product, bd.sales_year, bd.sales_month, total_quantity DESC",
+    )
+
 @app.get("/analysis/total_income")
 async def get_total_income(product_sku: str = "", category: str = ""):
     """Get total income analysis from base_data table with optional filters"""
@@ -1218,38 +1315,16 @@ async def get_total_income(product_sku: str = "", category: str = ""):
         if not engine:
             return {"success": False, "message": "Database not available"}
         
-        print(f"[Backend] Fetching total income data (product_sku={product_sku}, category={category})...")
-        
-        # Build WHERE clause based on filters
-        where_conditions = ["bd.total_quantity IS NOT NULL"]
-        joins = ""
-        
-        if product_sku:
-            where_conditions.append(f"bd.product_sku = '{product_sku}'")
-        
-        if category:
-            # Join with base_stock to filter by category
-            joins = 'INNER JOIN base_stock bs ON bd.product_sku = bs.product_sku'
-            where_conditions.append(f"bs.\"หมวดหมู่\" = '{category}'")
-        
-        where_clause = " AND ".join(where_conditions)
+        log.debug("Fetching total income data (product_sku=%s, category=%s)...", product_sku, category)
         
-        # Query to get monthly sales totals
-        query = text(f"""
-            SELECT 
-                bd.sales_year,
-                bd.sales_month,
-                SUM(bd.total_quantity) as total_quantity
-            FROM base_data bd
-            {joins}
-            WHERE {where_clause}
-            GROUP BY bd.sales_year, bd.sales_month
-            ORDER BY bd.sales_year, bd.sales_month
-        """)
+        query, params = _total_income_query(product_sku, category)
+        with timed("db"):
+            with engine.connect() as conn:
+                rows = conn.execute(query, params).fetchall()
+        record_rows(len(rows))
         
-        with engine.connect() as conn:
-            result = conn.execute(query)
-            monthly_data = result.fetchall()
+        monthly_data = [r for r in rows if r.by_product == 0]
+        product_data = [r for r in rows if r.by_product != 0]
         
         if not monthly_data:
             return {
@@ -1261,45 +1336,29 @@ async def get_total_income(product_sku: str = "", category: str = ""):
             }
         
         # Format chart data
-        chart_data = []
-        for row in monthly_data:
-            chart_data.append({
-                "month": f"{row[0]}-{row[1]:02d}",
-                "total_income": float(row[2]) if row[2] else 0
-            })
-        
-        # Query to get product-level sales data
-        product_query = text(f"""
-            SELECT 
-                bd.product_name,
-                bd.product_sku,
-                AVG(bd.total_quantity) as avg_monthly_quantity,
-                SUM(bd.total_quantity) as total_quantity
-            FROM base_data bd
-            {joins}
-            WHERE {where_clause} AND bd.product_name IS NOT NULL
-            GROUP BY bd.product_name, bd.product_sku
-            ORDER BY total_quantity DESC
-        """)
-        
-        with engine.connect() as conn:
-            result = conn.execute(product_query)
-            product_data = result.fetchall()
+        chart_data = [
+            {
+                "month": f"{row.sales_year}-{row.sales_month:02d}",
+                "total_income": float(row.total_quantity) if row.total_quantity else 0
+            }
+            for row in monthly_data
+        ]
         
         # Format table data
-        table_data = []
-        for row in product_data:
-            table_data.append({
-                "Product_name": row[0],
-                "Product_sku": row[1],
-                "Avg_Monthly_Revenue_Baht": float(row[2]) if row[2] else 0,
-                "Total_Quantity": int(row[3]) if row[3] else 0
-            })
+        table_data = [
+            {
+                "Product_name": row.product_name,
+                "Product_sku": row.product_sku,
+                "Avg_Monthly_Revenue_Baht": float(row.avg_monthly_quantity) if row.avg_monthly_quantity else 0,
+                "Total_Quantity": int(row.total_quantity) if row.total_quantity else 0
+            }
+            for row in product_data
+        ]
         
         # Calculate grand total
         grand_total = sum(item["total_income"] for item in chart_data)
         
-        print(f"[Backend] ✅ Total quantity sold: {grand_total:,.0f} units (filters: product_sku={product_sku}, category={category})")
+        log.debug("✅ Total quantity sold: %.0f units (filters: product_sku=%s, category=%s)", grand_total, product_sku, category)
         
         return {
             "success": True,
@@ -1309,9 +1368,7 @@ async def get_total_income(product_sku: str = "", category: str = ""):
         }
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching total income: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching total income: {str(e)}")
         return {
             "success": False,
             "message": f"Error: {str(e)}",
@@ -1324,7 +1381,7 @@ async def get_total_income(product_sku: str = "", category: str = ""):
 async def get_search_suggestions(search: str = Query("", description="Search term for SKUs or categories")):
     """Get search suggestions for both SKUs and categories"""
     try:
-        print(f"[Backend] Fetching search suggestions for: '{search}'")
+        log.debug("Fetching search suggestions for: '%s'", search)
         
         if not engine:
             return {"success": False, "suggestions": []}
@@ -1359,21 +1416,17 @@ async def get_search_suggestions(search: str = Query("", description="Search ter
             
             if not df.empty:
                 suggestions = df.to_dict('records')
-                print(f"[Backend] ✅ Found {len(suggestions)} suggestions")
+                log.debug("✅ Found %s suggestions", len(suggestions))
                 return {"success": True, "suggestions": suggestions}
             else:
                 return {"success": True, "suggestions": []}
                 
         except Exception as db_error:
-            print(f"[Backend] Database query failed: {str(db_error)}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"Database query failed: {str(db_error)}")
             return {"success": False, "suggestions": []}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching search suggestions: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching search suggestions: {str(e)}")
         return {"success": False, "suggestions": []}
 
 # ============================================================================
@@ -1383,11 +1436,13 @@ async def get_search_suggestions(search: str = Query("", description="Search ter
 @app.post("/train")
 async def train_model(
     product_file: UploadFile = File(...),
-    sales_file: UploadFile = File(...)
+    sales_file: UploadFile = File(...),
+    profile: bool = Query(False, description="Include cProfile output for the run in the response")
 ):
-    """Train the forecasting model with product and sales data"""
+    """Train the forecasting model with product and sales data; the response includes a per-stage profile"""
+    job_id = job_dir = None
     try:
-        print("[Backend] Starting model training...")
+        log.info("Starting model training...")
         
         if not engine:
             raise HTTPException(status_code=500, detail="Database not available")
@@ -1396,105 +1451,113 @@ async def train_model(
         product_content = await product_file.read()
         sales_content = await sales_file.read()
         
-        print(f"[Backend] Product file: {product_file.filename}")
-        print(f"[Backend] Sales file: {sales_file.filename}")
+        log.info(f"Product file: {product_file.filename}")
+        log.info(f"Sales file: {sales_file.filename}")
         
         import tempfile
         
+        # Uploads and outputs of this run go to its own job directory (see artifacts.py)
+        job_id, job_dir = new_job("train")
+        log.info(f"Training job {job_id} in {job_dir}")
+        
         # Create temporary files
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.xlsx') as product_temp:
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.xlsx', dir=job_dir) as product_temp:
             product_temp.write(product_content)
             product_temp_path = product_temp.name
         
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.xlsx') as sales_temp:
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.xlsx', dir=job_dir) as sales_temp:
             sales_temp.write(sales_content)
             sales_temp_path = sales_temp.name
         
+        profile_run = StageProfile("train", cprofile=profile)
         try:
-            print(f"[Backend] Calling auto_cleaning with sales_path={sales_temp_path}, product_path={product_temp_path}, engine={engine}")
-            df_cleaned = auto_cleaning(sales_temp_path, product_temp_path, engine)
+            with profile_run:
+                log.info(f"Calling auto_cleaning with sales_path={sales_temp_path}, product_path={product_temp_path}, engine={engine}")
+                with profile_stage("auto_cleaning"):
+                    df_cleaned = auto_cleaning(sales_temp_path, product_temp_path, engine, output_dir=job_dir)
             
-            rows_uploaded = len(df_cleaned)
-            print(f"[Backend] Cleaned data: {rows_uploaded} rows")
+                rows_uploaded = len(df_cleaned)
+                log.info(f"Cleaned data: {rows_uploaded} rows")
             
-            response = {
-                "success": True,
-                "data_cleaning": {
-                    "status": "completed",
-                    "rows_uploaded": rows_uploaded,
-                    "message": f"Successfully cleaned and uploaded {rows_uploaded} rows"
-                },
-                "ml_training": {
-                    "status": "pending",
-                    "message": "Training not started"
+                response = {
+                    "success": True,
+                    "job_id": job_id,
+                    "data_cleaning": {
+                        "status": "completed",
+                        "rows_uploaded": rows_uploaded,
+                        "message": f"Successfully cleaned and uploaded {rows_uploaded} rows"
+                    },
+                    "ml_training": {
+                        "status": "pending",
+                        "message": "Training not started"
+                    }
                 }
-            }
             
-            # Train the model
-            print("[Backend] Training forecasting model...")
-            try:
-                df_window_raw, df_window, base_model, X_train, y_train, X_test, y_test, product_sku_last = update_model_and_train(df_cleaned)
+                # Train the model
+                log.info("Training forecasting model...")
+                try:
+                    df_window_raw, df_window, base_model, X_train, y_train, X_test, y_test, product_sku_last = update_model_and_train(df_cleaned)
                 
-                print("[Backend] ✅ Model training completed successfully")
+                    log.info("✅ Model training completed successfully")
                 
-                response["ml_training"] = {
-                    "status": "completed",
-                    "message": "Model trained successfully"
-                }
+                    response["ml_training"] = {
+                        "status": "completed",
+                        "message": "Model trained successfully"
+                    }
                 
-                try:
-                    print("[Backend] Attempting to generate forecasts...")
-                    long_forecast, forecast_results = forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model)
+                    try:
+                        log.info("Attempting to generate forecasts...")
+                        long_forecast, forecast_results = forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model, output_dir=job_dir)
                     
-                    if forecast_results and len(forecast_results) > 0:
-                        # Save forecasts to database
-                        forecast_df = pd.DataFrame(forecast_results)
-                        forecast_df['created_at'] = datetime.now()
+                        if forecast_results and len(forecast_results) > 0:
+                            # Save forecasts to database
+                            forecast_df = pd.DataFrame(forecast_results)
+                            forecast_df['created_at'] = datetime.now()
                         
-                        try:
-                            with engine.begin() as conn:
-                                conn.execute(text("DELETE FROM forecasts"))
-                        except:
-                            # Table might not exist, create it
-                            print("[Backend] Creating forecasts table...")
-                            create_forecasts_table = """
-                                CREATE TABLE IF NOT EXISTS forecasts (
-                                    id SERIAL PRIMARY KEY,
-                                    product_sku VARCHAR(255),
-                                    forecast_date DATE,
-                                    predicted_sales INTEGER,
-                                    current_sales INTEGER,
-                                    current_date_col DATE,
-                                    created_at TIMESTAMP
-                                )
-                            """
-                            with engine.begin() as conn:
-                                conn.execute(text(create_forecasts_table))
+                            try:
+                                with engine.begin() as conn:
+                                    conn.execute(text("DELETE FROM forecasts"))
+                            except:
+                                # Table might not exist, create it
+                                log.info("Creating forecasts table...")
+                                create_forecasts_table = """
+                                    CREATE TABLE IF NOT EXISTS forecasts (
+                                        id SERIAL PRIMARY KEY,
+                                        product_sku VARCHAR(255),
+                                        forecast_date DATE,
+                                        predicted_sales INTEGER,
+                                        current_sales INTEGER,
+                                        current_date_col DATE,
+                                        created_at TIMESTAMP
+                                    )
+                                """
+                                with engine.begin() as conn:
+                                    conn.execute(text(create_forecasts_table))
                         
-                        forecast_df.to_sql('forecasts', engine, if_exists='append', index=False)
+                            with profile_stage("forecast_db_write"):
+                                forecast_df.to_sql('forecasts', engine, if_exists='append', index=False)
                         
-                        print(f"[Backend] ✅ Generated {len(forecast_results)} forecasts")
+                            log.info(f"✅ Generated {len(forecast_results)} forecasts")
                         
-                        response["ml_training"]["forecast_rows"] = len(forecast_results)
-                        response["ml_training"]["message"] = f"Model trained and {len(forecast_results)} forecasts generated"
-                    else:
-                        response["ml_training"]["message"] = "Model trained but no forecasts generated"
+                            response["ml_training"]["forecast_rows"] = len(forecast_results)
+                            response["ml_training"]["message"] = f"Model trained and {len(forecast_results)} forecasts generated"
+                        else:
+                            response["ml_training"]["message"] = "Model trained but no forecasts generated"
                         
-                except Exception as forecast_error:
-                    print(f"[Backend] ⚠️ Forecast generation failed: {str(forecast_error)}")
-                    import traceback
-                    traceback.print_exc()
-                    response["ml_training"]["message"] = f"Model trained but forecast generation failed: {str(forecast_error)}"
+                    except Exception as forecast_error:
+                        log.exception(f"⚠️ Forecast generation failed: {str(forecast_error)}")
+                        response["ml_training"]["message"] = f"Model trained but forecast generation failed: {str(forecast_error)}"
                 
-            except Exception as train_error:
-                print(f"[Backend] ❌ Model training failed: {str(train_error)}")
-                import traceback
-                traceback.print_exc()
-                response["ml_training"] = {
-                    "status": "failed",
-                    "message": f"Training failed: {str(train_error)}"
-                }
+                except Exception as train_error:
+                    log.exception(f"❌ Model training failed: {str(train_error)}")
+                    response["ml_training"] = {
+                        "status": "failed",
+                        "message": f"Training failed: {str(train_error)}"
+                    }
             
+            response["profile"] = profile_run.as_dict()
+            events.publish(None, "job", kind="train", job_id=job_id, status=response["ml_training"]["status"],
+                           forecast_rows=response["ml_training"].get("forecast_rows", 0))
             return response
             
         finally:
@@ -1507,16 +1570,19 @@ async def train_model(
                 pass
         
     except Exception as e:
-        print(f"[Backend] ❌ Error in train_model: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error in train_model: {str(e)}")
+        if job_id is not None:
+            events.publish(None, "job", kind="train", job_id=job_id, status="failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if job_dir is not None:
+            finish_job(job_dir)
 
 @app.get("/predict/existing")
 async def get_existing_forecasts():
     """Get existing forecast data from the forecasts table"""
     try:
-        print("[Backend] Fetching existing forecasts...")
+        log.debug("Fetching existing forecasts...")
         
         if not engine:
             return {"success": False, "forecast": []}
@@ -1533,38 +1599,37 @@ async def get_existing_forecasts():
                 FROM forecasts
                 ORDER BY product_sku ASC, forecast_date ASC
             """
-            df = pd.read_sql(query, engine)
+            with timed("db"):
+                df = pd.read_sql(query, engine)
+            record_rows(len(df))
             
             if not df.empty:
-                print(f"[Backend] ✅ Retrieved {len(df)} forecasts")
-                for idx, row in df.iterrows():
-                    if 'forecast_date' in df.columns and pd.notna(row['forecast_date']):
-                        df.at[idx, 'forecast_date'] = str(row['forecast_date'])
-                    if 'current_date_col' in df.columns and pd.notna(row['current_date_col']):
-                        df.at[idx, 'current_date_col'] = str(row['current_date_col'])
-                    if 'created_at' in df.columns and pd.notna(row['created_at']):
-                        df.at[idx, 'created_at'] = str(row['created_at'])
+                log.debug("✅ Retrieved %s forecasts", len(df))
+                with timed("serialize"):
+                    for col in ('forecast_date', 'current_date_col', 'created_at'):
+                        if col in df.columns:
+                            df[col] = df[col].astype(str).where(df[col].notna(), None)
+                    records = df.to_dict('records')
                 
-                return {"success": True, "forecast": df.to_dict('records')}
+                return {"success": True, "forecast": records}
             else:
-                print("[Backend] No forecasts found")
+                log.debug("No forecasts found")
                 return {"success": True, "forecast": []}
                 
         except Exception as db_error:
-            print(f"[Backend] Forecasts table doesn't exist or query failed: {str(db_error)}")
+            log.error(f"Forecasts table doesn't exist or query failed: {str(db_error)}")
             return {"success": True, "forecast": []}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error fetching forecasts: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error fetching forecasts: {str(e)}")
         return {"success": False, "forecast": [], "error": str(e)}
 
 @app.post("/predict")
 async def predict_sales(n_forecast: int = Query(3, description="Number of months to forecast")):
     """Generate sales forecasts for n months"""
+    job_id = job_dir = None
     try:
-        print(f"[Backend] Generating {n_forecast} month forecast...")
+        log.info(f"Generating {n_forecast} month forecast...")
         
         if not engine:
             raise HTTPException(status_code=500, detail="Database not available")
@@ -1584,31 +1649,32 @@ async def predict_sales(n_forecast: int = Query(3, description="Number of months
                 detail="Model not trained. Please upload and train with data first."
             )
         
-        print("[Backend] Loading trained model and data...")
+        log.info("Loading trained model and data...")
         
-        if not os.path.exists("xgb_sales_model.pkl"):
+        if not os.path.exists(MODEL_FILE):
             raise HTTPException(
                 status_code=400,
                 detail="Model file not found. Please train the model first."
             )
         
         # Load model
-        base_model = joblib.load("xgb_sales_model.pkl")
+        base_model = load_model(MODEL_FILE)
         
-        # Get the latest training data from base_data
-        query = "SELECT * FROM base_data ORDER BY sales_date DESC"
-        df_cleaned = pd.read_sql(query, engine)
+        # Get the latest training data from the base_data snapshot (version-checked against the DB)
+        df_cleaned = load_base_data(engine)
+        df_cleaned = df_cleaned.sort_values('sales_date', ascending=False, kind='stable').reset_index(drop=True)
         
         # Recreate the training data
-        print("[Backend] Preparing training data...")
+        log.info("Preparing training data...")
         df_window_raw, df_window, _, X_train, y_train, X_test, y_test, product_sku_last = update_model_and_train(df_cleaned)
         
         # Run forecast loop with n_forecast parameter
-        print(f"[Backend] Running forecast loop for {n_forecast} months...")
-        long_forecast, forecast_results = forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model, n_forecast=n_forecast)
+        log.info(f"Running forecast loop for {n_forecast} months...")
+        job_id, job_dir = new_job("predict")
+        long_forecast, forecast_results = forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model, n_forecast=n_forecast, output_dir=job_dir)
         
         # Save forecasts to database
-        print("[Backend] Saving forecasts to database...")
+        log.info("Saving forecasts to database...")
         forecast_df = pd.DataFrame(forecast_results)
         forecast_df['created_at'] = datetime.now()
         
@@ -1617,7 +1683,7 @@ async def predict_sales(n_forecast: int = Query(3, description="Number of months
                 conn.execute(text("DELETE FROM forecasts"))
         except:
             # Table might not exist, create it
-            print("[Backend] Creating forecasts table...")
+            log.info("Creating forecasts table...")
             create_forecasts_table = """
                 CREATE TABLE IF NOT EXISTS forecasts (
                     id SERIAL PRIMARY KEY,
@@ -1634,7 +1700,9 @@ async def predict_sales(n_forecast: int = Query(3, description="Number of months
         
         forecast_df.to_sql('forecasts', engine, if_exists='append', index=False)
         
-        print(f"[Backend] ✅ Generated {len(forecast_results)} forecasts for {n_forecast} months")
+        log.info(f"✅ Generated {len(forecast_results)} forecasts for {n_forecast} months")
+        events.publish(None, "job", kind="predict", job_id=job_id, status="completed",
+                       forecast_rows=len(forecast_results))
         
         # Convert dates to strings for JSON serialization
         for item in forecast_results:
@@ -1647,22 +1715,26 @@ async def predict_sales(n_forecast: int = Query(3, description="Number of months
             "status": "success",
             "forecast_rows": len(forecast_results),
             "n_forecast": n_forecast,
+            "job_id": job_id,
             "forecast": forecast_results
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"[Backend] ❌ Error generating forecasts: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"❌ Error generating forecasts: {str(e)}")
+        if job_id is not None:
+            events.publish(None, "job", kind="predict", job_id=job_id, status="failed")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if job_dir is not None:
+            finish_job(job_dir)
 
 @app.delete("/predict/clear")
 async def clear_forecasts():
     """Clear all forecast data"""
     try:
-        print("[Backend] Clearing forecasts...")
+        log.info("Clearing forecasts...")
         
         if not engine:
             raise HTTPException(status_code=500, detail="Database not available")
@@ -1670,11 +1742,11 @@ async def clear_forecasts():
         with engine.begin() as conn:
             conn.execute(text("DELETE FROM forecasts"))
         
-        print("[Backend] ✅ Forecasts cleared")
+        log.info("✅ Forecasts cleared")
         return {"success": True, "message": "Forecasts cleared successfully"}
         
     except Exception as e:
-        print(f"[Backend] ❌ Error clearing forecasts: {str(e)}")
+        log.error(f"❌ Error clearing forecasts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============================================================================
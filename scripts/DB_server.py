@@ -1,3 +1,6 @@
+import io
+import os
+from contextlib import contextmanager
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -14,7 +17,11 @@ DB_NAME = "postgres"     # our project database
 # ------------------------------------------------------
 # 🔗 Create SQLAlchemy Engine
 # ------------------------------------------------------
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# LONTUKTAK_DATABASE_URL overrides the settings above (e.g. a throwaway database for load tests)
+DATABASE_URL = os.getenv(
+    "LONTUKTAK_DATABASE_URL",
+    f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
+)
 
 try:
     engine = create_engine(DATABASE_URL)
@@ -38,3 +45,65 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# ------------------------------------------------------
+# 📦 Bulk load helper
+# ------------------------------------------------------
+def copy_dataframe(conn, df, table, columns=None):
+    """
+    Bulk-load a DataFrame with COPY ... FROM STDIN on an open SQLAlchemy connection,
+    so the rows land inside the caller's transaction (unlike DataFrame.to_sql(engine)).
+    Other databases (the SQLite benchmark stand-in) get a plain INSERT on conn.
+    """
+    columns = list(columns or df.columns)
+    if df.empty:
+        return 0
+    if conn.dialect.name != "postgresql":
+        df[columns].to_sql(table, conn, if_exists="append", index=False)
+        return len(df)
+    buf = io.StringIO()
+    df[columns].to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    col_sql = ", ".join(f'"{c}"' for c in columns)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({col_sql}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+    finally:
+        cursor.close()
+    return len(df)
+
+
+# ------------------------------------------------------
+# 🔒 Cross-worker locking
+# ------------------------------------------------------
+# Advisory lock keys (any bigint; these spell "LTTK" + a number)
+MIGRATION_LOCK_KEY = 0x4C54544B0001
+NOTIFICATION_LOCK_KEY = 0x4C54544B0002
+
+@contextmanager
+def advisory_lock(engine, key):
+    """
+    Hold a session-level Postgres advisory lock for the block, so only one worker
+    process runs it at a time (e.g. startup migrations under gunicorn).
+    A no-op without an engine or on databases other than Postgres.
+    """
+    if engine is None or engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+            conn.commit()
+
+
+def advisory_xact_lock(conn, key):
+    """
+    Take a transaction-level Postgres advisory lock on conn; it is released when the
+    caller's transaction ends. A no-op on databases other than Postgres.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": key})
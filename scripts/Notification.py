@@ -1,37 +1,70 @@
 # ================= Backend: Postgres Version =================
+import threading
+import time
 import pandas as pd
 import numpy as np  # Added numpy import for vectorized operations
-from DB_server import engine  # your SQLAlchemy engine
+from sqlalchemy import text
+from DB_server import engine, copy_dataframe  # your SQLAlchemy engine
+from metrics import get_logger
 
-# Manual overrides
-manual_minstock = {}  # {'Product_SKU': value}
-manual_buffer = {}    # {'Product_SKU': value}
+log = get_logger("notification")
+
+# Manual overrides (persisted in manual_overrides, mirrored in memory)
+from manual_overrides import overrides
 
 SAFETY_FACTOR = 1.5
 WEEKS_TO_COVER = 2
 MAX_BUFFER = 50
 
 # ================= Get latest stock per product =================
+# Both queries rely on idx_stock_data_week_product_uploaded (week_date, product_name, uploaded_at DESC)
 def get_data(week_date):
-    query = f"""
-        SELECT product_name, product_sku, stock_level, "หมวดหมู่" as category
+    query = text("""
+        SELECT DISTINCT ON (product_name)
+            product_name, product_sku, stock_level, "หมวดหมู่" as category
         FROM stock_data
-        WHERE week_date = '{week_date}'
-        AND uploaded_at = (
-            SELECT MAX(sub.uploaded_at)
-            FROM stock_data AS sub
-            WHERE sub.product_name = stock_data.product_name
-            AND sub.week_date = stock_data.week_date
-        )
+        WHERE week_date = :week_date
+        ORDER BY product_name, uploaded_at DESC
+    """)
+    df = pd.read_sql(query, engine, params={"week_date": week_date})
+    return df
+
+def get_week_pair():
+    """
+    Latest snapshot per product for the two most recent weeks, in one round trip.
+    Returns (week_date_curr, week_date_prev, df_curr, df_prev), or None if fewer than two weeks exist.
     """
+    query = text("""
+        WITH weeks AS (
+            SELECT DISTINCT week_date
+            FROM stock_data
+            ORDER BY week_date DESC
+            LIMIT 2
+        )
+        SELECT DISTINCT ON (s.week_date, s.product_name)
+            s.week_date, s.product_name, s.product_sku, s.stock_level, s."หมวดหมู่" as category
+        FROM stock_data s
+        JOIN weeks w ON w.week_date = s.week_date
+        ORDER BY s.week_date DESC, s.product_name, s.uploaded_at DESC
+    """)
     df = pd.read_sql(query, engine)
-    return df
+    week_dates = df["week_date"].drop_duplicates().tolist()
+    if len(week_dates) < 2:
+        return None
+
+    week_date_curr, week_date_prev = week_dates[0], week_dates[1]
+    cols = ["product_name", "product_sku", "stock_level", "category"]
+    df_curr = df.loc[df["week_date"] == week_date_curr, cols].reset_index(drop=True)
+    df_prev = df.loc[df["week_date"] == week_date_prev, cols].reset_index(drop=True)
+    return week_date_curr, week_date_prev, df_curr, df_prev
 
 # ================= Generate Stock Report =================
-def generate_stock_report(df_prev, df_curr):
+def generate_stock_report(df_prev, df_curr, previous_status=None):
     """
     df_curr: columns ['product_name', 'product_sku', 'stock_level', 'category']
     df_prev: columns ['product_name', 'product_sku', 'stock_level', 'category']
+    previous_status: delta mode; Status per Product_SKU of the previous batch (see
+    previous_batch_status). When given, adds change_type (see classify_changes).
     """
     df_prev_unique = df_prev.drop_duplicates(subset='product_sku', keep='last')
     prev_lookup = df_prev_unique.set_index('product_sku')['stock_level']
@@ -49,8 +82,35 @@ def generate_stock_report(df_prev, df_curr):
     }, inplace=True)
 
     # Last_Stock = previous snapshot if available, else fall back to current stock
-    curr['Last_Stock'] = curr['Product_SKU'].map(prev_lookup).fillna(curr['Stock'])
+    # (int: a SKU missing from the previous snapshot makes the mapped column float)
+    curr['Last_Stock'] = curr['Product_SKU'].map(prev_lookup).fillna(curr['Stock']).astype(int)
+
+    # Manual overrides: one join against the in-memory mirror. manual_overrides.sku is TEXT and
+    # an uploaded Product_SKU may have been read as a number, so both sides join as strings
+    overrides.sync()
+    manual = overrides.frame()
+    manual = manual.set_axis(manual.index.astype(str), axis=0)  # copy: frame() is shared
+    curr = curr.join(manual, on=curr['Product_SKU'].astype(str))
 
+    curr = apply_stock_formulas(
+        curr,
+        manual_min=curr['Manual_MinStock'],
+        manual_buf=curr['Manual_Buffer'],
+    )
+
+    report = curr[['Product', 'Product_SKU', 'Category', 'Stock', 'Last_Stock', 'Decrease_Rate(%)', 'Weeks_To_Empty',
+                   'MinStock', 'Buffer', 'Reorder_Qty', 'Status', 'Description']].reset_index(drop=True)
+    if previous_status is not None:
+        report['change_type'] = classify_changes(report, previous_status)
+    return report
+
+# ================= Stock formulas =================
+def apply_stock_formulas(curr, manual_min=None, manual_buf=None):
+    """
+    curr: columns ['Product_SKU', 'Stock', 'Last_Stock']
+    manual_min / manual_buf: Series aligned with curr, NaN where the formula applies
+    Adds Weekly_Sale, Decrease_Rate(%), Weeks_To_Empty, MinStock, Buffer, Reorder_Qty, Status, Description
+    """
     # Weekly sales and decrease rate
     curr['Weekly_Sale'] = (curr['Last_Stock'] - curr['Stock']).clip(lower=1)
     curr['Decrease_Rate(%)'] = np.where(
@@ -64,8 +124,10 @@ def generate_stock_report(df_prev, df_curr):
 
     # MinStock: manual override, else formula
     default_min = (curr['Weekly_Sale'] * WEEKS_TO_COVER * SAFETY_FACTOR).astype(int)
-    manual_min = curr['Product_SKU'].map(manual_minstock)
-    curr['MinStock'] = np.where(manual_min.notna(), manual_min, default_min).astype(int)
+    if manual_min is None:
+        curr['MinStock'] = default_min
+    else:
+        curr['MinStock'] = np.where(manual_min.notna(), manual_min, default_min).astype(int)
 
     # Buffer: dynamic by decrease rate, capped; manual override if present
     dyn_buf = np.select(
@@ -74,8 +136,10 @@ def generate_stock_report(df_prev, df_curr):
         default=5
     )
     dyn_buf = np.minimum(dyn_buf, MAX_BUFFER)
-    manual_buf = curr['Product_SKU'].map(manual_buffer)
-    curr['Buffer'] = np.where(manual_buf.notna(), manual_buf, dyn_buf).astype(int)
+    if manual_buf is None:
+        curr['Buffer'] = dyn_buf.astype(int)
+    else:
+        curr['Buffer'] = np.where(manual_buf.notna(), manual_buf, dyn_buf).astype(int)
 
     # Reorder quantity (at least SAFETY_FACTOR * weekly sale)
     default_reorder = (curr['Weekly_Sale'] * SAFETY_FACTOR).astype(int)
@@ -95,98 +159,227 @@ def generate_stock_report(df_prev, df_curr):
             'Stock is sufficient'
         )
     )
+    return curr
+
+def recalculate_stock_rows(rows, overrides):
+    """
+    Recalculate stored notification rows with manual MinStock/Buffer overrides.
+    rows: columns ['Product_SKU', 'Stock', 'Last_Stock'] (one row per SKU)
+    overrides: columns ['Product_SKU', 'minstock', 'buffer'], None/NaN = keep formula
+    """
+    curr = rows.merge(overrides, on='Product_SKU', how='left')
+    curr['Stock'] = pd.to_numeric(curr['Stock'], errors='coerce').fillna(0)
+    curr['Last_Stock'] = pd.to_numeric(curr['Last_Stock'], errors='coerce').fillna(curr['Stock'])
+    return apply_stock_formulas(
+        curr,
+        manual_min=pd.to_numeric(curr['minstock'], errors='coerce'),
+        manual_buf=pd.to_numeric(curr['buffer'], errors='coerce'),
+    )
+
+def compute_stock_flags(report_df, df_prev, base_stock_exists):
+    """
+    Activity flags for an upload, in place on report_df (adds unchanged_counter, flag).
+    report_df: generate_stock_report output; df_prev: base_stock rows (product_sku, unchanged_counter, flag)
+    """
+    report_df['unchanged_counter'] = 0
+    report_df['flag'] = 'stage'
+
+    for idx, row in report_df.iterrows():
+        product_sku = row.get('Product_SKU', '')
+        current_stock_level = row.get('Stock', 0)
+        last_stock_level = row.get('Last_Stock', 0)
+
+        # Get previous counter and flag from base_stock if exists
+        prev_counter = 0
+        prev_flag = 'stage'
+
+        if base_stock_exists and not df_prev.empty:
+            prev_row = df_prev[df_prev['product_sku'] == product_sku]
+            if not prev_row.empty:
+                prev_counter = prev_row.iloc[0].get('unchanged_counter', 0)
+                prev_flag = prev_row.iloc[0].get('flag', 'stage')
+
+        # Apply flag logic
+        if current_stock_level == last_stock_level:
+            new_counter = prev_counter + 1
+            new_flag = 'inactive' if new_counter >= 4 else prev_flag
+        elif current_stock_level < last_stock_level:
+            new_counter = 0
+            new_flag = 'active'
+        else:  # current_stock_level > last_stock_level
+            new_counter = 0
+            new_flag = 'just added stock'
+
+        report_df.at[idx, 'unchanged_counter'] = new_counter
+        report_df.at[idx, 'flag'] = new_flag
+    return report_df
+
+# ================= Notification history =================
+# Columns of stock_notification_history (create_stock_notification_history.sql)
+HISTORY_COLUMNS = ['batch_id', 'Product', 'Product_SKU', 'Category', 'Stock', 'Last_Stock', 'Decrease_Rate(%)',
+                   'Weeks_To_Empty', 'MinStock', 'Buffer', 'Reorder_Qty', 'Status', 'Description',
+                   'unchanged_counter', 'flag', 'change_type', 'created_at']
+# INTEGER columns: COPY rejects "10.0", so these are cast before loading
+HISTORY_INT_COLUMNS = ['Stock', 'Last_Stock', 'MinStock', 'Buffer', 'Reorder_Qty']
+
+# Severity order for classify_changes
+STATUS_RANK = {'Green': 0, 'Yellow': 1, 'Red': 2}
+CHANGE_TYPES = ('new', 'escalated', 'de-escalated', 'unchanged')
+
+def classify_changes(report_df, previous_status):
+    """
+    change_type per report row against the previous batch: 'new' (SKU not in it), 'escalated'
+    (e.g. Green -> Yellow/Red), 'de-escalated' (e.g. Red -> Green) or 'unchanged' (same Status).
+    previous_status: Series Product_SKU -> Status
+    """
+    # Stored SKUs are text and an uploaded Product_SKU may have been read as a number,
+    # so both sides match as strings (as in the manual overrides join)
+    previous_status = previous_status.set_axis(previous_status.index.astype(str), axis=0)
+    prev = report_df['Product_SKU'].astype(str).map(previous_status)
+    prev_rank = prev.map(STATUS_RANK)
+    curr_rank = report_df['Status'].map(STATUS_RANK)
+    return pd.Series(np.select(
+        [prev.isna(), curr_rank > prev_rank, curr_rank < prev_rank],
+        ['new', 'escalated', 'de-escalated'],
+        default='unchanged'
+    ), index=report_df.index)
+
+def previous_batch_status(conn):
+    """Status per Product_SKU of the latest notification batch (empty before the first upload)"""
+    rows = conn.execute(text('SELECT "Product_SKU", "Status" FROM stock_notifications')).fetchall()
+    return pd.Series({sku: status for sku, status in rows}, dtype=object)
 
-    return curr[['Product', 'Product_SKU', 'Category', 'Stock', 'Last_Stock', 'Decrease_Rate(%)', 'Weeks_To_Empty',
-                 'MinStock', 'Buffer', 'Reorder_Qty', 'Status', 'Description']].reset_index(drop=True)
+def append_notification_batch(conn, report_df):
+    """
+    Append report_df (generate_stock_report + compute_stock_flags output) as a new batch of
+    stock_notification_history on conn, inside the caller's transaction. The new batch becomes
+    what the stock_notifications view returns. Returns (batch_id, created_at).
+    """
+    batch_id, created_at = conn.execute(text(
+        "INSERT INTO notification_batches (row_count) VALUES (:n) RETURNING batch_id, created_at"
+    ), {"n": len(report_df)}).one()
+    conn.execute(text("SELECT ensure_notification_partition(:ts)"), {"ts": created_at})
+    rows = report_df.assign(batch_id=batch_id, created_at=created_at)
+    rows[HISTORY_INT_COLUMNS] = rows[HISTORY_INT_COLUMNS].apply(pd.to_numeric, errors='coerce').round().astype('Int64')
+    if 'change_type' not in rows:
+        rows['change_type'] = 'new'
+    copy_dataframe(conn, rows, 'stock_notification_history', HISTORY_COLUMNS)
+    return batch_id, created_at
 
 def update_manual_values(product_sku: str, minstock: int = None, buffer: int = None):
     """Update manual MinStock and Buffer values for a product"""
-    if minstock is not None:
-        manual_minstock[product_sku] = minstock
-    if buffer is not None:
-        manual_buffer[product_sku] = buffer
+    overrides.update([{"product_sku": product_sku, "minstock": minstock, "buffer": buffer}])
+
+# ================= Report Cache =================
+REPORT_CHECK_INTERVAL = 2.0  # seconds between stock_data freshness probes
+
+class ReportCache:
+    """
+    Latest stock report keyed on the (current, previous) week pair and the manual
+    override version, indexed by product name and SKU. Freshness is checked with
+    one MAX(uploaded_at) probe (idx_stock_data_uploaded, migration 10) at most every
+    REPORT_CHECK_INTERVAL seconds; writers to stock_data can also call invalidate()
+    for an immediate rebuild. The records are shared by every request: callers get
+    copies.
+    """
+
+    def __init__(self, check_interval=REPORT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        self.key = None            # (week_date_curr, week_date_prev)
+        self.stamp = None          # MAX(uploaded_at) the report was built from
+        self.overrides_version = None
+        self.records = []
+        self.by_product = {}
+        self.by_sku = {}
+        self.error = None
+        self._last_check = 0.0
+
+    def _latest_upload(self):
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(uploaded_at) FROM stock_data")).scalar()
+
+    def _rebuild(self, stamp):
+        pair = get_week_pair()
+        self.stamp = stamp
+        self.overrides_version = overrides.version
+        if pair is None:
+            self.key, self.records, self.by_product, self.by_sku = None, [], {}, {}
+            self.error = "Not enough data"
+            return
+
+        week_date_curr, week_date_prev, df_curr, df_prev = pair
+        report = generate_stock_report(df_prev, df_curr)
+        records = report.to_dict(orient="records")
+
+        self.key = (week_date_curr, week_date_prev)
+        self.records = records
+        self.by_product = {r["Product"]: r for r in records}
+        self.by_sku = {r["Product_SKU"]: r for r in records}
+        self.error = None
+        log.debug("Report cache rebuilt for weeks %s: %s rows", self.key, len(records))
+
+    def current(self):
+        """Return self after making sure the cached report is fresh"""
+        with self._lock:
+            overrides.sync()
+            now = time.monotonic()
+            fresh_overrides = self.overrides_version == overrides.version
+            if self.stamp is not None and fresh_overrides and now - self._last_check < self.check_interval:
+                return self
+
+            stamp = self._latest_upload()
+            self._last_check = now
+            if stamp is None:
+                self.invalidate()
+                self.error = "No stock data available"
+                return self
+            if stamp != self.stamp or not fresh_overrides:
+                self._rebuild(stamp)
+            return self
+
+
+report_cache = ReportCache()
+
+def invalidate_report_cache():
+    """Drop the cached report (call after writing to stock_data)"""
+    with report_cache._lock:
+        report_cache.invalidate()
 
 # ================= Get Notifications =================
 def get_notifications():
     """
     Returns notification list (summary view).
     """
-    print("[Notification] get_notifications() called")
-    
     try:
-        week_dates_query = """
-            SELECT DISTINCT week_date
-            FROM stock_data
-            ORDER BY week_date DESC
-            LIMIT 2
-        """
-        print("[Notification] Querying for week dates...")
-        week_dates = pd.read_sql(week_dates_query, engine)["week_date"].tolist()
-        print(f"[Notification] Found {len(week_dates)} week dates: {week_dates}")
-        
-        if len(week_dates) < 2:
-            print("[Notification] ⚠️ Not enough data - need at least 2 week dates")
-            return {"error": "Not enough data"}
+        cache = report_cache.current()
+        if cache.error:
+            log.warning(f"⚠️ {cache.error}")
+            return {"error": cache.error}
 
-        week_date_curr, week_date_prev = week_dates[0], week_dates[1]
-        print(f"[Notification] Current week: {week_date_curr}, Previous week: {week_date_prev}")
-        
-        print("[Notification] Fetching previous week data...")
-        df_prev = get_data(week_date_prev)
-        print(f"[Notification] Previous week data: {len(df_prev)} rows")
-        
-        print("[Notification] Fetching current week data...")
-        df_curr = get_data(week_date_curr)
-        print(f"[Notification] Current week data: {len(df_curr)} rows")
-
-        if df_prev.empty or df_curr.empty:
-            print("[Notification] ⚠️ No stock data available")
-            return {"error": "No stock data available"}
-
-        print("[Notification] Generating stock report...")
-        report = generate_stock_report(df_prev, df_curr)
-        print(f"[Notification] Generated report with {len(report)} rows")
-        
-        result = report.to_dict(orient="records")
-        print(f"[Notification] ✅ Returning {len(result)} notifications")
-        return result
+        log.debug("✅ Returning %s notifications for weeks %s", len(cache.records), cache.key)
+        return [dict(record) for record in cache.records]
         
     except Exception as e:
-        print(f"[Notification] ❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception(f"get_notifications failed: {str(e)}")
         return {"error": str(e)}
 
 
 def get_notification_detail(product_name: str):
     """
-    Returns detailed metrics for one product.
-    """
-    week_dates_query = """
-        SELECT DISTINCT week_date
-        FROM stock_data
-        ORDER BY week_date DESC
-        LIMIT 2
+    Returns detailed metrics for one product (looked up by product name, then by SKU).
     """
-    week_dates = pd.read_sql(week_dates_query, engine)["week_date"].tolist()
-    if len(week_dates) < 2:
-        return {"error": "Not enough data"}
+    cache = report_cache.current()
+    if cache.error:
+        return {"error": cache.error}
 
-    week_date_curr, week_date_prev = week_dates[0], week_dates[1]
-    df_prev = get_data(week_date_prev)
-    df_curr = get_data(week_date_curr)
-
-    if df_prev.empty or df_curr.empty:
-        return {"error": "No stock data available"}
-
-    report = generate_stock_report(df_prev, df_curr)
-    row = report.loc[report["Product"] == product_name]
-
-    if row.empty:
+    record = cache.by_product.get(product_name) or cache.by_sku.get(product_name)
+    if record is None:
         return {"error": f"Product '{product_name}' not found"}
 
-    record = row.iloc[0].to_dict()
-
     detail = {
         "current_stock": record["Stock"],
         "decrease_rate_per_week": f"{record['Decrease_Rate(%)']}%/week",
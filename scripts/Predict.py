@@ -1,15 +1,14 @@
 import pandas as pd
 import numpy as np
 import os
-import joblib
-import xgboost as xgb
-from xgboost import XGBRegressor
-from sklearn.model_selection import TimeSeriesSplit
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score, mean_absolute_percentage_error
-import optuna
 import time
 import copy
-from xgboost.callback import EarlyStopping
+from metrics import profile_stage
+from artifacts import artifact_path, atomic_path, write_csv
+
+# The ML stack (joblib, xgboost, sklearn, optuna, matplotlib) is imported inside the
+# functions that use it, so importing this module - and Backend with it - stays cheap.
+# benchmark_startup.py fails if any of them is pulled in by "import Backend" again.
 
 # -----------------------------
 # Parameters
@@ -17,25 +16,43 @@ from xgboost.callback import EarlyStopping
 ROLLING_WINDOW = 12        # Last 12 months of data
 TEST_MONTHS = 6            # Last 6 months for validation
 N_FORECAST = 1             # Forecast next n months
-MODEL_FILE = "xgb_sales_model.pkl"
+MODEL_FILE = artifact_path("xgb_sales_model.pkl")
 
 # -----------------------------
 # Feature Engineering Functions
 # -----------------------------
 def create_lags(data, lags=[1, 12]):
     for lag in lags:
-        data[f'Total_quantity_lag_{lag}'] = data.groupby('product_sku')['total_quantity'].shift(lag)
+        data[f'Total_quantity_lag_{lag}'] = data.groupby('product_sku', observed=True)['total_quantity'].shift(lag)
     return data
 
 def create_rolling(data, windows=[3,6]):
     for window in windows:
-        data[f'Total_quantity_roll_mean_{window}'] = data.groupby('product_sku')['total_quantity'].shift(1).rolling(window).mean()
+        data[f'Total_quantity_roll_mean_{window}'] = data.groupby('product_sku', observed=True)['total_quantity'].shift(1).rolling(window).mean()
     return data
 
+# -----------------------------
+# Model Persistence
+# -----------------------------
+def load_model(model_file=MODEL_FILE):
+    import joblib
+    return joblib.load(model_file)
+
+def save_model(model, model_file=MODEL_FILE):
+    # Other workers may be loading the model while this one retrains
+    import joblib
+    with atomic_path(model_file) as tmp:
+        joblib.dump(model, tmp)
+
 # -----------------------------
 # Hyperparameter Tuning
 # -----------------------------
 def tune_xgboost(X, y, n_trials=1):
+    import optuna
+    from xgboost import XGBRegressor
+    from sklearn.model_selection import TimeSeriesSplit
+    from sklearn.metrics import mean_absolute_error
+
     def objective(trial):
         params = {
             "objective": "reg:squarederror",
@@ -86,44 +103,59 @@ def tune_xgboost(X, y, n_trials=1):
 # Model Training
 # -----------------------------
 def update_model_and_train(df):
+    from sklearn.metrics import mean_absolute_error
+
     start_time = time.time()
     print("Starting model update and training...")
 
-    df = df.drop(columns=["product_name"])
-    latest_date = df['sales_date'].max()
-    df_window = df[df['sales_date'] > latest_date - pd.DateOffset(months=ROLLING_WINDOW)].copy()
-    df_window = df_window.dropna(subset=['product_sku'])
+    with profile_stage("window_selection"):
+        df = df.drop(columns=["product_name"])
+        latest_date = df['sales_date'].max()
+        df_window = df[df['sales_date'] > latest_date - pd.DateOffset(months=ROLLING_WINDOW)].copy()
+        df_window = df_window.dropna(subset=['product_sku'])
+        if isinstance(df_window['product_sku'].dtype, pd.CategoricalDtype):
+            # Only SKUs inside the window may become dummy columns
+            df_window['product_sku'] = df_window['product_sku'].cat.remove_unused_categories()
 
-    product_sku_last = df_window[df_window['sales_date'] == df_window['sales_date'].max()]['product_sku'].values
+        product_sku_last = df_window[df_window['sales_date'] == df_window['sales_date'].max()]['product_sku'].values
 
     # Feature engineering
-    df_window = create_lags(df_window)
-    df_window = create_rolling(df_window)
-    df_window.fillna(0, inplace=True)
-
-    df_window_raw = df_window.copy()
-    df_window_encoded = pd.get_dummies(df_window, columns=['product_sku'], drop_first=True)
-
-    train = df_window_encoded[df_window_encoded['sales_date'] < df_window_encoded['sales_date'].max() - pd.DateOffset(months=TEST_MONTHS)]
-    test = df_window_encoded[df_window_encoded['sales_date'] >= df_window_encoded['sales_date'].max() - pd.DateOffset(months=TEST_MONTHS)]
-
-    X_train = train.drop(['total_quantity','sales_year','sales_month','sales_date'], axis=1)
-    y_train = train['total_quantity']
-    X_test = test.drop(['total_quantity','sales_year','sales_month','sales_date'], axis=1)
-    y_test = test['total_quantity']
+    with profile_stage("lags"):
+        df_window = create_lags(df_window)
+    with profile_stage("rolling"):
+        df_window = create_rolling(df_window)
+        # Fill numeric features only: a categorical product_sku rejects 0 as a fill value
+        num_cols = df_window.select_dtypes(include='number').columns
+        df_window[num_cols] = df_window[num_cols].fillna(0)
+
+    with profile_stage("get_dummies"):
+        df_window_raw = df_window.copy()
+        df_window_encoded = pd.get_dummies(df_window, columns=['product_sku'], drop_first=True)
+
+    with profile_stage("split"):
+        train = df_window_encoded[df_window_encoded['sales_date'] < df_window_encoded['sales_date'].max() - pd.DateOffset(months=TEST_MONTHS)]
+        test = df_window_encoded[df_window_encoded['sales_date'] >= df_window_encoded['sales_date'].max() - pd.DateOffset(months=TEST_MONTHS)]
+
+        X_train = train.drop(['total_quantity','sales_year','sales_month','sales_date'], axis=1)
+        y_train = train['total_quantity']
+        X_test = test.drop(['total_quantity','sales_year','sales_month','sales_date'], axis=1)
+        y_test = test['total_quantity']
 
     # Load or tune model
     try:
-        if os.path.exists(MODEL_FILE):
-            print("Loading existing model...")
-            base_model = joblib.load(MODEL_FILE)
-        else:
-            raise FileNotFoundError("Model file not found")
+        with profile_stage("model_load"):
+            if os.path.exists(MODEL_FILE):
+                print("Loading existing model...")
+                base_model = load_model(MODEL_FILE)
+            else:
+                raise FileNotFoundError("Model file not found")
     except Exception as e:
         print(f"Could not load existing model ({str(e)}). Training new model...")
         print("Tuning XGBoost model with Optuna...")
-        best_params = tune_xgboost(X_train, y_train, n_trials=1)
+        with profile_stage("model_tune"):
+            best_params = tune_xgboost(X_train, y_train, n_trials=1)
 
+        from xgboost import XGBRegressor
         base_model = XGBRegressor(
             **best_params,
             objective="reg:squarederror",
@@ -132,13 +164,16 @@ def update_model_and_train(df):
             random_state=42
         )
 
-        base_model.fit(X_train, y_train, verbose=10)
-        joblib.dump(base_model, MODEL_FILE)
+        with profile_stage("fit"):
+            base_model.fit(X_train, y_train, verbose=10)
+        with profile_stage("model_save"):
+            save_model(base_model, MODEL_FILE)
         print(f"✅ Model saved to {MODEL_FILE}")
 
     # Validation
-    y_pred = base_model.predict(X_test)
-    mae = mean_absolute_error(y_test, y_pred)
+    with profile_stage("validation"):
+        y_pred = base_model.predict(X_test)
+        mae = mean_absolute_error(y_test, y_pred)
     print("Validation MAE:", mae)
 
     print(f"Process completed in {time.time() - start_time:.2f} seconds.")
@@ -147,7 +182,7 @@ def update_model_and_train(df):
 # -----------------------------
 # Forecasting
 # -----------------------------
-def forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model, n_forecast=N_FORECAST, retrain_each_step=True):
+def forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model, n_forecast=N_FORECAST, retrain_each_step=True, output_dir=None):
     start_time = time.time()
     print("Starting forecasting loop...")
 
@@ -157,51 +192,57 @@ def forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model,
     current_model = copy.deepcopy(base_model)
 
     for i in range(n_forecast):
-        future['sales_date'] = future['sales_date'] + pd.DateOffset(months=1)
-        forecast_date = future['sales_date'].iloc[0]
-        future['sales_year'] = future['sales_date'].dt.year
-        future['sales_month'] = future['sales_date'].dt.month
-        future['Total_quantity_lag_1'] = future['total_quantity']
-
-        future['Total_quantity_lag_12'] = future.groupby('product_sku')['total_quantity'].shift(12).fillna(0)
-        future['Total_quantity_roll_mean_3'] = future.groupby('product_sku')['total_quantity'].shift(1).rolling(3).mean().fillna(0)
-
-        X_future = future.drop(['total_quantity','sales_year','sales_month','product_sku'], axis=1)
-        X_future = pd.get_dummies(X_future)
-        for col in X_train.columns:
-            if col not in X_future.columns:
-                X_future[col] = 0
-        X_future = X_future[X_train.columns]
-
-        y_pred_future = current_model.predict(X_future)
-        y_pred_future = np.maximum(np.round(y_pred_future).astype(int), 0)
-        future['total_quantity'] = y_pred_future
-
-        for sku, pred in zip(product_sku_last, y_pred_future):
-            # get last known actuals for this SKU
-            last_row = df_window_raw[df_window_raw['product_sku'] == sku].sort_values('sales_date').iloc[-1]
-            current_sales = int(last_row['total_quantity'])
-            current_date_col = last_row['sales_date']
-
-            long_forecast_rows.append({
-                "product_sku": sku,
-                "forecast_date": forecast_date,
-                "predicted_sales": int(pred),
-                "current_sales": current_sales,
-                "current_date_col": current_date_col
-            })
+        step = f"forecast_step_{i+1}"
+        with profile_stage(f"{step}.features"):
+            future['sales_date'] = future['sales_date'] + pd.DateOffset(months=1)
+            forecast_date = future['sales_date'].iloc[0]
+            future['sales_year'] = future['sales_date'].dt.year
+            future['sales_month'] = future['sales_date'].dt.month
+            future['Total_quantity_lag_1'] = future['total_quantity']
+
+            future['Total_quantity_lag_12'] = future.groupby('product_sku', observed=True)['total_quantity'].shift(12).fillna(0)
+            future['Total_quantity_roll_mean_3'] = future.groupby('product_sku', observed=True)['total_quantity'].shift(1).rolling(3).mean().fillna(0)
+
+            X_future = future.drop(['total_quantity','sales_year','sales_month','product_sku'], axis=1)
+            X_future = pd.get_dummies(X_future)
+            for col in X_train.columns:
+                if col not in X_future.columns:
+                    X_future[col] = 0
+            X_future = X_future[X_train.columns]
+
+        with profile_stage(f"{step}.predict"):
+            y_pred_future = current_model.predict(X_future)
+            y_pred_future = np.maximum(np.round(y_pred_future).astype(int), 0)
+            future['total_quantity'] = y_pred_future
+
+        with profile_stage(f"{step}.collect"):
+            for sku, pred in zip(product_sku_last, y_pred_future):
+                # get last known actuals for this SKU
+                last_row = df_window_raw[df_window_raw['product_sku'] == sku].sort_values('sales_date').iloc[-1]
+                current_sales = int(last_row['total_quantity'])
+                current_date_col = last_row['sales_date']
+
+                long_forecast_rows.append({
+                    "product_sku": sku,
+                    "forecast_date": forecast_date,
+                    "predicted_sales": int(pred),
+                    "current_sales": current_sales,
+                    "current_date_col": current_date_col
+                })
 
         print(f"✅ {i+1} month prediction ({forecast_date.date()}): {y_pred_future}")
 
         if retrain_each_step:
-            X_train = pd.concat([X_train, X_future], axis=0)
-            y_train = pd.concat([y_train, pd.Series(y_pred_future)], axis=0)
-            current_model.fit(X_train, y_train, xgb_model=current_model.get_booster())
-
-    long_forecast = pd.DataFrame(long_forecast_rows)
-    long_forecast.sort_values(['product_sku','forecast_date'], inplace=True)
-    end_time = time.time()
-    long_forecast.to_csv('forecast_output.csv', index=False)
+            with profile_stage(f"{step}.retrain"):
+                X_train = pd.concat([X_train, X_future], axis=0)
+                y_train = pd.concat([y_train, pd.Series(y_pred_future)], axis=0)
+                current_model.fit(X_train, y_train, xgb_model=current_model.get_booster())
+
+    with profile_stage("forecast_persist"):
+        long_forecast = pd.DataFrame(long_forecast_rows)
+        long_forecast.sort_values(['product_sku','forecast_date'], inplace=True)
+        end_time = time.time()
+        write_csv(long_forecast, os.path.join(output_dir or ".", "forecast_output.csv"), index=False)
     print(f"Forecasting completed in {end_time - start_time:.2f} seconds")
     return long_forecast, long_forecast_rows
 
@@ -209,7 +250,9 @@ def forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model,
 # Evaluation
 # -----------------------------
 def Evaluate(X_train, y_train, X_test, y_test, model_file=MODEL_FILE):
-    model = joblib.load(model_file)
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score, mean_absolute_percentage_error
+
+    model = load_model(model_file)
     y_pred = model.predict(X_test)
     mae = mean_absolute_error(y_test, y_pred)
     mape = mean_absolute_percentage_error(y_test, y_pred)
@@ -217,14 +260,14 @@ def Evaluate(X_train, y_train, X_test, y_test, model_file=MODEL_FILE):
     r2 = r2_score(y_test, y_pred)
     print(f"MAE: {mae}\nMAPE: {mape}\nRMSE: {rmse}\nR2: {r2}")
 
-import matplotlib.pyplot as plt
-
 # -----------------------------
 # Plot Validation Results
 # -----------------------------
 def plot_validation(X_test, y_test, model_file=MODEL_FILE):
+    import matplotlib.pyplot as plt
+
     # Load model and predict
-    model = joblib.load(model_file)
+    model = load_model(model_file)
     y_pred_test = model.predict(X_test)
 
     # Plot
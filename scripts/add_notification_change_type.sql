@@ -0,0 +1,21 @@
+-- Delta classification of each history row against the previous batch:
+-- new | escalated | de-escalated | unchanged (see Notification.classify_changes).
+-- Rows written before this column existed count as new.
+ALTER TABLE stock_notification_history
+ADD COLUMN IF NOT EXISTS change_type VARCHAR(16) NOT NULL DEFAULT 'new';
+
+-- /notifications?since=: the changed rows of the batches after a client's last one
+CREATE INDEX IF NOT EXISTS idx_notification_history_changed
+ON stock_notification_history(batch_id, "Product_SKU")
+WHERE change_type <> 'unchanged';
+
+-- /notifications?status=: Red / Yellow rows of one batch without reading the Green ones
+CREATE INDEX IF NOT EXISTS idx_notification_history_batch_status
+ON stock_notification_history(batch_id, "Status");
+
+-- A view's column list is fixed when it is created; re-create it to pick up change_type
+CREATE OR REPLACE VIEW stock_notifications AS
+SELECT h.*
+FROM stock_notification_history h
+WHERE h.batch_id = (SELECT batch_id FROM latest_notification_batch)
+  AND h.created_at = (SELECT created_at FROM latest_notification_batch);
@@ -0,0 +1,15 @@
+-- ReportCache's freshness probe, SELECT MAX(uploaded_at) FROM stock_data, as an
+-- index-only lookup. stock_data is created outside the migrations (see
+-- migrations.py), so this only adds the index when the table is already there;
+-- stock_sync.create_stock_data_table creates the same index for new tables.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'stock_data'
+          AND column_name = 'uploaded_at'
+    ) THEN
+        CREATE INDEX IF NOT EXISTS idx_stock_data_uploaded ON stock_data(uploaded_at);
+    END IF;
+END $$;
@@ -0,0 +1,106 @@
+"""
+Analysis Store Module
+Precomputed analysis results over base_data for the /analysis endpoints.
+
+Results are built lazily from the base_data snapshot (base_data_cache) and kept
+until base_data_version changes, which every ingest bumps. Version checks are a
+one-row query at most every CHECK_INTERVAL seconds, so requests between ingests
+are served from memory.
+"""
+
+import threading
+import time
+import pandas as pd
+from DB_server import engine
+from base_data_cache import load_base_data, get_db_version
+from data_analyzer import prepare, monthly_best_sellers, SizeMixCube
+from metrics import get_logger
+
+log = get_logger("analysis_store")
+
+CHECK_INTERVAL = 2.0  # seconds between base_data_version checks
+RANKING_DEPTH = 50    # ranks precomputed per month; requests may ask for up to this many
+
+# base_data column -> data_analyzer column
+BASE_DATA_TO_ANALYZER = {
+    "product_sku": "Product_SKU",
+    "product_name": "Product_name",
+    "sales_year": "Year",
+    "sales_month": "Month",
+    "total_quantity": "Total_quantity",
+}
+
+
+class AnalysisStore:
+    def __init__(self, engine, check_interval=CHECK_INTERVAL):
+        self.engine = engine
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = 0.0
+        self._prepared = None
+        self._artifacts = {}  # name -> precomputed result for self._version
+
+    # ---------- freshness ----------
+    def _sync(self):
+        now = time.monotonic()
+        if self._prepared is not None and now - self._checked < self.check_interval:
+            return
+        version = get_db_version(self.engine)
+        self._checked = now
+        if self._prepared is not None and version is not None and version == self._version:
+            return
+        with self._lock:
+            if self._prepared is not None and version is not None and version == self._version:
+                return
+            df = load_base_data(self.engine).rename(columns=BASE_DATA_TO_ANALYZER)
+            self._prepared = prepare(df, None if version is None else ("base_data", version))
+            self._version = version
+            self._artifacts = {}
+            log.info(f"Analysis data prepared: {len(df)} rows (base_data version {version})")
+
+    def _artifact(self, name, build):
+        self._sync()
+        artifacts = self._artifacts
+        if name not in artifacts:
+            with self._lock:
+                if name not in self._artifacts:
+                    start = time.perf_counter()
+                    self._artifacts[name] = build(self._prepared)
+                    log.info(f"Built {name} in {time.perf_counter() - start:.3f}s")
+                artifacts = self._artifacts
+        return artifacts[name]
+
+    @property
+    def version(self):
+        return self._version
+
+    # ---------- best sellers ----------
+    def monthly_rankings(self):
+        """Top RANKING_DEPTH base SKUs for every month (see data_analyzer.monthly_best_sellers)"""
+        return self._artifact(
+            "best_sellers", lambda prepared: monthly_best_sellers(prepared, top_n=RANKING_DEPTH)
+        )
+
+    def best_sellers(self, start, end, limit=10):
+        """Precomputed top-`limit` rows per month for months in [start, end]"""
+        rankings = self.monthly_rankings()
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        mask = (rankings["YearMonth"] >= start) & (rankings["YearMonth"] <= end) & (rankings["Rank"] <= limit)
+        return rankings.loc[mask]
+
+    # ---------- size mix ----------
+    def size_mix(self, sku_or_base):
+        """Month x size quantity pivot for a base SKU (see data_analyzer.SizeMixCube)"""
+        return self._artifact("size_mix", SizeMixCube).pivot(sku_or_base)
+
+
+analysis_store = AnalysisStore(engine)
+
+
+def month_start(value):
+    """'YYYY-MM' (or 'YYYY-MM-DD') -> first-of-month Timestamp; raises ValueError when unparseable"""
+    ts = pd.to_datetime(value, errors="coerce")
+    if pd.isna(ts):
+        raise ValueError(f"Invalid month: {value!r} (expected YYYY-MM)")
+    return ts.to_period("M").to_timestamp()
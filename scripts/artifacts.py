@@ -0,0 +1,115 @@
+"""
+Artifacts Module
+Where the pipeline's files live, so several API workers can share them.
+
+ARTIFACT_DIR holds the shared model file. Each /train or /predict run gets its
+own jobs/<job id>/ directory for the files it produces (clean_sales_data.csv,
+forecast_output.csv), so concurrent jobs never write to the same path. Files are
+written to a temp file in the target directory and moved into place with
+os.replace: a reader in another worker sees the old file or the new one, never
+a partial write.
+
+A job directory holds a .running marker from new_job until finish_job. Pruning
+skips marked directories unless the marker is older than the stale limit, which
+covers a worker that died mid-job and never removed it.
+
+Environment:
+    LONTUKTAK_ARTIFACT_DIR    artifact root (default: this scripts directory,
+                              where the shipped xgb_sales_model.pkl lives)
+    LONTUKTAK_JOB_RETENTION   job directories kept, oldest pruned first (default 20)
+    LONTUKTAK_JOB_STALE_HOURS hours after which a job still marked running is
+                              treated as abandoned and may be pruned (default 24)
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from metrics import get_logger
+
+log = get_logger("artifacts")
+
+ARTIFACT_DIR = os.getenv("LONTUKTAK_ARTIFACT_DIR", os.path.dirname(os.path.abspath(__file__)))
+JOBS_DIR = os.path.join(ARTIFACT_DIR, "jobs")
+JOB_RETENTION = int(os.getenv("LONTUKTAK_JOB_RETENTION", "20"))
+JOB_STALE_HOURS = float(os.getenv("LONTUKTAK_JOB_STALE_HOURS", "24"))
+RUNNING_MARKER = ".running"
+
+
+def artifact_path(name):
+    """Path of a shared artifact (e.g. the model file) under ARTIFACT_DIR"""
+    return os.path.join(ARTIFACT_DIR, name)
+
+
+def new_job(kind):
+    """
+    Create jobs/<kind>-<timestamp>-<id>/, marked running, and return (job_id, directory).
+    Call finish_job(directory) when the job ends, whether it succeeded or not.
+    """
+    job_id = f"{kind}-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    open(os.path.join(job_dir, RUNNING_MARKER), "w").close()
+    prune_jobs()
+    return job_id, job_dir
+
+
+def finish_job(job_dir):
+    """Drop the running marker so the job directory can be pruned"""
+    try:
+        os.remove(os.path.join(job_dir, RUNNING_MARKER))
+    except FileNotFoundError:
+        pass
+
+
+def _is_running(job_dir):
+    """True while the job's marker exists and is younger than JOB_STALE_HOURS"""
+    try:
+        started = os.stat(os.path.join(job_dir, RUNNING_MARKER)).st_mtime
+    except FileNotFoundError:
+        return False
+    return time.time() - started < JOB_STALE_HOURS * 3600
+
+
+def prune_jobs(keep=None):
+    """Remove all but the newest `keep` job directories, never one that is still running"""
+    keep = JOB_RETENTION if keep is None else keep
+    try:
+        entries = sorted(os.scandir(JOBS_DIR), key=lambda e: e.stat().st_mtime, reverse=True)
+    except FileNotFoundError:
+        return
+    for entry in entries[keep:]:
+        if entry.is_dir() and not _is_running(entry.path):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+@contextmanager
+def atomic_path(path):
+    """
+    Yield a temp path next to `path`; when the block succeeds the temp file
+    replaces `path` atomically, otherwise it is removed.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_csv(df, path, **kwargs):
+    """DataFrame.to_csv through atomic_path"""
+    with atomic_path(path) as tmp:
+        df.to_csv(tmp, **kwargs)
+    log.debug("Wrote %s (%s rows)", path, len(df))
+    return path
@@ -0,0 +1,161 @@
+"""
+Base Data Cache Module
+Local columnar snapshot of base_data for the training / forecasting pipeline.
+
+The snapshot is an uncompressed Feather (Arrow IPC) file with dictionary-encoded
+product_sku / product_name columns, read back memory-mapped. A sidecar JSON file
+records the base_data_version it was built from; base_data_version is a single-row
+counter that every ingest bumps, so checking freshness is a one-row query instead
+of re-reading the whole table. Ingest writes the snapshot from the frame it just
+saved, so the table is never read back only to refresh the cache.
+
+Frames leave this module with the compact dtypes from dtype_policy (categorical
+SKU / name, int16 year, int8 month, int32 quantity), so callers get them without
+converting again.
+
+pyarrow is optional: without it every load falls back to reading base_data.
+"""
+
+import json
+import os
+import pandas as pd
+from sqlalchemy import text
+from metrics import get_logger
+from dtype_policy import apply_dtype_policy
+from artifacts import atomic_path
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    HAS_ARROW = True
+except ImportError:  # pragma: no cover - depends on the deployment
+    HAS_ARROW = False
+
+log = get_logger("base_data_cache")
+
+CACHE_DIR = os.getenv("LONTUKTAK_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "base_data.feather")
+META_FILE = os.path.join(CACHE_DIR, "base_data.meta.json")
+
+BASE_DATA_COLUMNS = ["product_sku", "product_name", "sales_date", "sales_year", "sales_month", "total_quantity"]
+DICTIONARY_COLUMNS = ["product_sku", "product_name"]
+
+
+# ================= Version counter =================
+def _ensure_version_row(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS base_data_version (
+            id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """))
+    conn.execute(text("INSERT INTO base_data_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING"))
+
+
+def ensure_version_table(engine):
+    with engine.begin() as conn:
+        _ensure_version_row(conn)
+
+
+def get_db_version(engine):
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version FROM base_data_version WHERE id = 1")).scalar()
+    except Exception:
+        return None
+
+
+def bump_db_version(conn):
+    """
+    Mark base_data as changed; returns the new version. Call it on the connection that
+    rewrites base_data, inside the same transaction, so the new rows and the new version
+    become visible together (and neither does if the rewrite rolls back).
+    """
+    _ensure_version_row(conn)
+    return int(conn.execute(text(
+        "UPDATE base_data_version SET version = version + 1 WHERE id = 1 RETURNING version"
+    )).scalar())
+
+
+# ================= Snapshot I/O =================
+def _read_meta():
+    try:
+        with open(META_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(df, version):
+    """
+    Replace the snapshot with df (the full base_data contents). Each file goes through
+    its own temp file (atomic_path), so workers rebuilding at the same time never share
+    one. The data file is replaced first and the meta file last: the meta file is the
+    commit point, and until it names the new version readers fall back to the database.
+    """
+    if not HAS_ARROW:
+        return False
+    out = apply_dtype_policy(df[[c for c in BASE_DATA_COLUMNS if c in df.columns]])
+
+    table = pa.Table.from_pandas(out.reset_index(drop=True), preserve_index=False)
+    with atomic_path(SNAPSHOT_FILE) as tmp:
+        feather.write_feather(table, tmp, compression="uncompressed")
+    with atomic_path(META_FILE) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "rows": len(out)}, f)
+    log.info(f"base_data snapshot written: {len(out)} rows (version {version})")
+    return True
+
+
+def read_snapshot():
+    """Memory-mapped read of the snapshot; returns None if there is none"""
+    if not HAS_ARROW or not os.path.exists(SNAPSHOT_FILE):
+        return None
+    table = feather.read_table(SNAPSHOT_FILE, memory_map=True)
+    return table.to_pandas()
+
+
+# ================= Public API =================
+def load_base_data(engine, compact=True):
+    """
+    Full base_data as a DataFrame, served from the local snapshot when its version
+    matches the database, otherwise read from the database and re-snapshotted.
+    compact=False returns plain object / int64 columns instead of the dtype policy.
+    """
+    df = None
+    db_version = get_db_version(engine)
+    meta = _read_meta()
+    if HAS_ARROW and db_version is not None and meta and meta.get("version") == db_version:
+        df = read_snapshot()
+
+    if df is None:
+        log.info(f"base_data snapshot stale or missing (db version {db_version}); reading from database")
+        df = pd.read_sql("SELECT * FROM base_data", engine)
+        df["sales_date"] = pd.to_datetime(df["sales_date"], errors="coerce")
+        if HAS_ARROW:
+            if db_version is None:
+                ensure_version_table(engine)
+                db_version = get_db_version(engine)
+            try:
+                write_snapshot(df, db_version)
+            except Exception as e:
+                log.warning(f"Could not write base_data snapshot: {e}")
+
+    if compact:
+        return apply_dtype_policy(df, copy=False)
+    for col in DICTIONARY_COLUMNS:
+        if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def record_ingest(df_base, version):
+    """
+    Refresh the snapshot from df_base once the transaction that rewrote base_data with it
+    and bumped the version to `version` (bump_db_version) has committed
+    """
+    try:
+        write_snapshot(df_base, version)
+    except Exception as e:
+        log.warning(f"Could not write base_data snapshot: {e}")
+    return version
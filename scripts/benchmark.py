@@ -0,0 +1,213 @@
+"""
+Pipeline Benchmark
+Times the ingest -> train -> forecast -> notify pipeline and the data_analyzer
+functions on synthetic data (see synthetic_data.py) and records wall time, CPU
+time and peak traced memory per stage as JSON.
+
+The database is a throwaway SQLite file standing in for Postgres; the working
+directory, artifact directory and base_data snapshot cache are redirected to a
+temp directory, so the run never touches the real model file, CSV outputs or
+database.
+
+Usage:
+    python benchmark.py [--skus 500] [--months 24] [--skip-train]
+                        [--output bench.json] [--compare previous.json]
+
+--compare prints each stage's time relative to an earlier result file and exits
+non-zero when any stage is slower than --threshold (default 1.25x).
+
+Peak memory comes from tracemalloc, which slows Python-heavy stages somewhat;
+compare results taken with the same settings.
+"""
+
+import argparse
+import contextlib
+import gc
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+WORK_DIR = tempfile.mkdtemp(prefix="lontuktak-bench-")
+os.environ.setdefault("LONTUKTAK_CACHE_DIR", os.path.join(WORK_DIR, "cache"))
+os.environ.setdefault("LONTUKTAK_ARTIFACT_DIR", WORK_DIR)
+os.environ.setdefault("LONTUKTAK_LOG_LEVEL", "WARNING")
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import pandas as pd
+from sqlalchemy import create_engine
+import synthetic_data
+
+
+def measure(results, name, fn):
+    """Run fn once, store its timings under results[name] and return its value (None on failure)"""
+    gc.collect()
+    tracemalloc.start()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    value, error = None, None
+    try:
+        # Pipeline code prints progress; keep stdout for the JSON result
+        with contextlib.redirect_stdout(sys.stderr):
+            value = fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    entry = {"seconds": round(wall, 4), "cpu_seconds": round(cpu, 4), "peak_mb": round(peak / 2**20, 2)}
+    if error:
+        entry["error"] = error
+    results[name] = entry
+    status = "FAILED " + error if error else f"{wall:8.3f}s  {peak / 2**20:8.1f} MB"
+    print(f"  {name:<32} {status}", file=sys.stderr)
+    return value
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def run(n_skus, n_months, skip_train=False):
+    os.chdir(WORK_DIR)
+    engine = create_engine(f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}")
+    results = {}
+
+    products = synthetic_data.catalog(n_skus)
+    sales_bytes = synthetic_data.export_csv(synthetic_data.sales_export(products, n_months))
+    product_bytes = synthetic_data.export_csv(synthetic_data.product_export(products))
+    sales_path = os.path.join(WORK_DIR, "sales.csv")
+    product_path = os.path.join(WORK_DIR, "products.csv")
+    with open(sales_path, "wb") as f:
+        f.write(sales_bytes)
+    with open(product_path, "wb") as f:
+        f.write(product_bytes)
+
+    # ---------- ingest ----------
+    from Auto_cleaning import auto_cleaning, load_excel_with_fallback_bytes
+    # auto_cleaning rewrites the rows of base_data (not the table), so it has to exist
+    pd.DataFrame({
+        "product_sku": pd.Series(dtype=str), "product_name": pd.Series(dtype=str),
+        "sales_date": pd.Series(dtype="datetime64[ns]"), "sales_year": pd.Series(dtype="int64"),
+        "sales_month": pd.Series(dtype="int64"), "total_quantity": pd.Series(dtype="int64"),
+    }).to_sql("base_data", engine, index=False)
+    measure(results, "load_excel_with_fallback_bytes", lambda: load_excel_with_fallback_bytes(sales_bytes))
+    df_base = measure(results, "auto_cleaning", lambda: auto_cleaning(sales_path, product_path, engine))
+
+    # ---------- train / forecast ----------
+    if skip_train or df_base is None:
+        results["update_model_and_train"] = {"skipped": "--skip-train" if skip_train else "no cleaned data"}
+    else:
+        # Predict imports the ML stack only when training starts; look for it without importing it
+        missing = [m for m in ("xgboost", "sklearn") if importlib.util.find_spec(m) is None]
+        if missing:
+            results["update_model_and_train"] = {"skipped": f"missing dependency: {', '.join(missing)}"}
+        else:
+            from Predict import update_model_and_train, forcast_loop
+            trained = measure(results, "update_model_and_train", lambda: update_model_and_train(df_base))
+            if trained is not None:
+                df_window_raw, _, base_model, X_train, y_train, _, _, product_sku_last = trained
+                measure(results, "forcast_loop",
+                        lambda: forcast_loop(X_train, y_train, df_window_raw, product_sku_last, base_model))
+
+    # ---------- notifications ----------
+    from Notification import generate_stock_report, compute_stock_flags
+    rename = {"ชื่อสินค้า": "product_name", "รหัสสินค้า": "product_sku",
+              "จำนวนคงเหลือ": "stock_level", "หมวดหมู่": "category"}
+    df_prev = synthetic_data.stock_snapshot(products, week=0).rename(columns=rename)
+    df_curr = synthetic_data.stock_snapshot(products, week=1).rename(columns=rename)
+    report = measure(results, "generate_stock_report", lambda: generate_stock_report(df_prev, df_curr))
+    if report is not None:
+        base_stock = df_prev.assign(unchanged_counter=0, flag="stage")
+        measure(results, "upload_flag_pass", lambda: compute_stock_flags(report.copy(), base_stock, True))
+
+    # ---------- data_analyzer ----------
+    import data_analyzer
+    if df_base is not None:
+        frame = synthetic_data.analyzer_frame(df_base, products)
+        base = str(products["Product_SKU"].iloc[0]).split("-")[0]
+        last = frame[["Year", "Month"]].astype(int).max()
+        data_analyzer.invalidate_prepared()
+        measure(results, "data_analyzer.prepare", lambda: data_analyzer.prepare(frame, version="bench"))
+        measure(results, "data_analyzer.size_mix_pivot",
+                lambda: data_analyzer.size_mix_pivot(frame, base, version="bench"))
+        measure(results, "data_analyzer.SizeMixCube", lambda: data_analyzer.SizeMixCube(data_analyzer.prepare(frame, version="bench")))
+        measure(results, "data_analyzer.performance_table",
+                lambda: data_analyzer.performance_table(frame, [base, f"{base}-M"], version="bench"))
+        measure(results, "data_analyzer.best_sellers_by_month",
+                lambda: data_analyzer.best_sellers_by_month(frame, int(last["Year"]), int(last["Month"]), version="bench"))
+        measure(results, "data_analyzer.monthly_best_sellers",
+                lambda: data_analyzer.monthly_best_sellers(frame, top_n=10, version="bench"))
+        measure(results, "data_analyzer.total_income_table",
+                lambda: data_analyzer.total_income_table(frame, version="bench"))
+
+    return results
+
+
+def compare(current, previous, threshold):
+    """Print per-stage time ratios; return the stages slower than threshold"""
+    regressions = []
+    print(f"{'stage':<34}{'before':>10}{'after':>10}{'ratio':>8}", file=sys.stderr)
+    for name, entry in current["results"].items():
+        before = previous.get("results", {}).get(name, {})
+        if "seconds" not in entry or "seconds" not in before:
+            continue
+        ratio = entry["seconds"] / before["seconds"] if before["seconds"] > 0 else float("inf")
+        flag = "  <-- slower" if ratio > threshold else ""
+        print(f"{name:<34}{before['seconds']:>10.3f}{entry['seconds']:>10.3f}{ratio:>8.2f}{flag}", file=sys.stderr)
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingest/train/forecast/notify pipeline")
+    parser.add_argument("--skus", type=int, default=500)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--skip-train", action="store_true", help="skip update_model_and_train / forcast_loop")
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    # run() switches to the temp directory; resolve user paths first
+    output = os.path.abspath(args.output) if args.output else None
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+
+    print(f"Benchmarking {args.skus} SKUs x {args.months} months in {WORK_DIR}", file=sys.stderr)
+    doc = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {"skus": args.skus, "months": args.months, "skip_train": args.skip_train},
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "results": run(args.skus, args.months, args.skip_train),
+    }
+
+    text = json.dumps(doc, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if previous is not None and compare(doc, previous, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
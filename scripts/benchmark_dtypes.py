@@ -0,0 +1,152 @@
+"""
+Dtype Policy Benchmark
+Compares memory use and groupby / preprocess speed of a base_data-shaped frame
+with plain object / int64 columns against the same frame after apply_dtype_policy.
+
+Usage:
+    python benchmark_dtypes.py [--skus 5000] [--months 36] [--repeat 5]
+
+Prints one JSON document with memory (MB) and best-of-N timings (seconds).
+Before timing, check_preprocess() compares preprocess on a small frame with the
+per-row string transforms it replaces; a mismatch exits non-zero.
+"""
+
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+from dtype_policy import apply_dtype_policy, memory_mb
+from data_analyzer import preprocess, _base_sku, _size, _upper_key
+
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "3XL"]
+
+
+def synthetic_base_data(n_skus=5000, n_months=36, seed=42):
+    """base_data-like frame: one row per (product_sku, month), object / int64 columns"""
+    rng = np.random.default_rng(seed)
+    n_bases = max(1, n_skus // len(SIZES))
+    bases = np.array([f"LT{i:05d}" for i in range(n_bases)], dtype=object)
+    base_idx = np.arange(n_skus) % n_bases
+    size_idx = (np.arange(n_skus) // n_bases) % len(SIZES)
+    skus = np.array([f"{bases[b]}-{SIZES[s]}" for b, s in zip(base_idx, size_idx)], dtype=object)
+    names = np.array([f"เสื้อยืด รุ่น {bases[b]}" for b in base_idx], dtype=object)
+
+    months = pd.date_range("2022-01-01", periods=n_months, freq="MS")
+    sku_rep = np.repeat(np.arange(n_skus), n_months)
+    month_rep = np.tile(np.arange(n_months), n_skus)
+    dates = months[month_rep]
+    return pd.DataFrame({
+        "product_sku": skus[sku_rep],
+        "product_name": names[sku_rep],
+        "sales_date": dates,
+        "sales_year": dates.year.astype("int64"),
+        "sales_month": dates.month.astype("int64"),
+        "total_quantity": rng.poisson(8, len(sku_rep)).astype("int64"),
+    })
+
+
+def check_preprocess():
+    """Mismatches between preprocess and the per-row string transforms on a small frame"""
+    skus = ["LT00001-M", "LT00001-XL", "lt00001-m", "LT00002-2XL", "LT00002-L ",
+            "NOSIZE", "A-B-XXXL", "LT00001-M", "12345-S"]
+    frame = pd.DataFrame({
+        "Product_SKU": skus,
+        "Product_name": [f"name {i}" for i in range(len(skus))],
+        "Year": [2024] * len(skus),
+        "Month": list(range(1, len(skus) + 1)),
+        "Total_quantity": list(range(len(skus))),
+    })
+    out = preprocess(frame)
+    plain = pd.Series(skus, dtype=object)
+    base = _base_sku(plain)
+    expected = {
+        "Base_SKU": base,
+        "Size": _size(plain),
+        "Product_SKU_u": _upper_key(plain),
+        "Base_SKU_u": _upper_key(base),
+    }
+    failures = []
+    for col, want in expected.items():
+        got = out[col].astype(object).tolist()
+        if got != want.tolist():
+            failures.append(f"{col}: {got} != {want.tolist()}")
+    months = out["YearMonth"].dt.month.tolist()
+    if months != frame["Month"].tolist():
+        failures.append(f"YearMonth months: {months}")
+    return failures
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(n_skus, n_months, repeat):
+    plain = synthetic_base_data(n_skus, n_months)
+    compact = apply_dtype_policy(plain)
+
+    analyzer_plain = plain.rename(columns={
+        "product_sku": "Product_SKU", "product_name": "Product_name",
+        "sales_year": "Year", "sales_month": "Month", "total_quantity": "Total_quantity",
+    }).drop(columns=["sales_date"])
+
+    def groupby_sku(df):
+        return lambda: df.groupby("product_sku", observed=True)["total_quantity"].sum()
+
+    def groupby_sku_month(df):
+        return lambda: df.groupby(["product_sku", "sales_year", "sales_month"], observed=True)["total_quantity"].sum()
+
+    def lags(df):
+        return lambda: df.groupby("product_sku", observed=True)["total_quantity"].shift(1)
+
+    results = {
+        "rows": len(plain),
+        "skus": n_skus,
+        "months": n_months,
+        "memory_mb": {"plain": round(memory_mb(plain), 2), "compact": round(memory_mb(compact), 2)},
+        "seconds": {},
+    }
+    for label, make in (("groupby_sku", groupby_sku), ("groupby_sku_month", groupby_sku_month), ("lag_shift", lags)):
+        results["seconds"][label] = {
+            "plain": round(best_of(make(plain), repeat), 4),
+            "compact": round(best_of(make(compact), repeat), 4),
+        }
+
+    def preprocess_plain():
+        # What preprocess cost before: per-row string splitting on object SKUs
+        parts = analyzer_plain["Product_SKU"].astype(str).str.rsplit("-", n=1)
+        return parts.str[0], parts.str[1].fillna("NA").astype(str).str.strip().str.upper()
+
+    results["seconds"]["preprocess"] = {
+        "plain": round(best_of(preprocess_plain, repeat), 4),
+        "compact": round(best_of(lambda: preprocess(analyzer_plain), repeat), 4),
+    }
+    results["memory_mb"]["reduction_pct"] = round(
+        100.0 * (1 - results["memory_mb"]["compact"] / results["memory_mb"]["plain"]), 1
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the base_data dtype policy")
+    parser.add_argument("--skus", type=int, default=5000)
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    failures = check_preprocess()
+    for failure in failures:
+        print(f"  FAILED: preprocess {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print(json.dumps(run(args.skus, args.months, args.repeat), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Startup Benchmark
+Measures how long "import Backend" takes and how much memory it leaves resident,
+in fresh interpreters, and checks that the ML stack is not imported at startup.
+
+The API only needs xgboost / sklearn / optuna / matplotlib for /train and
+/predict; Predict imports them lazily. This script fails when any of them shows
+up in sys.modules after importing Backend, so an eager import can't slip back in.
+
+The database URL is pointed at an in-memory SQLite database, so the run never
+connects to Postgres (DB_server's connection check fails fast and engine is None).
+
+Usage:
+    python benchmark_startup.py [--runs 5] [--output startup.json]
+                                [--compare previous.json] [--threshold 1.25]
+                                [--max-seconds 3.0] [--importtime]
+
+--importtime also prints the slowest top-level imports (python -X importtime).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules only /train and /predict need
+ML_MODULES = ("xgboost", "sklearn", "optuna", "matplotlib", "joblib")
+
+PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+import Backend
+seconds = time.perf_counter() - t0
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+loaded = sorted(m for m in {ml} if m in sys.modules)
+print("STARTUP " + json.dumps({{"seconds": seconds, "rss_mb": rss / 2**20, "ml_modules": loaded}}))
+""".format(ml=repr(ML_MODULES))
+
+
+def child_env(work_dir):
+    return dict(os.environ,
+                LONTUKTAK_DATABASE_URL="sqlite://",
+                LONTUKTAK_CACHE_DIR=os.path.join(work_dir, "cache"),
+                LONTUKTAK_LOG_LEVEL="WARNING",
+                PYTHONDONTWRITEBYTECODE="1")
+
+
+def probe(work_dir):
+    """Import Backend in a fresh interpreter; returns the probe's measurements"""
+    proc = subprocess.run([sys.executable, "-c", PROBE], cwd=SCRIPTS_DIR, env=child_env(work_dir),
+                          capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            return json.loads(line[len("STARTUP "):])
+    raise RuntimeError(f"import Backend failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def import_profile(work_dir, top=15):
+    """Slowest top-level packages by cumulative import time, from -X importtime"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import Backend"], cwd=SCRIPTS_DIR,
+                          env=child_env(work_dir), capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two extra spaces per level
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API startup (import Backend)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    parser.add_argument("--max-seconds", type=float, help="fail when the median import time exceeds this")
+    parser.add_argument("--importtime", action="store_true", help="print the slowest imports")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="lontuktak-startup-")
+    runs = [probe(work_dir) for _ in range(args.runs)]
+    result = {
+        "seconds_median": round(statistics.median(r["seconds"] for r in runs), 4),
+        "seconds_min": round(min(r["seconds"] for r in runs), 4),
+        "rss_mb_median": round(statistics.median(r["rss_mb"] for r in runs), 1),
+        "ml_modules": sorted({m for r in runs for m in r["ml_modules"]}),
+    }
+    print(f"import Backend: median {result['seconds_median']:.3f}s, "
+          f"min {result['seconds_min']:.3f}s, RSS {result['rss_mb_median']:.1f} MB", file=sys.stderr)
+
+    if args.importtime:
+        for seconds, name in import_profile(work_dir):
+            print(f"  {name:<32}{seconds:>8.3f}s", file=sys.stderr)
+
+    doc = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {"runs": args.runs},
+        "python": platform.python_version(),
+        "results": {"import_backend": result},
+    }
+    text = json.dumps(doc, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    failures = []
+    if result["ml_modules"]:
+        failures.append(f"ML modules imported at startup: {', '.join(result['ml_modules'])}")
+    if args.max_seconds is not None and result["seconds_median"] > args.max_seconds:
+        failures.append(f"median import time {result['seconds_median']:.3f}s > {args.max_seconds:.3f}s")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = json.load(f)["results"]["import_backend"]
+        ratio = result["seconds_median"] / before["seconds_median"] if before["seconds_median"] > 0 else float("inf")
+        print(f"median {before['seconds_median']:.3f}s -> {result['seconds_median']:.3f}s ({ratio:.2f}x)", file=sys.stderr)
+        if ratio > args.threshold:
+            failures.append(f"import time {ratio:.2f}x slower than {args.compare}")
+
+    for failure in failures:
+        print(f"  FAILED: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+YearMonth Benchmark
+Times data_analyzer.year_month_stamps against the string-concatenation build it
+replaced, and checks that both produce the same timestamps.
+
+Usage:
+    python benchmark_yearmonth.py [--rows 1000000] [--repeat 3]
+
+Exits non-zero if the two builds disagree.
+"""
+
+import argparse
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_analyzer import year_month_stamps
+
+
+def year_month_strings(year, month):
+    """The previous preprocess implementation"""
+    return pd.to_datetime(
+        year.astype(int).astype(str) + "-" + month.astype(int).astype(str) + "-01",
+        errors="coerce"
+    )
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark YearMonth construction")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    year = pd.Series(rng.integers(2015, 2031, args.rows), dtype="int16")
+    month = pd.Series(rng.integers(1, 13, args.rows), dtype="int8")
+
+    old = year_month_strings(year, month)
+    new = year_month_stamps(year, month)
+    equal = bool(old.isna().equals(new.isna()) and (old.dropna() == new.dropna()).all())
+
+    result = {
+        "rows": args.rows,
+        "equal": equal,
+        "seconds": {
+            "string_concat": round(best_of(lambda: year_month_strings(year, month), args.repeat), 4),
+            "arithmetic": round(best_of(lambda: year_month_stamps(year, month), args.repeat), 4),
+        },
+    }
+    result["speedup"] = round(result["seconds"]["string_concat"] / max(result["seconds"]["arithmetic"], 1e-9), 1)
+    print(json.dumps(result, indent=2))
+    if not equal:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Analysis Consistency Check
+Compares the precomputed analysis paths the /analysis endpoints serve from
+(analysis_store) with the per-request data_analyzer functions they replaced, on a
+small hand-made fixture:
+
+- monthly_best_sellers (all months in one pass) vs best_sellers_by_month per month
+- SizeMixCube.pivot (per-base cells) vs size_mix_pivot (row scan)
+
+Exits non-zero and prints each mismatch when they disagree.
+
+Usage:
+    python check_analysis.py
+"""
+
+import sys
+import pandas as pd
+import data_analyzer
+from data_analyzer import best_sellers_by_month, monthly_best_sellers, size_mix_pivot, SizeMixCube
+
+BEST_SELLER_COLUMNS = ["Base_SKU", "Product_name", "Best_Size", "Quantity"]
+
+
+def fixture():
+    """
+    data_analyzer-shaped sales: three base SKUs over three months, with mixed-case SKUs,
+    a SKU without a size and a size alias. Quantities are distinct per (month, base) and
+    per (month, base, size), so rankings and best sizes have no ties.
+    """
+    rows = [
+        # Product_SKU, Product_name, Year, Month, Total_quantity
+        ("LT001-S", "Tee 001", 2024, 1, 5), ("LT001-M", "Tee 001", 2024, 1, 9), ("lt001-l", "Tee 001", 2024, 1, 2),
+        ("LT002-M", "Shirt 002", 2024, 1, 7), ("LT002-2XL", "Shirt 002", 2024, 1, 11),
+        ("PLAIN", "Cap", 2024, 1, 3),
+        ("LT001-S", "Tee 001", 2024, 2, 1), ("LT001-M", "Tee 001", 2024, 2, 4),
+        ("LT002-M", "Shirt 002", 2024, 2, 20), ("LT002-XXL", "Shirt 002 new", 2024, 2, 6),
+        ("LT002-L", "Shirt 002 new", 2024, 2, 2),
+        ("LT003-XL", "Jacket 003", 2024, 2, 13),
+        ("LT003-XL", "Jacket 003", 2024, 3, 8), ("LT003-M", "Jacket 003", 2024, 3, 3),
+        ("LT001-L", "Tee 001", 2024, 3, 6),
+        ("PLAIN", "Cap", 2024, 3, 17),
+    ]
+    return pd.DataFrame(rows, columns=["Product_SKU", "Product_name", "Year", "Month", "Total_quantity"])
+
+
+def _rows(df):
+    """Comparable plain-Python rows of a best sellers frame"""
+    out = df[BEST_SELLER_COLUMNS].astype(object)
+    out["Quantity"] = out["Quantity"].astype(int)
+    return [tuple(str(v) if i < 3 else v for i, v in enumerate(row)) for row in out.itertuples(index=False)]
+
+
+def check_best_sellers(frame, top_n=2):
+    """Mismatches between monthly_best_sellers and best_sellers_by_month"""
+    failures = []
+    rankings = monthly_best_sellers(frame, top_n=top_n, version="check")
+    months = sorted({(int(y), int(m)) for y, m in zip(frame["Year"], frame["Month"])})
+    for year, month in months:
+        want = _rows(best_sellers_by_month(frame, year, month, top_n=top_n, version="check"))
+        got = _rows(rankings[rankings["YearMonth"] == pd.Timestamp(year, month, 1)])
+        if got != want:
+            failures.append(f"best sellers {year}-{month:02d}: {got} != {want}")
+
+    # A start/end range keeps exactly the months inside it
+    ranged = monthly_best_sellers(frame, top_n=top_n, start="2024-02-01", end="2024-02-01", version="check")
+    if sorted(set(ranged["YearMonth"])) != [pd.Timestamp(2024, 2, 1)]:
+        failures.append(f"best sellers range 2024-02: months {sorted(set(ranged['YearMonth']))}")
+    if ranged["Rank"].tolist() != list(range(1, len(ranged) + 1)):
+        failures.append(f"best sellers ranks: {ranged['Rank'].tolist()}")
+    return failures
+
+
+def check_size_mix(frame):
+    """Mismatches between SizeMixCube.pivot and size_mix_pivot"""
+    failures = []
+    cube = SizeMixCube(data_analyzer.prepare(frame, version="check"))
+    # Base SKUs, full SKUs, other casing and padding, a SKU without a size, an unknown base
+    queries = ["LT001", "LT002", "LT003", "LT002-M", "lt001", " LT003 ", "PLAIN", "NOPE"]
+    for query in queries:
+        want = size_mix_pivot(frame, query, version="check")
+        got = cube.pivot(query)
+        if want.empty or got.empty:
+            if want.empty != got.empty:
+                failures.append(f"size mix {query!r}: empty {got.empty} != {want.empty}")
+            continue
+        try:
+            pd.testing.assert_frame_equal(got, want, check_dtype=False, check_names=False,
+                                          check_index_type=False, check_column_type=False, check_freq=False)
+        except AssertionError as e:
+            failures.append(f"size mix {query!r}: {e}")
+    return failures
+
+
+def main():
+    data_analyzer.invalidate_prepared()
+    frame = fixture()
+    failures = check_best_sellers(frame) + check_size_mix(frame)
+    for failure in failures:
+        print(f"  FAILED: {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+    print("analysis checks passed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Comparison Module
+Sales performance comparison for /analysis/performance.
+
+Each requested token is either a full product SKU or a base SKU (the SKU without
+its trailing "-SIZE" part, as in data_analyzer). Matching is case-insensitive and
+a base SKU collects its whole family. One GROUPING SETS query returns monthly
+totals per (item, year, month) plus per-item totals with the dominant product
+name; every chart series is then built in one groupby pass.
+"""
+
+import pandas as pd
+from query_builder import statement
+
+COMPARE_SQL = """
+    WITH req(token) AS (
+        SELECT DISTINCT UNNEST(CAST(:tokens AS TEXT[]))
+    ), matched AS (
+        SELECT req.token AS item, bd.product_name, bd.sales_year, bd.sales_month, bd.total_quantity
+        FROM base_data bd
+        JOIN req ON UPPER(bd.product_sku) = req.token
+                 OR UPPER(regexp_replace(bd.product_sku, '-[^-]*$', '')) = req.token
+        WHERE bd.total_quantity IS NOT NULL
+    )
+    SELECT GROUPING(sales_year, sales_month) AS item_total,
+           item, sales_year, sales_month,
+           MODE() WITHIN GROUP (ORDER BY product_name) AS product_name,
+           SUM(total_quantity) AS quantity
+    FROM matched
+    GROUP BY GROUPING SETS ((item, sales_year, sales_month), (item))
+    ORDER BY item_total, item, sales_year, sales_month
+"""
+
+
+def normalize_tokens(sku_list):
+    """Requested SKUs in request order, de-duplicated: {UPPER token: token as given}"""
+    tokens = {}
+    for sku in sku_list or []:
+        if sku is None:
+            continue
+        cleaned = str(sku).strip()
+        if cleaned and cleaned.upper() not in tokens:
+            tokens[cleaned.upper()] = cleaned
+    return tokens
+
+
+def compare(engine, sku_list):
+    """
+    Returns (chart_data, table_data):
+      chart_data: {item: [{"year", "month", "period": "YYYY-MM", "value"}, ...]} in request order
+      table_data: [{"Item", "Product_name", "Quantity"}, ...] by Quantity descending
+    Items with no sales are omitted from both.
+    """
+    tokens = normalize_tokens(sku_list)
+    if not tokens:
+        return {}, []
+
+    df = pd.read_sql(statement(COMPARE_SQL), engine, params={"tokens": list(tokens)})
+    if df.empty:
+        return {}, []
+    df["Item"] = df["item"].map(tokens)
+
+    totals = df[df["item_total"] != 0]
+    table_data = (
+        totals.rename(columns={"product_name": "Product_name", "quantity": "Quantity"})
+              .sort_values("Quantity", ascending=False, kind="stable")
+              [["Item", "Product_name", "Quantity"]]
+    )
+    table_data["Quantity"] = table_data["Quantity"].astype("int64")
+
+    monthly = df[df["item_total"] == 0]
+    points = pd.DataFrame({
+        "Item": monthly["Item"],
+        "year": monthly["sales_year"].astype("int64"),
+        "month": monthly["sales_month"].astype("int64"),
+        "value": monthly["quantity"].astype("int64"),
+    })
+    points["period"] = (points["year"].astype(str) + "-" + points["month"].astype(str).str.zfill(2))
+    series = {
+        item: group[["year", "month", "period", "value"]].to_dict("records")
+        for item, group in points.groupby("Item", sort=False)
+    }
+    chart_data = {item: series[item] for item in tokens.values() if item in series}
+    return chart_data, table_data.to_dict("records")
@@ -0,0 +1,25 @@
+-- Create base_data table for aggregated monthly sales (written by Auto_cleaning.auto_cleaning)
+CREATE TABLE IF NOT EXISTS base_data (
+    product_sku VARCHAR(255) NOT NULL,
+    product_name VARCHAR(500),
+    sales_date DATE NOT NULL,
+    sales_year INTEGER NOT NULL,
+    sales_month INTEGER NOT NULL,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_sku, sales_date)
+);
+
+-- Create indexes for faster queries
+CREATE INDEX IF NOT EXISTS idx_base_data_date ON base_data(sales_date);
+CREATE INDEX IF NOT EXISTS idx_base_data_sku ON base_data(product_sku);
+CREATE INDEX IF NOT EXISTS idx_base_data_year_month ON base_data(sales_year, sales_month);
+
+-- Single-row version counter; bumped on every ingest (see base_data_cache.py)
+CREATE TABLE IF NOT EXISTS base_data_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO base_data_version (id, version)
+VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
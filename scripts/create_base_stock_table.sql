@@ -20,3 +20,7 @@ ON base_stock("หมวดหมู่");
 
 CREATE INDEX IF NOT EXISTS idx_base_stock_flag 
 ON base_stock(flag);
+
+-- Category filter + join key for /analysis/total_income (index-only lookup of SKUs per category)
+CREATE INDEX IF NOT EXISTS idx_base_stock_category_sku
+ON base_stock("หมวดหมู่", product_sku);
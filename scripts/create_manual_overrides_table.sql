@@ -0,0 +1,18 @@
+-- Persistent manual MinStock / Buffer overrides (one row per product)
+CREATE TABLE IF NOT EXISTS manual_overrides (
+    product_sku VARCHAR(255) PRIMARY KEY,
+    minstock INTEGER,
+    buffer INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Single-row version counter; bumped on every write so each worker can tell
+-- when its in-memory mirror of manual_overrides is stale
+CREATE TABLE IF NOT EXISTS manual_overrides_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO manual_overrides_version (id, version)
+VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
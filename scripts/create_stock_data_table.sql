@@ -15,6 +15,11 @@ CREATE TABLE IF NOT EXISTS stock_data (
 CREATE INDEX IF NOT EXISTS idx_stock_data_week_date ON stock_data(week_date DESC);
 CREATE INDEX IF NOT EXISTS idx_stock_data_product ON stock_data(product_name);
 
+-- Latest snapshot per product within a week (Notification.get_data / get_week_pair)
+ALTER TABLE stock_data ADD COLUMN IF NOT EXISTS uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_stock_data_week_product_uploaded
+ON stock_data(week_date, product_name, uploaded_at DESC);
+
 -- Insert sample data if table is empty (for testing)
 INSERT INTO stock_data (week_date, product_name, product_sku, stock_level, min_stock, buffer)
 SELECT 
@@ -0,0 +1,106 @@
+-- Append-only stock notification history: every /notifications/upload appends one batch.
+-- stock_notifications becomes a view of the latest batch, so existing reads and manual
+-- MinStock/Buffer edits (which update the current batch's rows) keep working unchanged.
+CREATE TABLE IF NOT EXISTS notification_batches (
+    batch_id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    row_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- One partition per calendar month of created_at (see ensure_notification_partition)
+CREATE TABLE IF NOT EXISTS stock_notification_history (
+    batch_id BIGINT NOT NULL,
+    "Product" VARCHAR(255),
+    "Product_SKU" VARCHAR(255),
+    "Category" VARCHAR(255),
+    "Stock" INTEGER NOT NULL,
+    "Last_Stock" INTEGER NOT NULL,
+    "Decrease_Rate(%)" NUMERIC(10, 2),
+    "Weeks_To_Empty" NUMERIC(10, 2),
+    "MinStock" INTEGER,
+    "Buffer" INTEGER,
+    "Reorder_Qty" INTEGER,
+    "Status" VARCHAR(50),
+    "Description" TEXT,
+    unchanged_counter NUMERIC(10, 2) DEFAULT 0,
+    flag VARCHAR(50) DEFAULT 'stage',
+    created_at TIMESTAMP NOT NULL
+) PARTITION BY RANGE (created_at);
+
+-- Current-batch reads and single-product edits
+CREATE INDEX IF NOT EXISTS idx_notification_history_batch_sku
+ON stock_notification_history(batch_id, "Product_SKU");
+
+-- Per-product trends across batches
+CREATE INDEX IF NOT EXISTS idx_notification_history_sku_created
+ON stock_notification_history("Product_SKU", created_at);
+
+-- Create the month partition for ts if missing; writers call this before appending a batch
+CREATE OR REPLACE FUNCTION ensure_notification_partition(ts TIMESTAMP) RETURNS VOID AS $$
+DECLARE
+    month_start DATE := date_trunc('month', ts)::date;
+    part TEXT := 'stock_notification_history_' || to_char(ts, 'YYYY_MM');
+BEGIN
+    -- Serialize concurrent creators of the same partition (several API workers)
+    PERFORM pg_advisory_xact_lock(hashtext(part));
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF stock_notification_history FOR VALUES FROM (%L) TO (%L)',
+        part, month_start, (month_start + INTERVAL '1 month')::date
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Keep the rows of the old replace-on-upload table as the first batch, then retire it
+DO $$
+DECLARE
+    n_rows BIGINT;
+    batch_time TIMESTAMP;
+    legacy_batch BIGINT;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.tables
+        WHERE table_name = 'stock_notifications' AND table_type = 'BASE TABLE'
+    ) THEN
+        SELECT COUNT(*), COALESCE(MAX(created_at), CURRENT_TIMESTAMP)
+        INTO n_rows, batch_time
+        FROM stock_notifications;
+
+        IF n_rows = 0 THEN
+            DROP TABLE stock_notifications;
+        ELSE
+            INSERT INTO notification_batches (created_at, row_count)
+            VALUES (batch_time, n_rows)
+            RETURNING batch_id INTO legacy_batch;
+
+            PERFORM ensure_notification_partition(batch_time);
+
+            INSERT INTO stock_notification_history (
+                batch_id, "Product", "Product_SKU", "Category", "Stock", "Last_Stock",
+                "Decrease_Rate(%)", "Weeks_To_Empty", "MinStock", "Buffer", "Reorder_Qty",
+                "Status", "Description", unchanged_counter, flag, created_at
+            )
+            SELECT legacy_batch, "Product", "Product_SKU", "Category", "Stock", "Last_Stock",
+                   "Decrease_Rate(%)", "Weeks_To_Empty", "MinStock", "Buffer", "Reorder_Qty",
+                   "Status", "Description", unchanged_counter, flag, batch_time
+            FROM stock_notifications;
+
+            ALTER TABLE stock_notifications RENAME TO stock_notifications_legacy;
+        END IF;
+    END IF;
+END $$;
+
+-- Pointer to the newest batch
+CREATE OR REPLACE VIEW latest_notification_batch AS
+SELECT batch_id, created_at, row_count
+FROM notification_batches
+ORDER BY batch_id DESC
+LIMIT 1;
+
+-- Rows of the newest batch. The created_at condition lets the planner prune to a single
+-- month partition at run time; the batch_id condition then uses the (batch_id, SKU) index.
+-- A simple single-table view, so it stays updatable for the manual-value endpoints.
+CREATE OR REPLACE VIEW stock_notifications AS
+SELECT h.*
+FROM stock_notification_history h
+WHERE h.batch_id = (SELECT batch_id FROM latest_notification_batch)
+  AND h.created_at = (SELECT created_at FROM latest_notification_batch);
@@ -1,41 +1,124 @@
 # data_analyzer.py
+import threading
+import weakref
+import numpy as np
 import pandas as pd
-from typing import List, Tuple
+from typing import List, Optional, Tuple, Union
+from dtype_policy import apply_dtype_policy, map_categories
 
 # -----------------------------
 # Helpers / Preprocess
 # -----------------------------
+SIZE_ALIASES = {
+    "2XL": "XXL",
+    "XXXL": "3XL",
+    "XXXXL": "4XL",
+    "5XL ": "5XL",
+    "L "  : "L",
+}
+
+
+def _base_sku(skus: pd.Series) -> pd.Series:
+    return skus.astype(str).str.rsplit("-", n=1).str[0]
+
+
+def _size(skus: pd.Series) -> pd.Series:
+    size = skus.astype(str).str.rsplit("-", n=1).str[1]  # NaN if no '-'
+    return size.fillna("NA").astype(str).str.strip().str.upper().replace(SIZE_ALIASES)
+
+
+SIZE_ORDER = ["XS", "S", "M", "L", "XL", "XXL", "3XL", "4XL", "5XL", "6XL"]
+
+
+def order_sizes(sizes) -> list:
+    """Known sizes smallest to largest, then anything else in its existing order"""
+    sizes = list(sizes)
+    return [s for s in SIZE_ORDER if s in sizes] + [c for c in sizes if c not in SIZE_ORDER]
+
+
+def _upper_key(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.upper()
+
+
+def year_month_stamps(year: pd.Series, month: pd.Series) -> pd.Series:
+    """
+    First-of-month timestamps built arithmetically: months since 1970-01 -> datetime64[M].
+    Rows with a missing year/month or a month outside 1..12 become NaT.
+    """
+    y = pd.to_numeric(year, errors="coerce").astype("float64").to_numpy()
+    m = pd.to_numeric(month, errors="coerce").astype("float64").to_numpy()
+    valid = ~np.isnan(y) & ~np.isnan(m) & (m >= 1) & (m <= 12)
+    stamps = np.full(len(y), np.datetime64("NaT"), dtype="datetime64[M]")
+    stamps[valid] = ((y[valid] - 1970) * 12 + (m[valid] - 1)).astype("int64").astype("datetime64[M]")
+    return pd.Series(stamps.astype("datetime64[ns]"), index=year.index, name="YearMonth")
+
+
 def preprocess(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    parts = out["Product_SKU"].astype(str).str.rsplit("-", n=1)
-    out["Base_SKU"] = parts.str[0]
-    out["Size"] = parts.str[1]  # NaN if no '-'
-    out["Size"] = out["Size"].fillna("NA").astype(str).str.strip().str.upper()
-
-    out["Size"] = out["Size"].replace({
-        "2XL": "XXL",
-        "XXXL": "3XL",
-        "XXXXL": "4XL",
-        "5XL ": "5XL",
-        "L "  : "L",
-    })
+    # Compact dtypes; SKU string work then runs once per distinct SKU, not per row
+    out = apply_dtype_policy(df)
+    out["Base_SKU"] = map_categories(out["Product_SKU"], _base_sku)
+    out["Size"] = map_categories(out["Product_SKU"], _size)
+    out["Product_SKU_u"] = map_categories(out["Product_SKU"], _upper_key)
+    out["Base_SKU_u"] = map_categories(out["Base_SKU"], _upper_key)
 
     if {"Year", "Month"}.issubset(out.columns):
-        out["YearMonth"] = pd.to_datetime(
-            out["Year"].astype(int).astype(str) + "-" + out["Month"].astype(int).astype(str) + "-01",
-            errors="coerce"
-        )
+        out["YearMonth"] = year_month_stamps(out["Year"], out["Month"])
     else:
         out["YearMonth"] = pd.NaT
 
     return out
 
 
+class PreparedSales:
+    """
+    A sales frame with the derived analysis columns (Base_SKU, Size, YearMonth and
+    the upper-cased Product_SKU_u / Base_SKU_u keys) computed once.
+
+    version identifies the source data (e.g. base_data_version); without one the
+    preparation is reused only for the same DataFrame object.
+    """
+
+    def __init__(self, df: pd.DataFrame, version=None):
+        self.version = version
+        self._source = weakref.ref(df)
+        self.frame = preprocess(df)
+
+    def matches(self, df: pd.DataFrame, version=None) -> bool:
+        if version is not None:
+            return version == self.version
+        return self._source() is df
+
+
+_prepared_lock = threading.Lock()
+_prepared: Optional[PreparedSales] = None
+
+
+def prepare(df: Union[pd.DataFrame, PreparedSales], version=None) -> PreparedSales:
+    """Prepared dataset for df, reused while the source (or its version) is unchanged"""
+    global _prepared
+    if isinstance(df, PreparedSales):
+        return df
+    current = _prepared
+    if current is not None and current.matches(df, version):
+        return current
+    prepared = PreparedSales(df, version)
+    with _prepared_lock:
+        _prepared = prepared
+    return prepared
+
+
+def invalidate_prepared() -> None:
+    """Drop the cached preparation (call when the source data is rewritten in place)"""
+    global _prepared
+    with _prepared_lock:
+        _prepared = None
+
+
 # -----------------------------
 # 1) Historical Sales (grouped bars) — by SKU/Base only
 # -----------------------------
-def size_mix_pivot(df: pd.DataFrame, sku_or_base: str) -> pd.DataFrame:
-    d = preprocess(df)
+def size_mix_pivot(df: pd.DataFrame, sku_or_base: str, version=None) -> pd.DataFrame:
+    d = prepare(df, version).frame
     base = str(sku_or_base).split("-")[0].strip()
 
     sub = d.loc[d["Base_SKU"].str.casefold().eq(base.casefold()),
@@ -43,22 +126,81 @@ def size_mix_pivot(df: pd.DataFrame, sku_or_base: str) -> pd.DataFrame:
     if sub.empty:
         return pd.DataFrame()
 
-    grouped = sub.groupby(["YearMonth", "Size"], as_index=False)["Total_quantity"].sum()
+    grouped = sub.groupby(["YearMonth", "Size"], as_index=False, observed=True)["Total_quantity"].sum()
     pivot = grouped.pivot(index="YearMonth", columns="Size", values="Total_quantity").fillna(0).sort_index()
 
-    pref = ["XS", "S", "M", "L", "XL", "XXL", "3XL", "4XL", "5XL", "6XL"]
-    sizes = [s for s in pref if s in pivot.columns] + [c for c in pivot.columns if c not in pref]
-    pivot = pivot.reindex(columns=sizes)
+    pivot = pivot.reindex(columns=order_sizes(pivot.columns))
     return pivot
 
 
+class SizeMixCube:
+    """
+    Base SKU x size x month quantities built from a prepared frame in one pass and kept
+    sparse: per base SKU (casefolded, as pivot() looks them up), only the size/month
+    cells that had rows. pivot() returns what size_mix_pivot returns for the same data
+    by expanding one base's cells instead of scanning every row, and memory grows with
+    the cells sold rather than with bases x sizes x months.
+    """
+
+    def __init__(self, prepared):
+        d = prepare(prepared).frame
+        d = d[d["YearMonth"].notna()]
+        base = d["Base_SKU"].cat.remove_unused_categories()
+        size = d["Size"].cat.remove_unused_categories()
+        self.sizes = size.cat.categories
+        if d.empty:
+            self.months = pd.DatetimeIndex([], name="YearMonth")
+        else:
+            self.months = pd.date_range(d["YearMonth"].min(), d["YearMonth"].max(), freq="MS", name="YearMonth")
+
+        # Bases that differ only in case share one key, as in size_mix_pivot's match
+        key_codes, keys = pd.factorize(pd.Index(base.cat.categories.astype(str)).str.casefold())
+        b = base.cat.codes.to_numpy(dtype="int64")
+        cells = pd.DataFrame({
+            "key": np.where(b >= 0, key_codes[np.maximum(b, 0)], -1),
+            "size": size.cat.codes.to_numpy(dtype="int64"),
+            "month": self.months.get_indexer(d["YearMonth"]),
+            "qty": pd.to_numeric(d["Total_quantity"], errors="coerce").fillna(0).to_numpy(dtype="float64"),
+        })
+        cells = cells[(cells["key"] >= 0) & (cells["size"] >= 0) & (cells["month"] >= 0)]
+        # One row per cell that had rows at all (a zero-quantity row still puts its
+        # month/size on the chart), sorted by key so each base is one contiguous run
+        cells = cells.groupby(["key", "size", "month"], sort=True)["qty"].sum().reset_index()
+
+        key = cells["key"].to_numpy()
+        size_code = cells["size"].to_numpy()
+        month_code = cells["month"].to_numpy()
+        qty = cells["qty"].to_numpy()
+        bounds = np.searchsorted(key, np.arange(len(keys) + 1))
+        self._cells = {
+            keys[k]: (size_code[lo:hi], month_code[lo:hi], qty[lo:hi])
+            for k, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))
+            if hi > lo
+        }
+
+    def pivot(self, sku_or_base: str) -> pd.DataFrame:
+        base = str(sku_or_base).split("-")[0].strip()
+        cells = self._cells.get(base.casefold())
+        if cells is None:
+            return pd.DataFrame()
+        size_code, month_code, qty = cells
+        sizes, si = np.unique(size_code, return_inverse=True)
+        months, mi = np.unique(month_code, return_inverse=True)
+        grid = np.zeros((len(months), len(sizes)))
+        grid[mi, si] = qty
+        pivot = pd.DataFrame(
+            grid,
+            index=self.months[months],
+            columns=pd.Index(self.sizes[sizes], name="Size"),
+        )
+        return pivot.reindex(columns=order_sizes(pivot.columns))
+
+
 # -----------------------------
 # 2) Performance comparison (table, up to 3 SKUs/Base SKUs)
 # -----------------------------
-def performance_table(df: pd.DataFrame, sku_list: List[str]) -> pd.DataFrame:
-    d = preprocess(df).copy()
-    d["Product_SKU_u"] = d["Product_SKU"].astype(str).str.strip().str.upper()
-    d["Base_SKU_u"]    = d["Base_SKU"].astype(str).str.strip().str.upper()
+def performance_table(df: pd.DataFrame, sku_list: List[str], version=None) -> pd.DataFrame:
+    d = prepare(df, version).frame
 
     tokens = [s.strip().upper() for s in sku_list if s and s.strip()]
     if not tokens:
@@ -73,7 +215,7 @@ def performance_table(df: pd.DataFrame, sku_list: List[str]) -> pd.DataFrame:
         if "Product_name" not in df_in.columns:
             nm = pd.DataFrame(columns=[key, "Product_name"])
         else:
-            nm = (df_in.groupby([key, "Product_name"]).size()
+            nm = (df_in.groupby([key, "Product_name"], observed=True).size()
                         .reset_index(name="n")
                         .sort_values([key, "n"], ascending=[True, False])
                         .drop_duplicates(key)[[key, "Product_name"]])
@@ -82,7 +224,7 @@ def performance_table(df: pd.DataFrame, sku_list: List[str]) -> pd.DataFrame:
     wants_sku_level = any("-" in t for t in tokens)
 
     if wants_sku_level:
-        totals = (keep.groupby("Product_SKU", as_index=False)
+        totals = (keep.groupby("Product_SKU", as_index=False, observed=True)
                        .agg(Quantity=("Total_quantity", "sum")))
 
         sku_name_map = _name_map(d, "Product_SKU")
@@ -92,7 +234,7 @@ def performance_table(df: pd.DataFrame, sku_list: List[str]) -> pd.DataFrame:
         tbl = tbl[["Item", "Product_name", "Quantity"]]
 
     else:
-        fam = (keep.groupby("Base_SKU", as_index=False)
+        fam = (keep.groupby("Base_SKU", as_index=False, observed=True)
                     .agg(Quantity=("Total_quantity", "sum")))
 
         base_name_map = _name_map(d, "Base_SKU")
@@ -107,8 +249,8 @@ def performance_table(df: pd.DataFrame, sku_list: List[str]) -> pd.DataFrame:
 # -----------------------------
 # 3) Best sellers by month (Top 10) + best size
 # -----------------------------
-def best_sellers_by_month(df: pd.DataFrame, year: int, month: int, top_n: int = 10) -> pd.DataFrame:
-    d = preprocess(df)
+def best_sellers_by_month(df: pd.DataFrame, year: int, month: int, top_n: int = 10, version=None) -> pd.DataFrame:
+    d = prepare(df, version).frame
     m = d[(d["Year"] == int(year)) & (d["Month"] == int(month))].copy()
 
     if m.empty:
@@ -120,17 +262,17 @@ def best_sellers_by_month(df: pd.DataFrame, year: int, month: int, top_n: int =
         if not m["Product_name"].notna().any():
             m["Product_name"] = m["Base_SKU"]
 
-    fam = (m.groupby("Base_SKU", as_index=False)
+    fam = (m.groupby("Base_SKU", as_index=False, observed=True)
              .agg(Quantity=("Total_quantity", "sum")))
 
-    size_rank = (m.groupby(["Base_SKU", "Size"], as_index=False)
+    size_rank = (m.groupby(["Base_SKU", "Size"], as_index=False, observed=True)
                    .agg(Size_Qty=("Total_quantity", "sum")))
 
     best_size = (size_rank.sort_values(["Base_SKU", "Size_Qty"], ascending=[True, False])
-                         .groupby("Base_SKU", as_index=False).first()[["Base_SKU", "Size"]]
+                         .groupby("Base_SKU", as_index=False, observed=True).first()[["Base_SKU", "Size"]]
                          .rename(columns={"Size": "Best_Size"}))
 
-    name_map = (m.groupby(["Base_SKU", "Product_name"]).size()
+    name_map = (m.groupby(["Base_SKU", "Product_name"], observed=True).size()
                   .reset_index(name="n")
                   .sort_values(["Base_SKU", "n"], ascending=[True, False])
                   .drop_duplicates("Base_SKU")[["Base_SKU", "Product_name"]])
@@ -143,25 +285,69 @@ def best_sellers_by_month(df: pd.DataFrame, year: int, month: int, top_n: int =
     return out[["Base_SKU", "Product_name", "Best_Size", "Quantity"]]
 
 
+def monthly_best_sellers(df: pd.DataFrame, top_n: int = 10, start=None, end=None, version=None) -> pd.DataFrame:
+    """
+    Top-N base SKUs for every month in [start, end] (month stamps, inclusive; None = open)
+    in one grouped pass. Columns: YearMonth, Rank, Base_SKU, Product_name, Best_Size, Quantity.
+    """
+    cols = ["YearMonth", "Rank", "Base_SKU", "Product_name", "Best_Size", "Quantity"]
+    d = prepare(df, version).frame
+    if start is not None:
+        d = d[d["YearMonth"] >= pd.Timestamp(start)]
+    if end is not None:
+        d = d[d["YearMonth"] <= pd.Timestamp(end)]
+    d = d[d["YearMonth"].notna()]
+    if d.empty:
+        return pd.DataFrame(columns=cols)
+
+    # Finest grain once; family totals and best size both come from it
+    by_size = (d.groupby(["YearMonth", "Base_SKU", "Size"], observed=True)["Total_quantity"]
+                .sum().rename("Size_Qty").reset_index())
+    fam = (by_size.groupby(["YearMonth", "Base_SKU"], observed=True)["Size_Qty"]
+                  .sum().rename("Quantity"))
+    top = fam.groupby(level="YearMonth", group_keys=False).nlargest(top_n).reset_index()
+
+    best_size = (by_size.sort_values(["YearMonth", "Base_SKU", "Size_Qty"], ascending=[True, True, False])
+                        .drop_duplicates(["YearMonth", "Base_SKU"])[["YearMonth", "Base_SKU", "Size"]]
+                        .rename(columns={"Size": "Best_Size"}))
+    out = top.merge(best_size, on=["YearMonth", "Base_SKU"], how="left")
+
+    if "Product_name" in d.columns and d["Product_name"].notna().any():
+        keys = top[["YearMonth", "Base_SKU"]]
+        named = d.merge(keys, on=["YearMonth", "Base_SKU"], how="inner")
+        name_map = (named.groupby(["YearMonth", "Base_SKU", "Product_name"], observed=True).size()
+                         .reset_index(name="n")
+                         .sort_values(["YearMonth", "Base_SKU", "n"], ascending=[True, True, False])
+                         .drop_duplicates(["YearMonth", "Base_SKU"])[["YearMonth", "Base_SKU", "Product_name"]])
+        out = out.merge(name_map, on=["YearMonth", "Base_SKU"], how="left")
+        out["Product_name"] = out["Product_name"].astype(object).fillna(out["Base_SKU"].astype(object))
+    else:
+        out["Product_name"] = out["Base_SKU"].astype(object)
+
+    out = out.sort_values(["YearMonth", "Quantity"], ascending=[True, False], kind="stable")
+    out["Rank"] = out.groupby("YearMonth").cumcount() + 1
+    return out[cols].reset_index(drop=True)
+
+
 # -----------------------------
 # 4) Total income table (all SKUs) + grand total
 # -----------------------------
-def total_income_table(df: pd.DataFrame) -> Tuple[pd.DataFrame, float]:
+def total_income_table(df: pd.DataFrame, version=None) -> Tuple[pd.DataFrame, float]:
     # KEEP SAME AS BEFORE
-    d = preprocess(df).copy()
+    d = prepare(df, version).frame
     monthly = (
-        d.groupby(["Product_SKU", "YearMonth"], as_index=False)
+        d.groupby(["Product_SKU", "YearMonth"], as_index=False, observed=True)
          .agg(Revenue_Baht=("Total_Amount(baht)", "sum"))
     )
     per_sku = (
-        monthly.groupby("Product_SKU", as_index=False)
+        monthly.groupby("Product_SKU", as_index=False, observed=True)
                .agg(Total_Revenue_Baht=("Revenue_Baht", "sum"),
                     Avg_Monthly_Revenue_Baht=("Revenue_Baht", "mean"),
                     Months_Active=("Revenue_Baht", "size"))
     )
     if "Product_name" in d.columns:
         name_map = (
-            d.groupby(["Product_SKU", "Product_name"]).size()
+            d.groupby(["Product_SKU", "Product_name"], observed=True).size()
              .reset_index(name="n")
              .sort_values(["Product_SKU", "n"], ascending=[True, False])
              .drop_duplicates("Product_SKU")[["Product_SKU", "Product_name"]]
@@ -0,0 +1,77 @@
+"""
+Dtype Policy Module
+Compact dtypes for sales frames, applied once where data enters the pipeline
+(base_data snapshot / DB reads, auto_cleaning output, data_analyzer input).
+
+- SKU, base SKU, size, product name and category columns -> category
+- year -> int16, month -> int8
+- integral quantities -> int32
+- month stamps -> datetime64[ns]
+
+Downstream code keeps these dtypes: groupbys pass observed=True, and string
+transforms on categorical columns go through map_categories so they run once per
+distinct value instead of once per row.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+CATEGORICAL_COLUMNS = {
+    "product_sku", "Product_SKU", "Base_SKU", "Size",
+    "product_name", "Product_name",
+    "category", "Category", "หมวดหมู่",
+}
+SMALL_INT_COLUMNS = {
+    "sales_year": "int16", "Year": "int16",
+    "sales_month": "int8", "Month": "int8",
+}
+QUANTITY_COLUMNS = {"total_quantity", "Total_quantity"}
+DATE_COLUMNS = {"sales_date", "YearMonth"}
+
+
+def is_categorical(series):
+    return isinstance(series.dtype, CategoricalDtype)
+
+
+def apply_dtype_policy(df, copy=True):
+    """Return df with the compact dtypes above; columns it doesn't know are left alone"""
+    out = df.copy() if copy else df
+    for col in out.columns:
+        s = out[col]
+        if col in CATEGORICAL_COLUMNS:
+            if not is_categorical(s):
+                out[col] = s.astype("category")
+        elif col in SMALL_INT_COLUMNS:
+            num = pd.to_numeric(s, errors="coerce")
+            target = SMALL_INT_COLUMNS[col]
+            out[col] = num.astype(target) if num.notna().all() else num.astype(target.capitalize())
+        elif col in QUANTITY_COLUMNS:
+            num = pd.to_numeric(s, errors="coerce")
+            if num.notna().all() and (num % 1 == 0).all():
+                out[col] = num.astype("int32")
+            else:
+                out[col] = num.astype("float64")
+        elif col in DATE_COLUMNS:
+            if not pd.api.types.is_datetime64_any_dtype(s):
+                out[col] = pd.to_datetime(s, errors="coerce")
+    return out
+
+
+def map_categories(series, func):
+    """
+    Apply a vectorized string transform (Series -> Series) to the distinct values of
+    series only and return a categorical result with sorted categories.
+    """
+    cat = series if is_categorical(series) else series.astype("category")
+    mapped = np.asarray(func(pd.Series(cat.cat.categories.astype(object))), dtype=object)
+    inverse, uniques = pd.factorize(mapped, sort=True)
+    codes = cat.cat.codes.to_numpy()
+    new_codes = np.where(codes >= 0, inverse[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=uniques),
+                     index=series.index, name=series.name)
+
+
+def memory_mb(df):
+    """Deep memory usage in MB (for logging / benchmarks)"""
+    return float(df.memory_usage(deep=True).sum()) / (1024 * 1024)
@@ -0,0 +1,166 @@
+"""
+Events Module
+Push channel for the dashboard: compact JSON events streamed to /events (SSE) clients,
+so they refetch only when something changed instead of polling full tables.
+
+publish() sends an event with pg_notify on the caller's connection. Postgres delivers
+it when that transaction commits (never for a rolled-back write) to every API worker.
+Each worker runs one listener thread on a dedicated LISTEN connection, started by the
+first subscriber, and hands notifications to the asyncio queues of its SSE clients.
+Without Postgres (e.g. the SQLite stand-in used by the benchmarks) events go straight
+to this worker's subscribers.
+
+Event types:
+    notifications  an upload produced new or escalated Red / Yellow rows
+    base_stock     base_stock was replaced or cleared
+    job            a /train or /predict job finished
+"""
+
+import asyncio
+import json
+import select
+import threading
+from sqlalchemy import text
+from DB_server import engine
+from metrics import get_logger
+
+log = get_logger("events")
+
+CHANNEL = "lontuktak_events"
+EVENT_TYPES = ("notifications", "base_stock", "job")
+QUEUE_SIZE = 100           # events buffered per client before new ones are dropped
+HEARTBEAT_INTERVAL = 15.0  # seconds between SSE keep-alive comments
+RECONNECT_DELAY = 5.0      # seconds before the listener reconnects after an error
+
+
+class EventHub:
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._subscribers = []  # [(event loop, asyncio.Queue)]
+        self._listener = None
+        self._stop = threading.Event()
+
+    @property
+    def uses_postgres(self):
+        return self.engine is not None and self.engine.dialect.name == "postgresql"
+
+    # ---------- publishing ----------
+    def publish(self, conn, event_type, **payload):
+        """
+        Send an event. With conn it joins conn's transaction and is delivered on commit;
+        with conn=None it is sent right away. Payloads must stay small (pg_notify caps
+        them at 8000 bytes): counts and ids, never rows.
+        """
+        message = json.dumps({"type": event_type, **payload}, default=str, separators=(",", ":"))
+        if not self.uses_postgres:
+            self._dispatch(message)
+            return
+        notify = text("SELECT pg_notify(:channel, :message)")
+        params = {"channel": CHANNEL, "message": message}
+        if conn is not None:
+            conn.execute(notify, params)
+            return
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(notify, params)
+        except Exception as e:
+            log.warning(f"Failed to publish {event_type} event: {e}")
+
+    # ---------- subscribing ----------
+    def subscribe(self):
+        """Queue receiving encoded events on the running event loop; pair with unsubscribe"""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+            self._ensure_listener()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not queue]
+
+    def _dispatch(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:
+                # Loop already closed (worker shutting down)
+                pass
+
+    @staticmethod
+    def _offer(queue, message):
+        # A client that stops reading loses events instead of growing this worker's memory;
+        # it catches up with /notifications?since= on its next fetch
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    # ---------- LISTEN thread ----------
+    def _ensure_listener(self):
+        """Start the listener thread if needed (caller holds _lock)"""
+        if not self.uses_postgres or (self._listener is not None and self._listener.is_alive()):
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                # Dedicated connection: never returned to the pool in LISTEN state
+                raw.detach()
+                dbapi = getattr(raw, "driver_connection", None) or raw.connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                log.info(f"Listening for events on {CHANNEL}")
+                while not self._stop.is_set():
+                    if select.select([dbapi], [], [], 1.0)[0]:
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            self._dispatch(dbapi.notifies.pop(0).payload)
+            except Exception as e:
+                log.warning(f"Event listener error: {e}; reconnecting in {RECONNECT_DELAY:.0f}s")
+                self._stop.wait(RECONNECT_DELAY)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+    def close(self):
+        """Stop the listener thread (worker shutdown)"""
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2.0)
+
+
+async def sse_stream(hub, types=None, heartbeat=HEARTBEAT_INTERVAL):
+    """Server-sent event stream of hub's events, optionally limited to a set of types"""
+    queue = hub.subscribe()
+    try:
+        # Tell EventSource to wait a few seconds before reconnecting
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            event_type = json.loads(message).get("type")
+            if types and event_type not in types:
+                continue
+            yield f"event: {event_type}\ndata: {message}\n\n"
+    finally:
+        hub.unsubscribe(queue)
+
+
+events = EventHub(engine)
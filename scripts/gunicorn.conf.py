@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration: the API on several uvicorn worker processes.
+
+    cd scripts
+    gunicorn -c gunicorn.conf.py Backend:app
+
+Shared state lives in Postgres (manual overrides, base_data_version, stock data)
+or under LONTUKTAK_ARTIFACT_DIR (model file, per-job outputs; see artifacts.py),
+and startup migrations take an advisory lock, so every worker is interchangeable.
+Each worker has its own SQLAlchemy pool: keep workers x (pool_size + max_overflow)
+below the server's max_connections. Count one more connection per worker for the /events
+LISTEN thread (events.py). Workers recycled by max_requests drop their /events streams,
+and clients reconnect on their own.
+
+Environment:
+    LONTUKTAK_BIND            address to listen on (default 0.0.0.0:8000)
+    LONTUKTAK_WORKERS         worker processes (default: one per CPU core)
+    LONTUKTAK_WORKER_TIMEOUT  seconds before a silent worker is restarted (default 900;
+                              /train runs inside the request)
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("LONTUKTAK_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("LONTUKTAK_WORKERS", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("LONTUKTAK_WORKER_TIMEOUT", "900"))
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app in each worker, after fork: DB_server opens a connection at import
+# time, and pooled connections must not be shared between processes
+preload_app = False
+
+# A worker that served /train keeps the ML stack loaded; recycle workers now and then
+# so that memory is returned
+max_requests = 1000
+max_requests_jitter = 100
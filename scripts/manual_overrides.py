@@ -0,0 +1,159 @@
+"""
+Manual Overrides Module
+Persistent manual MinStock / Buffer overrides with a write-through in-memory mirror.
+
+Overrides live in the manual_overrides table (create_manual_overrides_table.sql,
+applied by migrations.py). Each worker keeps a mirror of the table and a copy of
+manual_overrides_version; every write bumps the version in the same statement, so other workers notice
+with one single-row read and reload. Report generation joins the mirror as a
+DataFrame instead of mapping dicts per SKU.
+"""
+
+import threading
+import time
+import pandas as pd
+from sqlalchemy import text
+from DB_server import engine
+from metrics import get_logger
+
+log = get_logger("manual_overrides")
+
+SYNC_INTERVAL = 2.0  # seconds between version checks
+
+
+class ManualOverrideStore:
+    def __init__(self, engine, sync_interval=SYNC_INTERVAL):
+        self.engine = engine
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._minstock = {}  # {'Product_SKU': value}
+        self._buffer = {}    # {'Product_SKU': value}
+        self._version = -1
+        self._last_sync = 0.0
+        self._frame = None
+
+    # ---------- loading ----------
+    def reload(self):
+        """Replace the mirror with the current table contents"""
+        if self.engine is None:
+            return
+        try:
+            with self.engine.connect() as conn:
+                version = conn.execute(text("SELECT version FROM manual_overrides_version WHERE id = 1")).scalar()
+                rows = conn.execute(text("SELECT product_sku, minstock, buffer FROM manual_overrides")).fetchall()
+        except Exception as e:
+            log.error(f"Failed to load manual overrides: {e}")
+            return
+        minstock = {sku: m for sku, m, _ in rows if m is not None}
+        buffer = {sku: b for sku, _, b in rows if b is not None}
+        with self._lock:
+            self._minstock, self._buffer = minstock, buffer
+            self._version = int(version or 0)
+            self._last_sync = time.monotonic()
+            self._frame = None
+        log.info(f"Loaded {len(rows)} manual overrides (version {self._version})")
+
+    def sync(self, force=False):
+        """Reload if another worker has written since our last look"""
+        if self.engine is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval:
+            return
+        try:
+            with self.engine.connect() as conn:
+                version = conn.execute(text("SELECT version FROM manual_overrides_version WHERE id = 1")).scalar()
+        except Exception as e:
+            log.warning(f"Manual override version check failed: {e}")
+            return
+        self._last_sync = now
+        if version is not None and int(version) != self._version:
+            self.reload()
+
+    # ---------- writes ----------
+    def write(self, conn, records):
+        """
+        Upsert overrides inside the caller's transaction.
+        records: iterable of dicts with product_sku, minstock, buffer (None keeps the stored value)
+        Returns (effective_records, version) where effective_records hold the stored values.
+        """
+        # ON CONFLICT cannot touch the same row twice in one statement: last entry wins
+        records = list({str(r["product_sku"]): r for r in records}.values())
+        if not records:
+            return [], self._version
+        params = {}
+        values_sql = []
+        for i, r in enumerate(records):
+            values_sql.append(f"(CAST(:sku{i} AS VARCHAR), CAST(:min{i} AS INTEGER), CAST(:buf{i} AS INTEGER))")
+            params[f"sku{i}"] = str(r["product_sku"])
+            params[f"min{i}"] = None if r.get("minstock") is None else int(r["minstock"])
+            params[f"buf{i}"] = None if r.get("buffer") is None else int(r["buffer"])
+
+        upsert_sql = text(f"""
+            WITH up AS (
+                INSERT INTO manual_overrides (product_sku, minstock, buffer, updated_at)
+                SELECT v.sku, v.minstock, v.buffer, CURRENT_TIMESTAMP
+                FROM (VALUES {", ".join(values_sql)}) AS v(sku, minstock, buffer)
+                ON CONFLICT (product_sku) DO UPDATE
+                SET minstock = COALESCE(EXCLUDED.minstock, manual_overrides.minstock),
+                    buffer = COALESCE(EXCLUDED.buffer, manual_overrides.buffer),
+                    updated_at = EXCLUDED.updated_at
+                RETURNING product_sku, minstock, buffer
+            ), ver AS (
+                UPDATE manual_overrides_version SET version = version + 1 WHERE id = 1
+                RETURNING version
+            )
+            SELECT up.product_sku, up.minstock, up.buffer, ver.version
+            FROM up CROSS JOIN ver
+        """)
+        rows = conn.execute(upsert_sql, params).fetchall()
+        effective = [{"product_sku": sku, "minstock": m, "buffer": b} for sku, m, b, _ in rows]
+        version = int(rows[0][3]) if rows else self._version
+        return effective, version
+
+    def apply_local(self, records, version):
+        """Write-through: update the mirror after the caller's transaction committed"""
+        with self._lock:
+            stale = version != self._version + 1
+            if not stale:
+                for r in records:
+                    sku = r["product_sku"]
+                    if r.get("minstock") is not None:
+                        self._minstock[sku] = r["minstock"]
+                    if r.get("buffer") is not None:
+                        self._buffer[sku] = r["buffer"]
+                self._version = version
+                self._frame = None
+        if stale:
+            # Someone else wrote in between; pick up their changes too
+            self.reload()
+
+    def update(self, records):
+        """Persist overrides in their own transaction and update the mirror"""
+        records = list(records)
+        if self.engine is None:
+            self.apply_local(records, self._version + 1)
+            return records
+        with self.engine.begin() as conn:
+            effective, version = self.write(conn, records)
+        self.apply_local(effective, version)
+        return effective
+
+    # ---------- reads ----------
+    @property
+    def version(self):
+        return self._version
+
+    def frame(self):
+        """DataFrame indexed by Product_SKU with Manual_MinStock / Manual_Buffer (NaN = no override)"""
+        with self._lock:
+            if self._frame is None:
+                self._frame = pd.DataFrame({
+                    "Manual_MinStock": pd.Series(self._minstock, dtype="float64"),
+                    "Manual_Buffer": pd.Series(self._buffer, dtype="float64"),
+                })
+                self._frame.index.name = "Product_SKU"
+            return self._frame
+
+
+overrides = ManualOverrideStore(engine)
@@ -0,0 +1,336 @@
+"""
+Metrics Module
+Structured logging and request instrumentation for the FastAPI backend.
+
+Log records are handed to a background thread through a queue, so request
+handlers never block on stdout. Per-route latency, DB/serialization stage
+timings and row counts are kept in in-process histograms and exported in
+Prometheus text format by the /metrics endpoint.
+
+Long pipelines (training, forecasting) are profiled with StageProfile and
+profile_stage(): wall time, CPU time and RSS change per named stage, with
+optional cProfile output for the whole run.
+
+Environment:
+    LONTUKTAK_LOG_LEVEL        DEBUG / INFO / WARNING / ERROR (default INFO)
+    LONTUKTAK_LOG_SAMPLE_RATE  fraction of successful requests that get an
+                               access log line, 0.0 - 1.0 (default 1.0)
+"""
+
+import atexit
+import cProfile
+import io
+import logging
+import os
+import pstats
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LONTUKTAK_LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LONTUKTAK_LOG_SAMPLE_RATE", "1.0"))
+
+# Seconds; the upper buckets cover /train and /predict
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# ================= Logging =================
+class KeyValueFormatter(logging.Formatter):
+    """Render records as logfmt lines: ts=... level=... logger=... msg="..." key=value"""
+
+    def format(self, record):
+        parts = [
+            f"ts={self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}",
+            f"level={record.levelname}",
+            f"logger={record.name}",
+            f'msg="{record.getMessage()}"',
+        ]
+        for key, value in getattr(record, "fields", {}).items():
+            if isinstance(value, float):
+                value = f"{value:.4f}"
+            parts.append(f"{key}={value}")
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _ensure_listener():
+    """Attach a single QueueHandler to the package root logger (idempotent)"""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger("lontuktak")
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.propagate = False
+
+        log_queue = queue.SimpleQueue()
+        stream = logging.StreamHandler()
+        stream.setFormatter(KeyValueFormatter())
+        root.addHandler(QueueHandler(log_queue))
+
+        _listener = QueueListener(log_queue, stream, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a child of the 'lontuktak' logger that writes through the queue"""
+    _ensure_listener()
+    return logging.getLogger(f"lontuktak.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """Log one structured event; fields are rendered as key=value pairs"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def should_sample() -> bool:
+    """Decide whether a successful request gets an access log line"""
+    if LOG_SAMPLE_RATE >= 1.0:
+        return True
+    return random.random() < LOG_SAMPLE_RATE
+
+
+# ================= Histograms =================
+class Histogram:
+    """Cumulative histogram with fixed buckets (Prometheus semantics)"""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def cumulative(self):
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            yield bound, running
+
+
+_lock = threading.Lock()
+_request_latency = {}  # (method, route) -> Histogram
+_stage_latency = {}    # (route, stage) -> Histogram
+_row_counts = {}       # route -> Histogram
+_request_total = {}    # (method, route, status) -> int
+_pipeline_stages = {}  # (pipeline, stage) -> Histogram
+
+# Per-request scratchpad filled by timed() / record_rows() inside handlers
+_request_ctx: ContextVar = ContextVar("lontuktak_request_ctx", default=None)
+
+
+def begin_request() -> dict:
+    """Start collecting stage timings for the current request"""
+    ctx = {"stages": {}, "rows": None}
+    _request_ctx.set(ctx)
+    return ctx
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as a named stage (e.g. 'db', 'serialize') of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ctx = _request_ctx.get()
+        if ctx is not None:
+            elapsed = time.perf_counter() - start
+            ctx["stages"][stage] = ctx["stages"].get(stage, 0.0) + elapsed
+
+
+def record_rows(n: int):
+    """Record how many rows the current request returned"""
+    ctx = _request_ctx.get()
+    if ctx is not None:
+        ctx["rows"] = (ctx["rows"] or 0) + int(n)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, ctx: dict = None):
+    """Fold one finished request into the process-wide histograms"""
+    with _lock:
+        key = (method, route)
+        hist = _request_latency.get(key)
+        if hist is None:
+            hist = _request_latency[key] = Histogram(LATENCY_BUCKETS)
+        hist.observe(seconds)
+
+        status_key = (method, route, str(status))
+        _request_total[status_key] = _request_total.get(status_key, 0) + 1
+
+        if ctx:
+            for stage, elapsed in ctx["stages"].items():
+                skey = (route, stage)
+                shist = _stage_latency.get(skey)
+                if shist is None:
+                    shist = _stage_latency[skey] = Histogram(LATENCY_BUCKETS)
+                shist.observe(elapsed)
+            if ctx["rows"] is not None:
+                rhist = _row_counts.get(route)
+                if rhist is None:
+                    rhist = _row_counts[route] = Histogram(ROW_BUCKETS)
+                rhist.observe(ctx["rows"])
+
+
+# ================= Pipeline profiling =================
+_active_profile: ContextVar = ContextVar("lontuktak_profile", default=None)
+
+
+def _rss_bytes():
+    """Current resident set size, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StageProfile:
+    """
+    Per-stage breakdown of one pipeline run. Use as a context manager around the
+    run; profile_stage() blocks inside it add entries. With cprofile=True the
+    whole run is also profiled and the top functions kept as text.
+    """
+
+    CPROFILE_LINES = 40
+
+    def __init__(self, name: str, cprofile: bool = False):
+        self.name = name
+        self.stages = []
+        self.total_seconds = None
+        self.cprofile = None
+        self._profiler = cProfile.Profile() if cprofile else None
+        self._token = None
+        self._start = None
+
+    def __enter__(self):
+        self._token = _active_profile.set(self)
+        self._start = time.perf_counter()
+        if self._profiler is not None:
+            try:
+                self._profiler.enable()
+            except ValueError:  # another profiler is already active in this process
+                self._profiler = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(self.CPROFILE_LINES)
+            self.cprofile = out.getvalue()
+        self.total_seconds = time.perf_counter() - self._start
+        _active_profile.reset(self._token)
+        return False
+
+    def add(self, stage: str, wall: float, cpu: float, rss_delta):
+        self.stages.append({
+            "stage": stage,
+            "seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "rss_delta_mb": None if rss_delta is None else round(rss_delta / 2**20, 2),
+        })
+        with _lock:
+            key = (self.name, stage)
+            hist = _pipeline_stages.get(key)
+            if hist is None:
+                hist = _pipeline_stages[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(wall)
+
+    def as_dict(self) -> dict:
+        out = {
+            "pipeline": self.name,
+            "total_seconds": None if self.total_seconds is None else round(self.total_seconds, 4),
+            "stages": list(self.stages),
+        }
+        if self.cprofile is not None:
+            out["cprofile"] = self.cprofile
+        return out
+
+
+@contextmanager
+def profile_stage(stage: str):
+    """Record wall time, CPU time and RSS change of a block in the active StageProfile (no-op without one)"""
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+        return
+    rss0 = _rss_bytes()
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        rss1 = _rss_bytes()
+        profile.add(
+            stage,
+            time.perf_counter() - wall0,
+            time.process_time() - cpu0,
+            None if rss0 is None or rss1 is None else rss1 - rss0,
+        )
+
+
+# ================= Prometheus export =================
+def _labels(**labels) -> str:
+    body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def _render_histogram(lines, name, hist, **labels):
+    for bound, running in hist.cumulative():
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {running}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.total}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+
+def render_prometheus() -> str:
+    """Render all collected metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        lines.append("# HELP lontuktak_requests_total Requests handled, by route and status")
+        lines.append("# TYPE lontuktak_requests_total counter")
+        for (method, route, status), n in sorted(_request_total.items()):
+            lines.append(f"lontuktak_requests_total{_labels(method=method, route=route, status=status)} {n}")
+
+        lines.append("# HELP lontuktak_request_duration_seconds End-to-end request latency")
+        lines.append("# TYPE lontuktak_request_duration_seconds histogram")
+        for (method, route), hist in sorted(_request_latency.items()):
+            _render_histogram(lines, "lontuktak_request_duration_seconds", hist, method=method, route=route)
+
+        lines.append("# HELP lontuktak_stage_duration_seconds Time spent per request stage (db, serialize, ...)")
+        lines.append("# TYPE lontuktak_stage_duration_seconds histogram")
+        for (route, stage), hist in sorted(_stage_latency.items()):
+            _render_histogram(lines, "lontuktak_stage_duration_seconds", hist, route=route, stage=stage)
+
+        lines.append("# HELP lontuktak_response_rows Rows returned per request")
+        lines.append("# TYPE lontuktak_response_rows histogram")
+        for route, hist in sorted(_row_counts.items()):
+            _render_histogram(lines, "lontuktak_response_rows", hist, route=route)
+
+        lines.append("# HELP lontuktak_pipeline_stage_duration_seconds Time per profiled pipeline stage (train, forecast, ...)")
+        lines.append("# TYPE lontuktak_pipeline_stage_duration_seconds histogram")
+        for (pipeline, stage), hist in sorted(_pipeline_stages.items()):
+            _render_histogram(lines, "lontuktak_pipeline_stage_duration_seconds", hist, pipeline=pipeline, stage=stage)
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,27 @@
+-- Bring stock_notifications to the columns the upload writes (Notification.generate_stock_report
+-- + compute_stock_flags). Tables created by earlier uploads through DataFrame.to_sql already
+-- have most of them; tables created from create_stock_notifications_table.sql lack the SKU
+-- and category columns.
+ALTER TABLE stock_notifications ADD COLUMN IF NOT EXISTS "Product_SKU" VARCHAR(255);
+ALTER TABLE stock_notifications ADD COLUMN IF NOT EXISTS "Category" VARCHAR(255);
+ALTER TABLE stock_notifications ADD COLUMN IF NOT EXISTS unchanged_counter NUMERIC(10, 2) DEFAULT 0;
+ALTER TABLE stock_notifications ADD COLUMN IF NOT EXISTS flag VARCHAR(50) DEFAULT 'stage';
+ALTER TABLE stock_notifications ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Product names can be missing from a stock export; the report keeps those rows
+ALTER TABLE stock_notifications ALTER COLUMN "Product" DROP NOT NULL;
+
+-- Older startup code kept a lowercase product_sku copy; carry it over once
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'stock_notifications' AND column_name = 'product_sku'
+    ) THEN
+        UPDATE stock_notifications SET "Product_SKU" = product_sku WHERE "Product_SKU" IS NULL;
+    END IF;
+END $$;
+
+-- Single-product manual edits update by SKU
+CREATE INDEX IF NOT EXISTS idx_stock_notifications_sku
+ON stock_notifications("Product_SKU");
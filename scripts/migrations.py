@@ -0,0 +1,134 @@
+"""
+Migrations Module
+Versioned, one-shot schema migrations.
+
+MIGRATIONS lists SQL files from this directory in apply order. Each one is run
+once, in its own transaction, and recorded in schema_version together with a
+checksum of the file. Startup only reads the highest applied version; when it
+is current nothing else happens, so a boot costs one single-row query. Pending
+migrations run under a Postgres advisory lock, so with several workers exactly
+one applies them and the others wait and then find nothing to do.
+
+Applied files must not be edited (the checksum mismatch is logged); add a new
+file to the end of MIGRATIONS instead.
+
+Usage:
+    python migrations.py           # apply pending migrations
+    python migrations.py --status  # list applied / pending versions
+"""
+
+import hashlib
+import os
+from sqlalchemy import text
+from DB_server import advisory_lock, MIGRATION_LOCK_KEY
+from metrics import get_logger
+
+log = get_logger("migrations")
+
+SQL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (version, file). stock_data is not listed: stock_sync.create_stock_data_table owns it,
+# and create_stock_data_table.sql also inserts sample rows.
+MIGRATIONS = [
+    (1, "create_base_data_table.sql"),
+    (2, "create_forecasts_table.sql"),
+    (3, "create_base_stock_table.sql"),
+    (4, "create_stock_notifications_table.sql"),
+    (5, "alter_stock_notifications_table.sql"),
+    (6, "migrate_stock_notifications_schema.sql"),
+    (7, "create_manual_overrides_table.sql"),
+    (8, "create_stock_notification_history.sql"),
+    (9, "add_notification_change_type.sql"),
+    (10, "add_stock_data_uploaded_index.sql"),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+SCHEMA_VERSION_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def _read(name):
+    with open(os.path.join(SQL_DIR, name), encoding="utf-8") as f:
+        sql = f.read()
+    return sql, hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+def current_version(engine):
+    """Highest applied version, 0 for an empty schema_version, None if the table doesn't exist"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+    except Exception:
+        return None
+
+
+def applied_migrations(engine):
+    """{version: checksum} of the applied migrations"""
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT version, checksum FROM schema_version")).fetchall()
+    return {int(v): c for v, c in rows}
+
+
+def migrate(engine):
+    """Apply pending migrations; returns the versions applied by this call"""
+    if engine is None:
+        return []
+    if current_version(engine) == LATEST_VERSION:
+        return []
+
+    applied_now = []
+    with advisory_lock(engine, MIGRATION_LOCK_KEY):
+        with engine.begin() as conn:
+            conn.execute(text(SCHEMA_VERSION_DDL))
+        # Re-read under the lock: another worker may have just finished
+        applied = applied_migrations(engine)
+        for version, name in MIGRATIONS:
+            sql, checksum = _read(name)
+            if version in applied:
+                if applied[version].strip() != checksum:
+                    log.warning(f"Migration {version} ({name}) changed after it was applied; not re-running it")
+                continue
+            log.info(f"Applying migration {version}: {name}")
+            with engine.begin() as conn:
+                # Whole file in one call. no_parameters makes the driver skip its %-format pass
+                # (psycopg2 applies it for any params argument, even an empty one), so "%" in
+                # column names and format() patterns inside DO $$ blocks reach Postgres as written
+                conn.execution_options(no_parameters=True).exec_driver_sql(sql)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, name, checksum) VALUES (:version, :name, :checksum)"),
+                    {"version": version, "name": name, "checksum": checksum},
+                )
+            applied_now.append(version)
+    if applied_now:
+        log.info(f"Schema at version {LATEST_VERSION} (applied {applied_now})")
+    return applied_now
+
+
+def status(engine):
+    """[(version, name, 'applied' | 'pending')]"""
+    applied = applied_migrations(engine) if current_version(engine) is not None else {}
+    return [(v, name, "applied" if v in applied else "pending") for v, name in MIGRATIONS]
+
+
+if __name__ == "__main__":
+    import argparse
+    from DB_server import engine
+
+    parser = argparse.ArgumentParser(description="Apply the versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="list migrations instead of applying them")
+    args = parser.parse_args()
+
+    if engine is None:
+        raise SystemExit("Database not available")
+    if args.status:
+        for version, name, state in status(engine):
+            print(f"{version:>4}  {state:<8} {name}")
+    else:
+        applied = migrate(engine)
+        print(f"Applied {applied}" if applied else f"Schema already at version {LATEST_VERSION}")
@@ -0,0 +1,59 @@
+"""
+Query Builder Module
+Small builder for parameterized SELECT statements.
+
+Filters are added as SQL fragments with named bind parameters, never by
+interpolating values, so the statement text depends only on which filters are
+present. Built statements are cached by that text: every request with the same
+filter shape reuses one TextClause (and SQLAlchemy's compiled form of it).
+
+This saves Python-side work only. psycopg2 binds parameters client-side and sends
+each query as plain SQL, so Postgres parses and plans every execution; nothing is
+PREPAREd on the server.
+"""
+
+from functools import lru_cache
+from sqlalchemy import text
+
+
+@lru_cache(maxsize=256)
+def statement(sql):
+    """Cached TextClause for a SQL string"""
+    return text(sql)
+
+
+class SelectBuilder:
+    def __init__(self, source):
+        self.source = source
+        self._joins = []
+        self._where = []
+        self._params = {}
+
+    def join(self, clause):
+        """Add a JOIN clause once (repeated calls with the same clause are ignored)"""
+        if clause not in self._joins:
+            self._joins.append(clause)
+        return self
+
+    def where(self, condition, **params):
+        """AND a condition; values are bound through params, e.g. where("x = :x", x=1)"""
+        for name, value in params.items():
+            if name in self._params and self._params[name] != value:
+                raise ValueError(f"Bind parameter {name!r} already set to a different value")
+        self._where.append(condition)
+        self._params.update(params)
+        return self
+
+    def build(self, columns, group_by=None, having=None, order_by=None):
+        """Return (statement, params) ready for conn.execute / pd.read_sql"""
+        parts = [f"SELECT {columns}", f"FROM {self.source}"]
+        parts.extend(self._joins)
+        if self._where:
+            parts.append("WHERE " + " AND ".join(f"({c})" for c in self._where))
+        if group_by:
+            parts.append(f"GROUP BY {group_by}")
+        if having:
+            parts.append(f"HAVING {having}")
+        if order_by:
+            parts.append(f"ORDER BY {order_by}")
+        return statement("\n".join(parts)), dict(self._params)
@@ -0,0 +1,100 @@
+"""
+Schema Cache Module
+Resolves the physical column names of stock_notifications once and reuses them.
+
+Older databases created stock_notifications both from create_stock_notifications_table.sql
+and by DataFrame.to_sql, so column casing can differ between databases. Endpoints ask
+this module for a logical -> physical mapping instead of probing information_schema
+on every request. The mapping is resolved once at startup, after the migrations (see
+migrations.py). stock_notifications is a view of the latest batch in
+stock_notification_history; uploads append batches and never change its columns,
+so the mapping stays valid.
+"""
+
+import threading
+from sqlalchemy import text
+from metrics import get_logger
+
+log = get_logger("schema_cache")
+
+# Logical name -> candidate physical names, in order of preference
+NOTIFICATION_COLUMNS = {
+    "sku": ("Product_SKU", "product_sku", "Product", "product"),
+    "product": ("Product", "product", "product_name"),
+    "category": ("Category", "category"),
+    "stock": ("Stock", "stock", "quantity"),
+    "last_stock": ("Last_Stock", "last_stock"),
+    "decrease_rate": ("Decrease_Rate(%)", "decrease_rate"),
+    "weeks_to_empty": ("Weeks_To_Empty", "weeks_to_empty"),
+    "minstock": ("MinStock", "minstock"),
+    "buffer": ("Buffer", "buffer"),
+    "reorder_qty": ("Reorder_Qty", "reorder_qty"),
+    "status": ("Status", "status"),
+    "description": ("Description", "description"),
+    "created_at": ("created_at",),
+}
+
+_lock = threading.Lock()
+_notification_columns = None  # {logical: physical}
+_notification_exists = False
+
+
+def _pick(existing, candidates):
+    for cand in candidates:
+        if cand in existing:
+            return cand
+    lowered = {c.lower(): c for c in existing}
+    for cand in candidates:
+        if cand.lower() in lowered:
+            return lowered[cand.lower()]
+    return None
+
+
+def resolve_notification_columns(engine):
+    """Read information_schema once and rebuild the stock_notifications column mapping"""
+    global _notification_columns, _notification_exists
+
+    existing = []
+    if engine is not None:
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(text(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_name = 'stock_notifications' ORDER BY ordinal_position"
+                )).fetchall()
+            existing = [r[0] for r in rows]
+        except Exception as e:
+            log.error(f"Failed to read stock_notifications columns: {e}")
+
+    mapping = {}
+    for logical, candidates in NOTIFICATION_COLUMNS.items():
+        mapping[logical] = _pick(existing, candidates) or candidates[0]
+
+    # Last resort for the key column: anything that looks like a SKU
+    if existing and _pick(existing, NOTIFICATION_COLUMNS["sku"]) is None:
+        mapping["sku"] = next((c for c in existing if "sku" in c.lower()), mapping["sku"])
+
+    with _lock:
+        _notification_columns = mapping
+        _notification_exists = bool(existing)
+
+    log.info(f"Resolved stock_notifications columns: {mapping}")
+    return mapping
+
+
+def notification_columns(engine):
+    """Cached logical -> physical column mapping for stock_notifications"""
+    mapping = _notification_columns
+    if mapping is None:
+        mapping = resolve_notification_columns(engine)
+    return mapping
+
+
+def notification_table_exists():
+    """Whether the last resolution found a stock_notifications table"""
+    return _notification_exists
+
+
+def refresh_notification_schema(engine):
+    """Re-resolve the mapping (call after the table's columns change)"""
+    return resolve_notification_columns(engine)
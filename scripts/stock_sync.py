@@ -4,9 +4,11 @@ Syncs product data from all_products to stock_data table for notification system
 """
 
 import pandas as pd
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timedelta
 from sqlalchemy import text
-from DB_server import engine
+from DB_server import engine, copy_dataframe
+from Notification import invalidate_report_cache
 
 def create_stock_data_table():
     """Create stock_data table if it doesn't exist"""
@@ -29,6 +31,7 @@ def create_stock_data_table():
     CREATE INDEX IF NOT EXISTS idx_stock_data_date ON stock_data(week_date);
     CREATE INDEX IF NOT EXISTS idx_stock_data_sku ON stock_data(product_sku);
     CREATE INDEX IF NOT EXISTS idx_stock_data_uploaded ON stock_data(uploaded_at);
+    CREATE INDEX IF NOT EXISTS idx_stock_data_week_product_uploaded ON stock_data(week_date, product_name, uploaded_at DESC);
     """
     
     try:
@@ -41,6 +44,44 @@ def create_stock_data_table():
         print(f"❌ Failed to create stock_data table: {e}")
         return False
 
+def compute_stock_levels(df_products, df_monthly):
+    """
+    Stock metrics for every product in one grouped pass.
+    df_products: columns ['product_sku', 'product_name']
+    df_monthly: columns ['product_sku', 'monthly_quantity'] (one row per SKU and month)
+    Returns df_products with stock_level, minstock and buffer added.
+    """
+    stats = (
+        df_monthly.groupby('product_sku')['monthly_quantity']
+                  .agg(['mean', 'std', 'count'])
+    )
+    
+    # Average monthly sales; estimated stock = 3 months of average sales (placeholder
+    # until real stock data is available). A SKU whose monthly SUMs are all NULL has
+    # a NaN mean: count it as no sales.
+    avg_monthly = np.trunc(stats['mean'].fillna(0)).astype(int)
+    stats['stock_level'] = avg_monthly * 3
+    
+    # Minimum stock: 2 weeks of sales with 1.5x safety factor
+    weekly_sales = avg_monthly / 4
+    stats['minstock'] = np.trunc(weekly_sales * 2 * 1.5).astype(int)
+    
+    # Buffer based on sales volatility (coefficient of variation)
+    cv = (stats['std'] / stats['mean']).where(stats['mean'] > 0, 0)
+    volatility_buffer = np.select([cv > 0.5, cv > 0.2], [20, 10], default=5)
+    stats['buffer'] = np.where(stats['count'] > 1, volatility_buffer, 10)
+    
+    out = df_products.merge(
+        stats[['stock_level', 'minstock', 'buffer']],
+        left_on='product_sku', right_index=True, how='left'
+    )
+    
+    # No sales data - use defaults
+    out['stock_level'] = out['stock_level'].fillna(100).astype(int)
+    out['minstock'] = out['minstock'].fillna(20).astype(int)
+    out['buffer'] = out['buffer'].fillna(10).astype(int)
+    return out
+
 def sync_products_to_stock_data():
     """
     Sync products from all_products to stock_data table
@@ -67,94 +108,45 @@ def sync_products_to_stock_data():
         
         print(f"[Stock Sync] Found {len(df_products)} products in all_products")
         
-        # Get recent sales data to calculate stock levels
+        # Monthly sales per SKU over the last 90 days, aggregated in the database
         sales_query = """
             SELECT 
                 product_sku,
-                product_name,
-                sales_date,
-                total_quantity
+                DATE_TRUNC('month', sales_date) AS sales_month,
+                SUM(total_quantity) AS monthly_quantity
             FROM base_data
             WHERE sales_date >= (SELECT MAX(sales_date) - INTERVAL '90 days' FROM base_data)
-            ORDER BY sales_date DESC
+            GROUP BY product_sku, DATE_TRUNC('month', sales_date)
         """
-        df_sales = pd.read_sql(sales_query, engine)
+        df_monthly = pd.read_sql(sales_query, engine)
         
-        print(f"[Stock Sync] Found {len(df_sales)} recent sales records")
+        print(f"[Stock Sync] Found {len(df_monthly)} recent monthly sales rows")
         
-        # Calculate stock metrics for each product
-        stock_records = []
         current_time = datetime.now()
-        
-        for _, product in df_products.iterrows():
-            sku = product['product_sku']
-            name = product['product_name']
-            
-            # Get sales for this product
-            product_sales = df_sales[df_sales['product_sku'] == sku]
-            
-            if not product_sales.empty:
-                # Calculate average monthly sales
-                monthly_sales = product_sales.groupby(
-                    pd.to_datetime(product_sales['sales_date']).dt.to_period('M')
-                )['total_quantity'].sum()
-                
-                avg_monthly_sales = int(monthly_sales.mean()) if len(monthly_sales) > 0 else 0
-                
-                # Estimate current stock (this is a placeholder - you should have actual stock data)
-                # For now, we'll use 3 months of average sales as initial stock
-                estimated_stock = avg_monthly_sales * 3
-                
-                # Calculate minimum stock (2 weeks of sales with 1.5x safety factor)
-                weekly_sales = avg_monthly_sales / 4
-                min_stock = int(weekly_sales * 2 * 1.5)
-                
-                # Calculate buffer based on sales volatility
-                if len(monthly_sales) > 1:
-                    sales_std = monthly_sales.std()
-                    cv = (sales_std / monthly_sales.mean()) if monthly_sales.mean() > 0 else 0
-                    
-                    if cv > 0.5:  # High volatility
-                        buffer = 20
-                    elif cv > 0.2:  # Medium volatility
-                        buffer = 10
-                    else:  # Low volatility
-                        buffer = 5
-                else:
-                    buffer = 10  # Default buffer
-            else:
-                # No sales data - use defaults
-                estimated_stock = 100  # Default starting stock
-                min_stock = 20  # Default minimum
-                buffer = 10  # Default buffer
-            
-            stock_records.append({
-                'week_date': current_time,
-                'product_name': name,
-                'product_sku': sku,
-                'stock_level': estimated_stock,
-                'minstock': min_stock,
-                'buffer': buffer,
-                'uploaded_at': current_time
-            })
-        
-        # Create DataFrame
-        df_stock = pd.DataFrame(stock_records)
+        df_stock = compute_stock_levels(df_products, df_monthly)
+        df_stock['week_date'] = current_time
+        df_stock['uploaded_at'] = current_time
+        df_stock = df_stock[['week_date', 'product_name', 'product_sku', 'stock_level', 'minstock', 'buffer', 'uploaded_at']]
         
         print(f"[Stock Sync] Generated {len(df_stock)} stock records")
         
-        # Insert into stock_data table (replace existing records for current week_date)
+        # One row per SKU: stock_data is UNIQUE(week_date, product_sku)
+        df_stock = df_stock.drop_duplicates(subset='product_sku', keep='last')
+        
+        # Replace today's snapshot atomically: sargable range delete (uses
+        # idx_stock_data_date) and COPY on the same connection/transaction
+        day_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_end = day_start + timedelta(days=1)
         with engine.begin() as conn:
-            # Delete existing records for this timestamp to avoid duplicates
             delete_sql = text("""
                 DELETE FROM stock_data 
-                WHERE DATE_TRUNC('day', week_date) = DATE_TRUNC('day', :current_date)
+                WHERE week_date >= :day_start AND week_date < :day_end
             """)
-            conn.execute(delete_sql, {"current_date": current_time})
+            conn.execute(delete_sql, {"day_start": day_start, "day_end": day_end})
             
-            # Insert new records
-            df_stock.to_sql('stock_data', engine, if_exists='append', index=False)
+            copy_dataframe(conn, df_stock, 'stock_data')
         
+        invalidate_report_cache()
         print(f"[Stock Sync] ✅ Successfully synced {len(df_stock)} products to stock_data")
         
         return {
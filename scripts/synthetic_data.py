@@ -0,0 +1,128 @@
+"""
+Synthetic Data Module
+Generates marketplace-style exports with the Thai column headers the pipeline
+parses, for benchmarks and load tests:
+
+- product list      (รหัสสินค้า, ชื่อสินค้า, หมวดหมู่)
+- sales export      (order lines: รหัสสินค้า, ชื่อสินค้า, วันที่ทำรายการ, จำนวน, ราคาต่อหน่วย, ราคารวม)
+- stock snapshot    (ชื่อสินค้า, รหัสสินค้า, จำนวนคงเหลือ, หมวดหมู่)
+- base_data rows    (already aggregated, for seeding a database directly)
+
+export_csv() adds the "Exported by" / "Date Time" preamble rows real exports
+carry, so the header-detection fallback is exercised too. Everything is seeded
+and deterministic for a given size.
+"""
+
+import io
+import numpy as np
+import pandas as pd
+
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "3XL"]
+CATEGORIES = ["เสื้อยืด", "เสื้อเชิ้ต", "กางเกง", "แจ็คเก็ต", "ชุดเดรส"]
+
+
+def catalog(n_skus=500, seed=0):
+    """One row per SKU: Product_SKU (BASE-SIZE), product_name, category"""
+    rng = np.random.default_rng(seed)
+    n_bases = max(1, int(np.ceil(n_skus / 4)))
+    rows = []
+    for i in range(n_skus):
+        base = i % n_bases
+        size = SIZES[(i // n_bases) % len(SIZES)]
+        rows.append((f"LT{base:05d}-{size}", f"{CATEGORIES[base % len(CATEGORIES)]} รุ่น {base:05d} ไซซ์ {size}",
+                     CATEGORIES[base % len(CATEGORIES)]))
+    df = pd.DataFrame(rows, columns=["Product_SKU", "product_name", "category"])
+    df["price"] = rng.integers(159, 1290, len(df))
+    return df
+
+
+def product_export(products):
+    return pd.DataFrame({
+        "รหัสสินค้า": products["Product_SKU"],
+        "ชื่อสินค้า": products["product_name"],
+        "หมวดหมู่": products["category"],
+    })
+
+
+def sales_export(products, n_months=24, start="2023-01-01", lines_per_sku_month=3, seed=0):
+    """Order lines over n_months with a per-SKU base rate, seasonality and noise"""
+    rng = np.random.default_rng(seed + 1)
+    months = pd.date_range(start, periods=n_months, freq="MS")
+    n_skus = len(products)
+    n_lines = n_skus * n_months * lines_per_sku_month
+
+    sku_idx = np.repeat(np.arange(n_skus), n_months * lines_per_sku_month)
+    month_idx = np.tile(np.repeat(np.arange(n_months), lines_per_sku_month), n_skus)
+    rate = rng.gamma(2.0, 1.5, n_skus)[sku_idx] * (1 + 0.3 * np.sin(2 * np.pi * months.month.to_numpy()[month_idx] / 12))
+    qty = rng.poisson(rate) + 1
+
+    day = rng.integers(0, 28, n_lines)
+    stamps = months.to_numpy()[month_idx] + day.astype("timedelta64[D]") + rng.integers(8, 22, n_lines).astype("timedelta64[h]")
+    price = products["price"].to_numpy()[sku_idx]
+    return pd.DataFrame({
+        "รหัสสินค้า": products["Product_SKU"].to_numpy()[sku_idx],
+        "ชื่อสินค้า": products["product_name"].to_numpy()[sku_idx],
+        "วันที่ทำรายการ": pd.DatetimeIndex(stamps).strftime("%d/%m/%Y %H:%M"),
+        "จำนวน": qty,
+        "ราคาต่อหน่วย": price,
+        "ราคารวม": price * qty,
+    })
+
+
+def base_data(products, n_months=24, start="2023-01-01", seed=0):
+    """Already-aggregated base_data rows (one per SKU and month), as auto_cleaning writes them"""
+    rng = np.random.default_rng(seed + 3)
+    months = pd.date_range(start, periods=n_months, freq="MS")
+    n_skus = len(products)
+    sku_idx = np.repeat(np.arange(n_skus), n_months)
+    month_idx = np.tile(np.arange(n_months), n_skus)
+    rate = rng.gamma(2.0, 6.0, n_skus)[sku_idx] * (1 + 0.3 * np.sin(2 * np.pi * months.month.to_numpy()[month_idx] / 12))
+    dates = months[month_idx]
+    return pd.DataFrame({
+        "product_sku": products["Product_SKU"].to_numpy()[sku_idx],
+        "product_name": products["product_name"].to_numpy()[sku_idx],
+        "sales_date": dates,
+        "sales_year": dates.year.astype("int64"),
+        "sales_month": dates.month.astype("int64"),
+        "total_quantity": rng.poisson(rate).astype("int64"),
+    })
+
+
+def stock_snapshot(products, week=0, seed=0):
+    """Stock on hand for one weekly snapshot; stock falls week over week with random restocks"""
+    rng = np.random.default_rng(seed + 2)
+    start = rng.integers(20, 400, len(products))
+    weekly_sale = rng.integers(0, 30, len(products))
+    restock = rng.random((week + 1, len(products))) < 0.1
+    level = start - weekly_sale * week + (restock * 150).sum(axis=0)
+    return pd.DataFrame({
+        "ชื่อสินค้า": products["product_name"],
+        "รหัสสินค้า": products["Product_SKU"],
+        "จำนวนคงเหลือ": np.maximum(level, 0),
+        "หมวดหมู่": products["category"],
+    })
+
+
+def export_csv(df, preamble=True):
+    """CSV bytes as exported by the marketplace (utf-8-sig, optional preamble rows)"""
+    buf = io.StringIO()
+    if preamble:
+        pad = "," * (len(df.columns) - 1)
+        buf.write(f"Exported by,benchmark{pad[1:]}\n")
+        buf.write(f"Date Time,{pd.Timestamp('2024-01-01'):%d/%m/%Y %H:%M}{pad[1:]}\n")
+    df.to_csv(buf, index=False)
+    return buf.getvalue().encode("utf-8-sig")
+
+
+def analyzer_frame(base_df, products):
+    """data_analyzer input (Product_SKU, Product_name, Year, Month, Total_quantity, Total_Amount(baht)) from base_data rows"""
+    price = products.set_index("Product_SKU")["price"]
+    out = pd.DataFrame({
+        "Product_SKU": base_df["product_sku"].astype(str),
+        "Product_name": base_df["product_name"].astype(object),
+        "Year": base_df["sales_year"],
+        "Month": base_df["sales_month"],
+        "Total_quantity": base_df["total_quantity"],
+    })
+    out["Total_Amount(baht)"] = out["Total_quantity"] * out["Product_SKU"].map(price).fillna(0)
+    return out